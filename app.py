@@ -1,13 +1,29 @@
+import functools
+import hashlib
+import os
+import time
 import streamlit as st
-import pdfplumber
-import fitz  # PyMuPDF
-import pandas as pd
-import io
-import re
 from collections import Counter
-from PIL import Image, ImageOps
-import pytesseract
-from pyzbar.pyzbar import decode as zbar_decode
+
+from exporters import CARTON_SCHEMA, CMUS_SCHEMA, EXPORT_FORMATS, REPORT_MIME, report_file_name, write_table
+from page_cache import DEFAULT_CACHE_PATH, DEFAULT_JOURNAL_DIR, discard_journal, journal_user, purge_journals
+from extractor import (
+    CARTON_COL_WIDTHS,
+    CMUS_COL_WIDTHS,
+    PAGES_PER_TASK,
+    TEXT_BACKENDS,
+    RunningReport,
+    build_carton_report,
+    build_cmus_report,
+    build_excel,
+    extract_files,
+    ocr_fallback_ratio,
+    open_fitz,
+    rotation_hit_rate,
+)
+from jobs import JobQueue
+from ocr_engine import engine_name
+from profiling import timings_frame, timings_json, timings_summary
 
 st.set_page_config(page_title="AI Shipping Label Extractor", layout="wide")
 
@@ -21,704 +37,326 @@ uploaded_files = st.file_uploader(
     accept_multiple_files=True,
 )
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Generic helpers
-# ─────────────────────────────────────────────────────────────────────────────
-def clean_text(text):
-    if text:
-        return re.sub(r'\s+', ' ', text).strip()
-    return ""
-
-
-def reverse_lines(text):
-    """Reverses each line of sideways / mirrored rotated carton labels."""
-    if not text:
-        return []
-    return [line[::-1] for line in text.split('\n')]
-
-
-def gtin_check_digit(d13):
-    """Standard GS1 GTIN check digit (weights 3,1 from the right)."""
-    total = 0
-    for i, ch in enumerate(reversed(d13)):
-        total += int(ch) * (3 if i % 2 == 0 else 1)
-    return (10 - (total % 10)) % 10
-
-
-def detect_text_format(text):
-    """
-    Decide parser and orientation for pages with a text layer.
-    Returns tuple: (format_name, is_reversed)
-    """
-    if not text:
-        return None, False
-    if "Material #" in text or "Ship From:" in text:
-        return "cmus", False
-    
-    # Check upright text
-    if "CARTON" in text and ("(01)" in text or "STYLE/COLOR" in text or "SHIP TO" in text or "PO#" in text or "PO " in text):
-        return "carton_text", False
-
-    # Check reversed text
-    rev = " ".join(reverse_lines(text))
-    if "CARTON" in rev and ("(01)" in rev or "STYLE/COLOR" in rev or "SHIP TO" in rev or "PO#" in rev or "PO " in rev):
-        return "carton_text", True
-
-    return None, False
-
-
-# ─────────────────────────────────────────────────────────────────────────────
-# Barcode decoding
-# ─────────────────────────────────────────────────────────────────────────────
-def decode_page_barcodes(fitz_page, zoom=6):
-    pix = fitz_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
-    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-    for angle in (-90, 90, 0, 180):
-        test_img = img.rotate(angle, expand=True) if angle else img
-        results = zbar_decode(test_img)
-        numeric = sorted(
-            {r.data.decode(errors="ignore") for r in results
-             if r.data.decode(errors="ignore").isdigit()},
-            key=len, reverse=True,
-        )
-        if numeric:
-            return numeric, test_img
-    return [], img.rotate(-90, expand=True)
-
-
-def pick_carton_and_gtin(values):
-    if not values:
-        return "", ""
-    carton = values[0]
-    gtin = ""
-    for v in values[1:]:
-        if v != carton and 13 <= len(v) <= 17:
-            gtin = v
-            break
-    return carton, gtin
-
-
-def split_carton_barcode(barcode):
-    if len(barcode) >= 20:
-        return barcode[10:16], barcode[16:20]
-    return "", barcode
-
-
-COLOR_PATTERN = re.compile(
-    r'\b(Dark|Light|Navy|Royal|Bright)?\s?(Blue|Black|Green|Red|Grey|Gray|White|Brown|Beige|Khaki)\b',
-    re.IGNORECASE,
+# Every run with more than one worker spawns its own process pool, so
+# sessions on a shared host start without one and opt in.
+workers = st.sidebar.number_input(
+    "Worker processes (pages processed in parallel; 1 = no process pool)",
+    min_value=1, max_value=os.cpu_count() or 1, value=1,
 )
-
-DESC_EXCLUDE = (
-    "SHIP", "CARTON", "UNICHELA", "CASUALLINE", "LIMITED", "PRIVATE",
-    "STYLE", "COLOR", "SIZE", "PCS", "DIM", "GRID", "COMPLETE",
-    "CONFORMING", "RFID", "FROM", "QTY", "DATE", "TO", "MCDONOUGH",
+use_cache = st.sidebar.checkbox("Reuse cached results for pages seen before", value=True)
+# The "layout" OCR mode stays batch-only (--ocr-mode layout) until
+# benchmarks/bench_ocr_modes.py has measured its speed and field agreement
+# with "fields" on real labels.
+ocr_mode = "fields"
+if engine_name() != "tesserocr":
+    st.sidebar.caption(
+        "⚠️ tesserocr ස්ථාපනය කර නැත — OCR runs one tesseract process per field (slower). "
+        "Install tesserocr (libtesseract-dev) for the persistent engine."
+    )
+text_backend = st.sidebar.selectbox(
+    "PDF text reader", TEXT_BACKENDS,
+    format_func={"fitz": "PyMuPDF (fast, default)", "pdfplumber": "pdfplumber (original)"}.get,
 )
-
-
-def extract_color(text):
-    m = COLOR_PATTERN.search(text)
-    if not m:
-        return ""
-    parts = [p for p in (m.group(1), m.group(2)) if p]
-    return " ".join(p.title() for p in parts)
-
-
-def extract_description(text):
-    for line in text.split("\n"):
-        words = re.findall(r"[A-Za-z]{2,}", line)
-        if len(words) < 2 or re.search(r'\d', line):
-            continue
-        upper_words = [w.upper() for w in words]
-        if any(any(ex in w for ex in DESC_EXCLUDE) for w in upper_words):
-            continue
-        if len(upper_words) == 2 and len(upper_words[1]) <= 2:
-            continue
-        return " ".join(words).upper()
-    return ""
-
+export_formats = st.sidebar.multiselect(
+    "Also download as (master rows, typed columns)", EXPORT_FORMATS,
+    format_func={"parquet": "Parquet", "csv": "CSV", "arrow": "Arrow IPC"}.get,
+)
+profile = st.sidebar.checkbox("Record stage timings (Timings sheet + JSON)", value=False)
+low_memory = st.sidebar.checkbox(
+    "Low-memory mode (grayscale renders, uploads spooled to disk — for very large PDFs)", value=False,
+)
+background = st.sidebar.checkbox(
+    "Run as a background job (keeps running if this tab is closed; needs `python jobs.py worker`)",
+    value=False,
+)
+# Background jobs belong to a name, not to a browser tab: the ?owner= query
+# parameter keeps it across reloads, so a bookmarked page finds its jobs again.
+job_owner = ""
+if background:
+    job_owner = st.sidebar.text_input(
+        "ඔබේ නම (your name — only you see, download and cancel your jobs)",
+        value=st.query_params.get("owner", ""),
+    ).strip()
+    if job_owner != st.query_params.get("owner", ""):
+        st.query_params["owner"] = job_owner
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Parser 1 — GS1 carton label WITH text layer (Upright & Reversed)
+# Processing (memoized per session)
 # ─────────────────────────────────────────────────────────────────────────────
-def parse_carton_text(text, page_no, is_reversed=False):
-    lines = reverse_lines(text) if is_reversed else [l.strip() for l in text.split('\n') if l.strip()]
-    joined = " ".join(lines)
-
-    # Ship To extraction
-    ship_to = ""
-    m_dc = re.search(r'SHIP\s*TO:\s*([A-Za-z0-9\s.]+?)(?=\s*Date:|\s*QTY|\s*MCDONOUGH|\s*CARTON|\n|$)', joined, re.IGNORECASE)
-    ship_dc = clean_text(m_dc.group(1)) if m_dc else ""
-    m_city = re.search(r'\b([A-Z]{3,}(?:\s+[A-Z]{2,})?)\s+([A-Z]{2})\b', joined)
-    ship_city = f"{m_city.group(1)} {m_city.group(2)}" if m_city else ""
-    
-    if ship_dc and ship_city:
-        ship_to = ship_dc if ship_city in ship_dc else f"{ship_dc}, {ship_city}"
-    else:
-        ship_to = ship_dc or ship_city
-
-    # Date
-    m_date = re.search(r'(\d{1,2}/\d{1,2}/\d{4})', joined)
-    date = m_date.group(1) if m_date else ""
-
-    # Qty
-    m_qty = re.search(r'\bQTY\s*(\d{1,3})\b', joined, re.IGNORECASE)
-    if not m_qty:
-        m_qty = re.search(r'\b(\d{1,3})\s*QTY\b', joined, re.IGNORECASE)
-    qty = m_qty.group(1) if m_qty else ""
-
-    # PO #
-    m_po = re.search(r'\b(4\d{9})\b', joined)
-    if not m_po:
-        m_po = re.search(r'PO#?\s*(4?\d{6,10})', joined, re.IGNORECASE)
-    po = m_po.group(1) if m_po else ""
-
-    # Style / Color
-    style = ""
-    for i, l in enumerate(lines):
-        if l == "-":
-            left = lines[i - 1] if i >= 1 else ""
-            right = lines[i + 1] if i + 1 < len(lines) else ""
-            cands = [t for t in (left, right) if re.fullmatch(r'[A-Z0-9]{2,10}', t)]
-            if len(cands) == 2:
-                a, b = sorted(cands, key=len, reverse=True)
-                style = f"{a}-{b}"
-                break
-    if not style:
-        m_style = re.search(r'([A-Z]{2,6}\d{3,6}\s*-\s*[A-Z0-9]{1,4})', joined)
-        style = re.sub(r'\s*-\s*', '-', m_style.group(1)) if m_style else ""
-
-    # GTIN (01)
-    gtin = ""
-    m_gtin = re.search(r'\(01\)\s*([\d\s]{12,18})', joined)
-    if m_gtin:
-        gtin_digits = re.sub(r'\D', '', m_gtin.group(1))
-        if len(gtin_digits) >= 13:
-            gtin = gtin_digits[:14]
-    if not gtin:
-        m_g_head = re.search(r'\(01\)(\d+)', joined)
-        if m_g_head:
-            head = m_g_head.group(1)
-            b = re.search(r'\b(\d{11})\b', joined)
-            if b:
-                d13 = head + b.group(1)
-                gtin = d13 + str(gtin_check_digit(d13))
-
-    color = extract_color(joined)
-
-    # Size
-    size = ""
-    m_size = re.search(r'\bSIZE\b\s*([A-Z]{1,4}\s*\d{0,2})', joined, re.IGNORECASE)
-    if m_size:
-        size = clean_text(m_size.group(1))
-    else:
-        size_tokens = {"XXS", "XS", "S", "M", "L", "XL", "XXL", "XXXL"}
-        for i, l in enumerate(lines):
-            if re.fullmatch(r'\d{2}', l):
-                for j in (i - 1, i + 1):
-                    if 0 <= j < len(lines) and lines[j] in size_tokens:
-                        size = f"{lines[j]} {l}"
-                        break
-                if size:
-                    break
-    if not size and "Prepack" in joined:
-        size = "Prepack"
-
-    # Grid / Ref No.
-    grid_pcs = ""
-    m_grid = re.search(r'\(Complete Grid\)\s*(\d{1,4})', joined, re.IGNORECASE)
-    if m_grid:
-        grid_pcs = m_grid.group(1)
-    else:
-        for i, l in enumerate(lines):
-            if "grid" in l.lower():
-                for j in range(max(0, i - 3), min(len(lines), i + 4)):
-                    if re.fullmatch(r'\d{2,4}', lines[j]):
-                        grid_pcs = lines[j]
-                        break
-                if grid_pcs:
-                    break
-
-    status = "NON-CONFORMING" if re.search(r'NON-CONFORMING', joined, re.IGNORECASE) else ""
-    desc = extract_description("\n".join(lines))
-
-    return {
-        "Label No.": page_no,
-        "Ship To": ship_to,
-        "Date": date,
-        "PO #": po,
-        "Style / Color": style,
-        "Description": desc,
-        "Color": color,
-        "Size": size,
-        "Qty": qty,
-        "GTIN (01)": gtin,
-        "Grid / Ref No.": grid_pcs,
-        "Status": status,
-    }
+def upload_key(files):
+    """Identity of the current upload set: names + content hashes, in upload order."""
+    return tuple((uf.name, hashlib.sha256(uf.getvalue()).hexdigest()) for uf in files)
+
+
+def upload_source(uf, low_memory):
+    """An upload as extract_files input: its bytes, or in low-memory mode the file itself (spooled in blocks)."""
+    if not low_memory:
+        return uf.getvalue()
+    uf.seek(0)
+    return uf
+
+
+def pool_size(files, workers):
+    """`workers`, but no more than the upload set has page chunks to share out."""
+    if workers <= 1:
+        return 1
+    pages = 0
+    for uf in files:
+        with open_fitz(uf.getvalue()) as fdoc:
+            pages += len(fdoc)
+    return max(1, min(workers, -(-pages // PAGES_PER_TASK)))
+
+
+# How often the live view redraws while pages are processed, and how often
+# the "processed so far" workbooks are rebuilt for download.
+LIVE_REFRESH_S = 1.0
+PARTIAL_EXCEL_S = 20.0
+
+
+def show_live(report, stats, slots, build_downloads):
+    """Redraw the running metrics and table; rebuild the partial workbooks when asked."""
+    counts = report.counts
+    with slots["metrics"].container():
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Pages processed", f"{stats['pages']:,}")
+        c2.metric("Cartons (unique)", f"{counts['cartons']:,}")
+        c3.metric("මුළු Qty", f"{counts['qty']:,}")
+        c4.metric("OCR කළ Pages ගණන", f"{stats['ocr_pages']:,}")
+    carton_rows = report.carton_rows()
+    if carton_rows:
+        df, dup_df, summary = build_carton_report(carton_rows)
+        slots["table"].dataframe(df, use_container_width=True)
+    if not build_downloads:
+        return
+    slots["version"] += 1
+    with slots["downloads"].container():
+        if carton_rows:
+            st.download_button(
+                label=f"📥 Download partial Carton Excel ({stats['pages']:,} pages so far)",
+                data=build_excel(df, CARTON_COL_WIDTHS, summary_df=summary, highlight_mixed=True, dup_df=dup_df),
+                file_name="Carton_Master_Report_partial.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key=f"partial_carton_{slots['version']}", on_click="ignore",
+            )
+        if report.cmus_rows:
+            df2, _ = build_cmus_report(report.cmus_rows)
+            st.download_button(
+                label=f"📥 Download partial CMUS Excel ({len(df2):,} rows so far)",
+                data=build_excel(df2, CMUS_COL_WIDTHS, highlight_mixed=True),
+                file_name="Shipping_Master_Report_partial.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key=f"partial_cmus_{slots['version']}", on_click="ignore",
+            )
 
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Parser 2 — Rotated GS1 carton label WITHOUT text layer (OCR Fallback)
-# ─────────────────────────────────────────────────────────────────────────────
-FIELD_BOXES = {
-    "ship_dc": (500, 30, 1650, 160),
-    "ship_city": (480, 180, 1650, 360),
-    "date": (1630, 255, 1970, 350),
-    "qty": (2020, 210, 2180, 350),
-    "po": (630, 1360, 1650, 1550),
-    "desc": (480, 1240, 1350, 1340),
-    "style": (480, 1550, 1500, 1710),
-    "color": (1850, 1490, 2220, 1580),
-    "size": (1870, 1565, 2200, 1690),
-}
-EXPECTED_CANVAS = (4752, 3672)
-
-
-def ocr_field(rotated_img, box, whitelist="", psm=7, scale=2, retry_psms=(8, 13, 6)):
-    w, h = rotated_img.size
-    x0, y0, x1, y1 = box
-    crop = rotated_img.crop((max(0, x0), max(0, y0), min(w, x1), min(h, y1)))
-    crop = crop.resize((crop.width * scale, crop.height * scale))
-    gray = ImageOps.autocontrast(crop.convert("L"))
-    wl = f"-c tessedit_char_whitelist={whitelist}" if whitelist else ""
-    txt = pytesseract.image_to_string(gray, config=f"--psm {psm} {wl}").strip()
-    if txt:
-        return txt
-    if whitelist:
-        for alt_psm in retry_psms:
-            txt = pytesseract.image_to_string(gray, config=f"--psm {alt_psm} {wl}").strip()
-            if txt:
-                return txt
-    return ""
-
-
-def ocr_label_text(rotated_img):
-    gray = ImageOps.autocontrast(rotated_img.convert("L"))
-    return pytesseract.image_to_string(gray, config="--psm 6")
-
-
-def ocr_corner_number(rotated_img):
-    w, h = rotated_img.size
-    box = (w - 194, 46, w - 59, 110)
-    return ocr_field(rotated_img, box, whitelist="0123456789", psm=7, scale=4)
-
-
-def parse_carton_ocr_precise(rotated_img, page_no):
-    ship_dc_raw = ocr_field(rotated_img, FIELD_BOXES["ship_dc"])
-    ship_city_raw = ocr_field(rotated_img, FIELD_BOXES["ship_city"])
-    m = re.search(r'([A-Z]{2,}(?:\s[A-Z]{2,})?)\s+([A-Z]{2})\b', ship_city_raw)
-    ship_city = f"{m.group(1)} {m.group(2)}" if m else clean_text(ship_city_raw)
-    city_word = ship_city.split()[0] if ship_city else ""
-    ship_dc = f"{city_word} DC" if city_word and re.search(r'\bDC\b', ship_dc_raw, re.IGNORECASE) else clean_text(re.sub(r'(?i)ship\s*to:?\s*', '', ship_dc_raw))
-    ship_to = ", ".join(filter(None, [ship_dc, ship_city]))
-
-    date = ocr_field(rotated_img, FIELD_BOXES["date"], whitelist="0123456789/")
-    if not re.fullmatch(r'\d{1,2}/\d{1,2}/20\d{2}', date):
-        date = ""
-
-    qty_raw = ocr_field(rotated_img, FIELD_BOXES["qty"], whitelist="0123456789")
-    qty = qty_raw if re.fullmatch(r'\d{1,3}', qty_raw) else ""
-
-    po_raw = ocr_field(rotated_img, FIELD_BOXES["po"])
-    m = re.search(r'(\d{6,})', po_raw)
-    po = m.group(1) if m else ""
-
-    style_raw = ocr_field(rotated_img, FIELD_BOXES["style"])
-    style = re.sub(r'\s*-\s*', '-', clean_text(style_raw))
-
-    desc = clean_text(ocr_field(rotated_img, FIELD_BOXES["desc"])).upper()
-    color = clean_text(ocr_field(rotated_img, FIELD_BOXES["color"]))
-
-    size_raw = ocr_field(rotated_img, FIELD_BOXES["size"])
-    m = re.search(r'([A-Z]{1,4})\D{0,3}(\d{2})', size_raw)
-    size = f"{m.group(1)} {m.group(2)}" if m else clean_text(size_raw)
-
-    return {
-        "Label No.": page_no,
-        "Ship To": ship_to,
-        "Date": date,
-        "PO #": po,
-        "Style / Color": style,
-        "Description": desc,
-        "Color": color,
-        "Size": size,
-        "Qty": qty,
-        "GTIN (01)": "",
-        "Status": "",
-    }
-
-
-def parse_carton_ocr_fallback(text, page_no):
-    m = re.search(r'SHIP\s*TO:?\s*([A-Za-z][A-Za-z .]{2,40})', text, re.IGNORECASE)
-    ship_dc = clean_text(m.group(1).split("\n")[0]) if m else ""
-    m = re.search(r'\n\s*([A-Z]{3,}(?:\s[A-Z]{2,})?)\s+([A-Z]{2})\b', text)
-    ship_city = f"{m.group(1)} {m.group(2)}" if m else ""
-    ship_to = ", ".join(filter(None, [ship_dc, ship_city]))
-
-    m = re.search(r'(\d{1,2}/\d{1,2}/20\d{2})', text)
-    date = m.group(1) if m else ""
-
-    m = re.search(r'\b(4\d{9})\b', text)
-    po = m.group(1) if m else ""
-
-    m = re.search(r'([A-Z]{2,6}\d{3,6}\s?-\s?[A-Z0-9]{2,4})', text)
-    style = re.sub(r'\s*-\s*', '-', clean_text(m.group(1))) if m else ""
-
-    desc = extract_description(text[m.end():] if m else text)
-    color = extract_color(text)
-
-    m = re.search(r'\bSIZE\b\D{0,10}([A-Z0-9]{1,4})\s+(\d{2})\b', text, re.IGNORECASE)
-    size = f"{m.group(1)} {m.group(2)}" if m else ""
-
-    m = re.search(r'QTY\D{0,6}(\d{1,3})\b', text, re.IGNORECASE)
-    qty = m.group(1) if m else ""
-
-    status = "NON-CONFORMING" if re.search(r'NON-CONFORMING', text, re.IGNORECASE) else ""
-
-    return {
-        "Label No.": page_no,
-        "Ship To": ship_to,
-        "Date": date,
-        "PO #": po,
-        "Style / Color": style,
-        "Description": desc,
-        "Color": color,
-        "Size": size,
-        "Qty": qty,
-        "GTIN (01)": "",
-        "Status": status,
-    }
-
-
-def parse_carton_ocr(rotated_img, page_no):
-    w, h = rotated_img.size
-    ew, eh = EXPECTED_CANVAS
-    close_enough = abs(w - ew) / ew < 0.03 and abs(h - eh) / eh < 0.03
-    if close_enough:
-        return parse_carton_ocr_precise(rotated_img, page_no)
-    return parse_carton_ocr_fallback(ocr_label_text(rotated_img), page_no)
-
-
-def apply_batch_mode_correction(rows):
-    if not rows:
-        return rows
-    fields = ["Ship To", "PO #", "Style / Color", "Description", "Color"]
-    modes = {}
-    for f in fields:
-        vals = [r[f] for r in rows if r.get(f)]
-        if vals:
-            modes[f] = Counter(vals).most_common(1)[0][0]
-    for r in rows:
-        flagged = False
-        for f in fields:
-            mode_val = modes.get(f, "")
-            if not r.get(f):
-                if mode_val:
-                    r[f] = mode_val
-                    flagged = True
-            elif mode_val and r[f] != mode_val:
-                flagged = True
-        r["Needs Review"] = "Yes" if flagged else ""
-    return rows
-
-
-CARTON_COLUMN_ORDER = [
-    "File", "Label No.", "Format", "Ship To", "Date", "PO #",
-    "Style / Color", "Description", "Color", "Size",
-    "Qty", "GTIN (01)", "Grid / Ref No.", "Status",
-    "Carton No.", "Carton Seq", "Carton Barcode", "Needs Review",
-]
-
-CARTON_COL_WIDTHS = {
-    "File": 22, "Label No.": 9, "Format": 12,
-    "Ship To": 28, "Date": 12, "PO #": 14,
-    "Style / Color": 16, "Description": 32, "Color": 10, "Size": 10,
-    "Qty": 8, "GTIN (01)": 18, "Grid / Ref No.": 14, "Status": 16,
-    "Carton No.": 12, "Carton Seq": 12,
-    "Carton Barcode": 24, "Needs Review": 12,
-}
+def process_uploads(files, workers, options):
+    """Extract, build the reports and the workbook bytes once per upload set."""
+    workers = pool_size(files, workers)
+    stats = Counter()
+    timings = [] if options.get("profile") else None
+    report = RunningReport()
+    progress_bars = {}
+    slots = {"metrics": st.empty(), "downloads": st.empty(), "table": st.empty(), "version": 0}
+    last = {"live": time.monotonic(), "excel": time.monotonic()}
+
+    def show_progress(name, done, total):
+        bar = progress_bars.get(name)
+        if bar is None:
+            bar = progress_bars[name] = st.progress(0.0, text=f"{name} — processing…")
+        bar.progress(done / total)
+        if done == total:
+            bar.empty()
+        now = time.monotonic()
+        if now - last["live"] >= LIVE_REFRESH_S:
+            build_downloads = now - last["excel"] >= PARTIAL_EXCEL_S
+            show_live(report, stats, slots, build_downloads)
+            last["live"] = time.monotonic()
+            if build_downloads:
+                last["excel"] = last["live"]
+
+    with st.spinner("දත්ත කියවමින් පවතී... (OCR අවශ්‍ය pages සඳහා තත්පර කිහිපයක් ගත විය හැක)"):
+        carton_rows, cmus_rows = extract_files(
+            ((uf.name, upload_source(uf, options.get("low_memory"))) for uf in files),
+            progress=show_progress, stats=stats, workers=workers,
+            options=options, timings=timings, report=report,
+        )
+    for slot in ("metrics", "downloads", "table"):
+        slots[slot].empty()
+
+    results = {"stats": stats, "carton": None, "cmus": None, "timings": None}
+    timings_tables = [timings_summary(timings), timings_frame(timings)] if timings else None
+    excel_started = time.perf_counter()
+    if carton_rows:
+        df, dup_df, summary = build_carton_report(carton_rows)
+        results["carton"] = {
+            "df": df, "dup_df": dup_df, "summary": summary,
+            "excel": build_excel(
+                df, CARTON_COL_WIDTHS, summary_df=summary,
+                highlight_mixed=True, dup_df=dup_df, timings_tables=timings_tables,
+            ),
+        }
+    if cmus_rows:
+        df2, removed2 = build_cmus_report(cmus_rows)
+        results["cmus"] = {
+            "df": df2, "removed": removed2,
+            "excel": build_excel(df2, CMUS_COL_WIDTHS, highlight_mixed=True, timings_tables=timings_tables),
+        }
+    if timings:
+        extra = {"build_excel": time.perf_counter() - excel_started}
+        results["timings"] = {
+            "summary": timings_summary(timings, extra),
+            "json": timings_json(timings, extra, files=len(files), workers=workers),
+        }
+    return results
+
+
+def export_buttons(df, schema, name):
+    """Download buttons for `df` in the chosen export formats; each file is written when clicked."""
+    if not export_formats:
+        return
+    for fmt, col in zip(export_formats, st.columns(len(export_formats))):
+        col.download_button(
+            label=f"📥 {report_file_name(name, fmt)}",
+            data=functools.partial(write_table, df, schema, fmt),
+            file_name=report_file_name(name, fmt),
+            mime=REPORT_MIME[fmt], key=f"export_{name}_{fmt}", on_click="ignore",
+        )
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Parser 3 — CMUS / Club Monaco label
+# Background jobs
 # ─────────────────────────────────────────────────────────────────────────────
-def extract_label_data(text):
-    rows = []
-    order_match = re.search(r'Order No\.:(\S+)\s+(\d+)', text)
-    order_no = order_match.group(1) if order_match else ""
-    seq_no = order_match.group(2) if order_match else ""
-
-    dest_match = re.search(r'Factory I/O:\s*\n(\S+)', text)
-    destination = dest_match.group(1) if dest_match else ""
-
-    ship_from_id_match = re.search(r'Ship From:\s*(\S+)', text)
-    ship_from_id = ship_from_id_match.group(1) if ship_from_id_match else ""
-    address_block_match = re.search(r'Ship From:.*?\n(.*?)Order No\.', text, re.DOTALL)
-    if address_block_match:
-        addr_lines = address_block_match.group(1).strip().splitlines()
-        ship_from_addr = ", ".join(l.strip() for l in addr_lines if l.strip())
-    else:
-        ship_from_addr = ""
-    ship_from = f"{ship_from_id} – {ship_from_addr}" if ship_from_id else ship_from_addr
-
-    ship_to_header = re.search(r'Ship To:(.+)', text)
-    to_name = clean_text(ship_to_header.group(1)) if ship_to_header else ""
-    to_addr_match = re.search(r'Export Processing Zone\s+([\w\d].*?)\n.*?Bethlehem', text, re.DOTALL)
-    to_street = clean_text(to_addr_match.group(1)) if to_addr_match else ""
-    to_city_match = re.search(r'(Bethlehem PA \d+)', text)
-    to_city = clean_text(to_city_match.group(1)) if to_city_match else ""
-    ship_to = ", ".join(filter(None, [to_name, to_street, to_city]))
-
-    carton_match = re.search(r'CARTON NUMBER\s+(\d+)\s+of\s+(\d+)', text, re.IGNORECASE)
-    carton_no = carton_match.group(1) if carton_match else ""
-    total_cartons = carton_match.group(2) if carton_match else ""
-    carton_label = f"{carton_no} of {total_cartons}" if carton_no else ""
-
-    carton_total_match = re.search(r'CARTON TOTAL\s+(\d+)', text, re.IGNORECASE)
-    carton_total = carton_total_match.group(1) if carton_total_match else ""
-
-    label_total_match = re.search(r'LABEL TOTAL\s+(\d+)', text, re.IGNORECASE)
-    label_total = label_total_match.group(1) if label_total_match else ""
-
-    sscc_raw_match = re.search(r'\(00\)([\d\s]+)', text)
-    if sscc_raw_match:
-        raw = sscc_raw_match.group(0).split('\n')[0].strip()
-        sscc_display = raw
-        sscc_digits = re.sub(r'[^\d]', '', raw)[:20]
-    else:
-        sscc_display = sscc_digits = ""
-
-    table_match = re.search(
-        r'Material\s*#\s+Size\s+Quantity\s*\n(.*?)LABEL TOTAL',
-        text, re.DOTALL | re.IGNORECASE
-    )
-    if table_match:
-        for line in table_match.group(1).strip().splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.split()
-            if len(parts) >= 3:
-                material, size, qty = parts[0], parts[1], parts[2]
-            elif len(parts) == 2:
-                material, size, qty = parts[0], parts[1], ""
-            else:
-                continue
-            rows.append({
-                "Order No.": order_no, "Seq No.": seq_no, "Destination": destination,
-                "Ship From": ship_from, "Ship To": ship_to,
-                "Material #": material, "Size": size, "Quantity": qty,
-                "Label Total": label_total, "Carton Total": carton_total,
-                "Carton No.": carton_label,
-                "SSCC (display)": sscc_display, "SSCC (digits)": sscc_digits,
-            })
-
-    if not rows:
-        rows.append({
-            "Order No.": order_no, "Seq No.": seq_no, "Destination": destination,
-            "Ship From": ship_from, "Ship To": ship_to,
-            "Material #": "", "Size": "", "Quantity": "",
-            "Label Total": label_total, "Carton Total": carton_total,
-            "Carton No.": carton_label,
-            "SSCC (display)": sscc_display, "SSCC (digits)": sscc_digits,
-        })
-
-    return rows
-
-
-def merge_sscc_groups(df):
-    def _merge(group):
-        first = group.iloc[0].copy()
-        if len(group) > 1:
-            first["Size"] = "/".join(group["Size"].tolist())
-            first["Size Detail"] = "/".join(
-                f'{r["Size"]}{r["Quantity"]}' for _, r in group.iterrows()
-            )
-            first["Quantity"] = str(sum(
-                int(q) for q in group["Quantity"] if str(q).isdigit()
-            ))
-        else:
-            first["Size Detail"] = ""
-        return first
-
-    return (
-        df.groupby("SSCC (digits)", sort=False, group_keys=False)
-          .apply(_merge)
-          .reset_index(drop=True)
-    )
+JOB_STATUS_ICONS = {"queued": "⏳", "running": "⚙️", "done": "✅", "failed": "❌", "cancelled": "🚫"}
 
 
-CMUS_COLUMN_ORDER = [
-    "Order No.", "Seq No.", "Destination",
-    "Ship From", "Ship To",
-    "Material #", "Size", "Size Detail", "Quantity",
-    "Label Total", "Carton Total", "Carton No.",
-    "SSCC (display)", "SSCC (digits)",
-]
-
-CMUS_COL_WIDTHS = {
-    "Order No.": 16, "Seq No.": 8, "Destination": 13,
-    "Ship From": 40, "Ship To": 35, "Material #": 18,
-    "Size": 10, "Size Detail": 22, "Quantity": 10,
-    "Label Total": 12, "Carton Total": 12, "Carton No.": 13,
-    "SSCC (display)": 30, "SSCC (digits)": 25,
-}
+def cancel_job(job_id, owner):
+    queue = JobQueue()
+    try:
+        queue.cancel(job_id, owner=owner)
+    finally:
+        queue.close()
 
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Excel builder
-# ─────────────────────────────────────────────────────────────────────────────
-def build_excel(df, col_widths, summary_df=None, highlight_mixed=True, dup_df=None):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Shipping_Data')
-        workbook = writer.book
-        worksheet = writer.sheets['Shipping_Data']
-
-        header_fmt = workbook.add_format({
-            'bold': True, 'bg_color': '#1E1E1E', 'font_color': 'white',
-            'border': 1, 'align': 'center', 'valign': 'vcenter',
-        })
-        data_fmt = workbook.add_format({'border': 1, 'valign': 'vcenter'})
-        mixed_fmt = workbook.add_format({
-            'border': 1, 'valign': 'vcenter', 'bg_color': '#FFF9C4',
-        })
-        review_fmt = workbook.add_format({
-            'border': 1, 'valign': 'vcenter', 'bg_color': '#FFCDD2',
-        })
-
-        for col_num, col_name in enumerate(df.columns):
-            worksheet.write(0, col_num, col_name, header_fmt)
-            worksheet.set_column(col_num, col_num, col_widths.get(col_name, 18))
-
-        for row_idx, row in df.iterrows():
-            needs_review = highlight_mixed and str(row.get("Needs Review", "")).lower() == "yes"
-            is_mixed = highlight_mixed and "/" in str(row.get("Size", ""))
-            fmt = review_fmt if needs_review else (mixed_fmt if is_mixed else data_fmt)
-            for col_idx, col_name in enumerate(df.columns):
-                worksheet.write(row_idx + 1, col_idx, row[col_name], fmt)
-
-        worksheet.set_row(0, 20)
-        worksheet.freeze_panes(1, 0)
-
-        if summary_df is not None and not summary_df.empty:
-            summary_df.to_excel(writer, index=False, sheet_name='Summary')
-            ws2 = writer.sheets['Summary']
-            for col_num, col_name in enumerate(summary_df.columns):
-                ws2.write(0, col_num, col_name, header_fmt)
-                ws2.set_column(col_num, col_num, max(14, len(str(col_name)) + 4))
-            ws2.set_row(0, 20)
-
-        if dup_df is not None and not dup_df.empty:
-            dup_df.to_excel(writer, index=False, sheet_name='Duplicates_Removed')
-            ws3 = writer.sheets['Duplicates_Removed']
-            for col_num, col_name in enumerate(dup_df.columns):
-                ws3.write(0, col_num, col_name, header_fmt)
-                ws3.set_column(col_num, col_num, col_widths.get(col_name, 18))
-            ws3.set_row(0, 20)
-
-    return output.getvalue()
+@st.fragment(run_every=3)
+def show_jobs(owner):
+    """`owner`'s recent jobs with progress, downloads and cancel; refreshes itself every few seconds."""
+    queue = JobQueue()
+    try:
+        st.markdown("#### 🗂️ Background jobs")
+        if not queue.workers_online():
+            st.warning("Job worker එකක් ධාවනය නොවේ. Start one with `python jobs.py worker`.")
+        jobs = queue.jobs(owner=owner, limit=20)
+        # Read the finished reports now: the connection is closed when the fragment returns.
+        outputs = {job["id"]: queue.output_paths(job) for job in jobs}
+    finally:
+        queue.close()
+    if not jobs:
+        st.caption("No jobs yet.")
+    for job in jobs:
+        files = ", ".join(job["files"][:3]) + (f" +{len(job['files']) - 3}" if len(job["files"]) > 3 else "")
+        c1, c2, c3 = st.columns([3, 4, 3])
+        c1.markdown(f"{JOB_STATUS_ICONS.get(job['status'], '')} `{job['id']}`  \n{files}")
+        if job["status"] == "running" and job["pages_total"]:
+            c2.progress(job["pages_done"] / job["pages_total"], text=f"{job['pages_done']:,} / {job['pages_total']:,} pages")
+        elif job["status"] == "failed":
+            c2.error(job["message"])
+        else:
+            c2.write(job["status"])
+        if job["status"] in ("queued", "running"):
+            c3.button("Cancel", key=f"cancel_{job['id']}", on_click=cancel_job, args=(job["id"], owner))
+        for path in outputs[job["id"]]:
+            c3.download_button(
+                label=f"📥 {path.name}", data=path.read_bytes, file_name=path.name,
+                mime=REPORT_MIME.get(path.suffix.lstrip("."), "application/octet-stream"),
+                key=f"download_{job['id']}_{path.name}", on_click="ignore",
+            )
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Main
 # ─────────────────────────────────────────────────────────────────────────────
-if uploaded_files:
+options = {"ocr_mode": ocr_mode, "text_backend": text_backend, "profile": profile, "low_memory": low_memory}
+if use_cache:
+    options["cache_path"] = DEFAULT_CACHE_PATH
+
+if background and not job_owner:
+    st.info("Background jobs සඳහා sidebar එකේ ඔබේ නම ඇතුළත් කරන්න (enter your name in the sidebar).")
+elif uploaded_files and background:
+    if st.button("🚀 Submit as background job"):
+        job_options = {**options, "report_formats": ("xlsx",) + tuple(export_formats)}
+        queue = JobQueue()
+        try:
+            job_id = queue.submit(((uf.name, uf.getvalue()) for uf in uploaded_files), job_options, owner=job_owner)
+        finally:
+            queue.close()
+        st.success(
+            f"Job `{job_id}` queued. Results appear below when it is done — you can close this tab "
+            f"and find them again under the name “{job_owner}”."
+        )
+elif uploaded_files:
     try:
-        carton_rows = []
-        cmus_rows = []
-        ocr_pages_processed = 0
-
-        with st.spinner("දත්ත කියවමින් පවතී... (OCR අවශ්‍ය pages සඳහා තත්පර කිහිපයක් ගත විය හැක)"):
-            for uf in uploaded_files:
-                file_bytes = uf.read()
-
-                with pdfplumber.open(io.BytesIO(file_bytes)) as pdf, \
-                     fitz.open(stream=file_bytes, filetype="pdf") as fdoc:
-
-                    total_pages = len(pdf.pages)
-                    progress = st.progress(0.0, text=f"{uf.name} — processing…")
-                    file_ocr_rows = []
-
-                    for i, page in enumerate(pdf.pages):
-                        text = page.extract_text()
-                        fmt, is_reversed = detect_text_format(text)
-
-                        if fmt == "cmus":
-                            cmus_rows.extend(extract_label_data(text))
-
-                        elif fmt == "carton_text":
-                            row = parse_carton_text(text, i + 1, is_reversed=is_reversed)
-                            values, _ = decode_page_barcodes(fdoc[i])
-                            barcode, gtin = pick_carton_and_gtin(values)
-                            carton_no, carton_seq = split_carton_barcode(barcode)
-                            row["Carton Barcode"] = barcode
-                            row["Carton No."] = carton_no
-                            row["Carton Seq"] = carton_seq
-                            if gtin and not row.get("GTIN (01)"):
-                                row["GTIN (01)"] = gtin
-                            row["File"] = uf.name
-                            row["Format"] = "Text"
-                            row["Needs Review"] = ""
-                            carton_rows.append(row)
-
-                        else:
-                            values, rotated_img = decode_page_barcodes(fdoc[i])
-                            barcode, gtin = pick_carton_and_gtin(values)
-                            if not barcode:
-                                if total_pages:
-                                    progress.progress((i + 1) / total_pages)
-                                continue
-                            row = parse_carton_ocr(rotated_img, i + 1)
-                            ew, eh = EXPECTED_CANVAS
-                            rw, rh = rotated_img.size
-                            if abs(rw - ew) / ew < 0.03 and abs(rh - eh) / eh < 0.03:
-                                row["Grid / Ref No."] = ocr_corner_number(rotated_img)
-                            else:
-                                row["Grid / Ref No."] = ""
-                            carton_no, carton_seq = split_carton_barcode(barcode)
-                            row["Carton Barcode"] = barcode
-                            row["Carton No."] = carton_no
-                            row["Carton Seq"] = carton_seq
-                            if gtin:
-                                row["GTIN (01)"] = gtin
-                            row["File"] = uf.name
-                            row["Format"] = "OCR"
-                            file_ocr_rows.append(row)
-                            ocr_pages_processed += 1
-
-                        if total_pages:
-                            progress.progress((i + 1) / total_pages)
-
-                    progress.empty()
-
-                    file_ocr_rows = apply_batch_mode_correction(file_ocr_rows)
-                    carton_rows.extend(file_ocr_rows)
+        # Widget interactions rerun this script; only re-extract when the
+        # uploaded files (or an option that changes the rows) change.
+        key = (upload_key(uploaded_files), ocr_mode, text_backend, profile, low_memory)
+        if st.session_state.get("results_key") != key:
+            # Finished pages are journalled per upload set, so a run cut short
+            # (tab closed, app restarted) picks up where it stopped.
+            journal_path = os.path.join(DEFAULT_JOURNAL_DIR, hashlib.sha256(repr(key).encode()).hexdigest()[:32] + ".sqlite")
+            # Another session with the same upload set shares the journal; the
+            # last one to finish deletes it. Journals of runs that never
+            # finished are purged after JOURNAL_MAX_AGE_DAYS (7) untouched.
+            purge_journals()
+            with journal_user(journal_path):
+                st.session_state["results"] = process_uploads(
+                    uploaded_files, int(workers), {**options, "journal_path": journal_path},
+                )
+            st.session_state["results_key"] = key
+            discard_journal(journal_path)
+        results = st.session_state["results"]
+        stats = results["stats"]
+        ocr_pages_processed = stats["ocr_pages"]
 
         # ── Carton-label rows ─────────────────────────────────────────────
-        if carton_rows:
-            df = pd.DataFrame(carton_rows)
-            for col in CARTON_COLUMN_ORDER:
-                if col not in df.columns:
-                    df[col] = ""
-            df = df[CARTON_COLUMN_ORDER].astype(str).replace("nan", "")
-
-            before = len(df)
-            has_barcode = df["Carton Barcode"] != ""
-            dup_mask = has_barcode & df.duplicated(subset=["Carton Barcode"], keep="first")
-            dup_df = df[dup_mask].copy()
-            df = df[~dup_mask].reset_index(drop=True)
-            removed = before - len(df)
+        if results["carton"]:
+            df = results["carton"]["df"]
+            dup_df = results["carton"]["dup_df"]
+            summary = results["carton"]["summary"]
+            removed = len(dup_df)
 
             total_cartons = len(df)
             total_qty = sum(int(q) for q in df["Qty"] if str(q).isdigit())
 
-            c1, c2, c3, c4 = st.columns(4)
+            c1, c2, c3, c4, c5, c6 = st.columns(6)
             c1.metric("මුළු Cartons (unique)", f"{total_cartons:,}")
             c2.metric("මුළු Qty", f"{total_qty:,}")
             c3.metric("Duplicate barcodes ඉවත් කළ ගණන", f"{removed:,}")
             c4.metric("OCR කළ Pages ගණන", f"{ocr_pages_processed:,}")
+            c5.metric("Cache hits (pages)", f"{stats['cache_hits']:,}")
+            c6.metric("Cache misses (pages)", f"{stats['cache_misses']:,}")
+            tiers = sorted((k for k in stats if k.startswith("barcode_zoom_")), key=lambda k: float(k.rsplit("_", 1)[1]))
+            if tiers or stats["barcode_text"]:
+                parts = [f"text layer → {stats['barcode_text']:,} pages"] if stats["barcode_text"] else []
+                parts += [f"×{k.rsplit('_', 1)[1]} → {stats[k]:,} pages" for k in tiers]
+                st.caption("Barcode source / decode zoom tier: " + ", ".join(parts))
+            hit_rate = rotation_hit_rate(stats)
+            if hit_rate is not None:
+                st.caption(
+                    f"Learned orientation hit rate: {hit_rate:.1%} "
+                    f"({stats['rotations_tried']:,} zbar passes)"
+                )
+            fallback = ocr_fallback_ratio(stats)
+            if fallback is not None:
+                st.caption(
+                    f"Scanned labels read by full-page OCR (no matching label template): {fallback:.1%} "
+                    f"({stats['ocr_fallback']:,} labels)"
+                )
+            if stats["duplicate_pages"] or stats["duplicate_barcodes"]:
+                st.caption(
+                    f"Duplicates skipped before OCR: {stats['duplicate_pages']:,} repeated pages, "
+                    f"{stats['duplicate_barcodes']:,} labels with an already-read carton barcode"
+                )
+            if stats["journal_hits"]:
+                st.caption(f"Resumed an interrupted run: {stats['journal_hits']:,} pages were already done.")
 
             st.success(f"✅ Cartons {total_cartons:,} ක දත්ත සාර්ථකව හඳුනා ගන්නා ලදී!")
             if removed:
@@ -732,14 +370,6 @@ if uploaded_files:
                 )
             st.dataframe(df, use_container_width=True, height=420)
 
-            summary = (
-                df.assign(_q=pd.to_numeric(df["Qty"], errors="coerce").fillna(0).astype(int))
-                  .groupby(["File", "Ship To", "PO #", "Style / Color", "Color", "Size"], as_index=False)
-                  .agg(**{"Cartons": ("_q", "size"), "Total Qty": ("_q", "sum")})
-            )
-            summary["Total Qty"] = summary["Total Qty"].astype(str)
-            summary["Cartons"] = summary["Cartons"].astype(str)
-
             with st.expander("📋 සාරාංශය (Summary)"):
                 st.dataframe(summary, use_container_width=True)
 
@@ -747,31 +377,18 @@ if uploaded_files:
                 with st.expander(f"🗑️ ඉවත් කළ Duplicate Cartons ({len(dup_df)})"):
                     st.dataframe(dup_df, use_container_width=True)
 
-            excel_bytes = build_excel(
-                df, CARTON_COL_WIDTHS, summary_df=summary,
-                highlight_mixed=True, dup_df=dup_df,
-            )
             st.download_button(
                 label="📥 Download Master Excel File",
-                data=excel_bytes,
+                data=results["carton"]["excel"],
                 file_name="Carton_Master_Report.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             )
+            export_buttons(df, CARTON_SCHEMA, "Carton_Master_Report.xlsx")
 
         # ── CMUS format ───────────────────────────────────────────────────
-        if cmus_rows:
-            df2 = pd.DataFrame(cmus_rows)
-            df2 = merge_sscc_groups(df2)
-            for col in CMUS_COLUMN_ORDER:
-                if col not in df2.columns:
-                    df2[col] = ""
-            df2 = df2[CMUS_COLUMN_ORDER].astype(str).replace("nan", "")
-
-            before2 = len(df2)
-            has_sscc = df2["SSCC (digits)"] != ""
-            dup_mask2 = has_sscc & df2.duplicated(subset=["SSCC (digits)"], keep="first")
-            df2 = df2[~dup_mask2].reset_index(drop=True)
-            removed2 = before2 - len(df2)
+        if results["cmus"]:
+            df2 = results["cmus"]["df"]
+            removed2 = results["cmus"]["removed"]
 
             total_labels = df2["Carton No."].nunique()
             st.success(
@@ -781,20 +398,36 @@ if uploaded_files:
                 st.warning(f"⚠️ Duplicate SSCC තිබූ පේළි {removed2:,} ක් ඉවත් කරන ලදී.")
             st.dataframe(df2, use_container_width=True)
 
-            excel_bytes2 = build_excel(df2, CMUS_COL_WIDTHS, highlight_mixed=True)
             st.download_button(
                 label="📥 Download CMUS Master Excel File",
-                data=excel_bytes2,
+                data=results["cmus"]["excel"],
                 file_name="Shipping_Master_Report.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             )
+            export_buttons(df2, CMUS_SCHEMA, "Shipping_Master_Report.xlsx")
 
-        if not carton_rows and not cmus_rows:
+        if results["timings"]:
+            with st.expander("⏱️ Stage timings"):
+                st.dataframe(
+                    results["timings"]["summary"], use_container_width=True,
+                    column_config={"Share": st.column_config.NumberColumn(format="percent")},
+                )
+                st.download_button(
+                    label="📥 Download timings (JSON)",
+                    data=results["timings"]["json"],
+                    file_name="stage_timings.json",
+                    mime="application/json",
+                )
+
+        if not results["carton"] and not results["cmus"]:
             st.warning("PDF එකෙන් දත්ත හඳුනා ගත නොහැකි විය. (Format එක support නොකරයි)")
 
     except Exception as e:
         st.error(f"දෝෂයක් සිදුවිය: {e}")
         raise
 
+if background and job_owner:
+    show_jobs(job_owner)
+
 st.markdown("---")
 st.caption("© 2026 AI Shipping Tool | Developed by **Ishanka Madusanka**")
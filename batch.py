@@ -0,0 +1,267 @@
+"""
+Headless batch runner: extract every PDF in a directory and write the
+master workbooks without going through the Streamlit upload widget.
+
+    python batch.py /path/to/labels -o /path/to/reports
+    python batch.py /path/to/labels --formats xlsx,parquet
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from exporters import CARTON_SCHEMA, CMUS_SCHEMA, REPORT_FORMATS, parse_formats, report_file_name, write_table
+from ocr_engine import ENGINE_NAMES, engine_name
+from profiling import timings_frame, timings_json, timings_summary
+from page_cache import DEFAULT_CACHE_MAX_MB, DEFAULT_CACHE_PATH, discard_journal
+from extractor import (
+    BARCODE_ZOOMS,
+    CARTON_COL_WIDTHS,
+    OCR_MODES,
+    TEXT_BACKENDS,
+    CMUS_COL_WIDTHS,
+    build_carton_report,
+    build_cmus_report,
+    build_excel,
+    extract_files,
+    ocr_fallback_ratio,
+    rotation_hit_rate,
+)
+
+CARTON_REPORT_NAME = "Carton_Master_Report.xlsx"
+CMUS_REPORT_NAME = "Shipping_Master_Report.xlsx"
+
+
+def find_pdfs(input_dir):
+    return sorted(p for p in Path(input_dir).iterdir() if p.is_file() and p.suffix.lower() == ".pdf")
+
+
+def write_reports(out_dir, carton_rows, cmus_rows, timings_tables=None, formats=("xlsx",)):
+    """
+    Write the master reports for the rows found, one file per format in
+    `formats` (see exporters.REPORT_FORMATS); returns [(path, summary line)].
+    """
+    written = []
+    if carton_rows:
+        df, dup_df, summary = build_carton_report(carton_rows)
+        note = f"{len(df):,} cartons, {len(dup_df):,} duplicates removed"
+        for fmt in formats:
+            path = Path(out_dir) / report_file_name(CARTON_REPORT_NAME, fmt)
+            if fmt == "xlsx":
+                build_excel(
+                    df, CARTON_COL_WIDTHS, summary_df=summary,
+                    highlight_mixed=True, dup_df=dup_df, path=str(path),
+                    timings_tables=timings_tables,
+                )
+            else:
+                write_table(df, CARTON_SCHEMA, fmt, str(path))
+            written.append((path, note))
+
+    if cmus_rows:
+        df2, removed2 = build_cmus_report(cmus_rows)
+        note = f"{len(df2):,} rows, {removed2:,} duplicate SSCCs removed"
+        for fmt in formats:
+            path = Path(out_dir) / report_file_name(CMUS_REPORT_NAME, fmt)
+            if fmt == "xlsx":
+                build_excel(df2, CMUS_COL_WIDTHS, highlight_mixed=True, path=str(path), timings_tables=timings_tables)
+            else:
+                write_table(df2, CMUS_SCHEMA, fmt, str(path))
+            written.append((path, note))
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a directory of label PDFs into master Excel reports.")
+    parser.add_argument("input_dir", help="directory containing the PDF label files")
+    parser.add_argument("-o", "--output-dir", default=".", help="where to write the reports (default: current directory)")
+    parser.add_argument(
+        "-j", "--workers", type=int, default=os.cpu_count() or 1,
+        help="worker processes for page-level parallelism (default: all cores, 1 = serial)",
+    )
+    parser.add_argument(
+        "--formats", default="xlsx",
+        help=f"comma-separated report formats to write: {', '.join(REPORT_FORMATS)} (default: xlsx); "
+        "parquet / csv / arrow hold the master rows with typed columns",
+    )
+    parser.add_argument(
+        "--barcode-zooms", default=",".join(str(z) for z in BARCODE_ZOOMS),
+        help="comma-separated render zooms tried for barcode decoding, cheapest first",
+    )
+    parser.add_argument(
+        "--ocr-engine", choices=ENGINE_NAMES, default="auto",
+        help="auto = persistent tesserocr engine when installed, else the pytesseract subprocess",
+    )
+    parser.add_argument(
+        "--ocr-mode", choices=OCR_MODES, default="fields",
+        help="fields = one OCR call per field box, layout = one word-box pass per label "
+             "(experimental: not yet measured against fields, see benchmarks/bench_ocr_modes.py)",
+    )
+    parser.add_argument(
+        "--learn-psm-order", action="store_true",
+        help="try the Tesseract modes that read each field on earlier pages of a file first: fewer OCR runs, "
+        "but a label's read can then depend on the pages before it (and on -j chunking)",
+    )
+    parser.add_argument(
+        "--text-backend", choices=TEXT_BACKENDS, default="fitz",
+        help="fitz = MuPDF text layer (fast), pdfplumber = the original pdfminer text extraction",
+    )
+    parser.add_argument(
+        "--render-barcodes", action="store_true",
+        help="always decode text-layer labels from a page render, even when the printed SSCC validates",
+    )
+    parser.add_argument(
+        "--no-routing", action="store_true",
+        help="detect every page on its own instead of routing whole files by their first pages",
+    )
+    parser.add_argument(
+        "--skip-unmatched-pages", action="store_true",
+        help="in a text-layer file, drop pages whose text no parser recognises (cover / summary sheets) "
+        "instead of decoding and OCR-ing them",
+    )
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"page result cache (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_CACHE_MAX_MB, help="evict least-recently-used pages beyond this size")
+    parser.add_argument("--no-cache", action="store_true", help="always reprocess every page")
+    parser.add_argument(
+        "--no-skip-duplicates", action="store_true",
+        help="process repeated pages and OCR every scanned label, even when its carton barcode was already read",
+    )
+    parser.add_argument(
+        "--low-memory", action="store_true",
+        help="bound per-worker memory: render straight to grayscale, free MuPDF caches after every page "
+             "and recycle pool workers",
+    )
+    parser.add_argument(
+        "--journal", metavar="PATH",
+        help="record finished pages in PATH; rerunning an interrupted batch with the same PATH "
+             "skips them (removed after a successful run)",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="time every stage per page, print the breakdown and add a Timings sheet to the workbooks",
+    )
+    parser.add_argument("--profile-json", metavar="PATH", help="also write the stage timings as JSON (implies --profile)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the final summary")
+    args = parser.parse_args(argv)
+    try:
+        args.formats = parse_formats(args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pdfs = find_pdfs(args.input_dir)
+    if not pdfs:
+        print(f"No PDF files found in {args.input_dir}", file=sys.stderr)
+        return 1
+    out_dir = Path(args.output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def show_progress(name, done, total):
+        if not args.quiet and done == total:
+            print(f"  {name}: {total} pages")
+
+    options = {
+        "barcode_zooms": tuple(float(z) for z in args.barcode_zooms.split(",")),
+        "ocr_engine": args.ocr_engine,
+        "ocr_mode": args.ocr_mode,
+        "text_backend": args.text_backend,
+        "text_barcodes": not args.render_barcodes,
+        "route_files": not args.no_routing,
+        "skip_unmatched_pages": args.skip_unmatched_pages,
+        "low_memory": args.low_memory,
+        "learn_psm_order": args.learn_psm_order,
+        "skip_duplicates": not args.no_skip_duplicates,
+    }
+    if not args.no_cache:
+        options.update(cache_path=args.cache, cache_max_mb=args.cache_max_mb)
+    if args.journal:
+        options["journal_path"] = args.journal
+    profile = args.profile or bool(args.profile_json)
+    if profile:
+        options["profile"] = True
+
+    stats = Counter()
+    timings = [] if profile else None
+    started = time.perf_counter()
+    carton_rows, cmus_rows = extract_files(
+        ((p.name, str(p)) for p in pdfs), progress=show_progress, stats=stats,
+        workers=args.workers, options=options, timings=timings,
+    )
+    elapsed = time.perf_counter() - started
+    timings_tables = [timings_summary(timings), timings_frame(timings)] if timings else None
+    excel_started = time.perf_counter()
+
+    for path, note in write_reports(out_dir, carton_rows, cmus_rows, timings_tables, args.formats):
+        print(f"{path}: {note}")
+    if args.journal:
+        discard_journal(args.journal)
+
+    if not carton_rows and not cmus_rows:
+        print("No label data recognised (unsupported format).", file=sys.stderr)
+    excel_seconds = time.perf_counter() - excel_started
+
+    pages = stats["pages"]
+    rate = pages / elapsed if elapsed else 0.0
+    print(
+        f"{stats['files']} files, {pages:,} pages ({stats['ocr_pages']:,} OCR) "
+        f"in {elapsed:.1f}s with {args.workers} worker(s) — {rate:.2f} pages/sec"
+    )
+    tiers = sorted((k for k in stats if k.startswith("barcode_zoom_")), key=lambda k: float(k.rsplit("_", 1)[1]))
+    if tiers or stats["barcode_none"] or stats["barcode_text"]:
+        parts = [f"text layer: {stats['barcode_text']:,}"] if stats["barcode_text"] else []
+        parts += [f"zoom {k.rsplit('_', 1)[1]}: {stats[k]:,}" for k in tiers]
+        parts.append(f"not found: {stats['barcode_none']:,}")
+        print("barcode decode tier: " + ", ".join(parts))
+    routes = [k for k in stats if k.startswith("route_") and k not in ("route_skipped", "route_unmatched")]
+    if routes:
+        parts = [f"{k[len('route_'):]}: {stats[k]:,}" for k in sorted(routes)]
+        if stats["route_unmatched"]:
+            parts.append(f"unmatched text pages decoded / OCR'd: {stats['route_unmatched']:,}")
+        if stats["route_skipped"]:
+            parts.append(f"unmatched text pages skipped: {stats['route_skipped']:,}")
+        print("file routing (pages): " + ", ".join(parts))
+    if stats["ocr_calls"]:
+        print(
+            f"field OCR ({engine_name(args.ocr_engine)}): {stats['ocr_calls']:,} Tesseract runs "
+            f"({stats['ocr_retries']:,} retries) "
+            f"over {stats['ocr_pages']:,} OCR pages"
+        )
+    if stats["duplicate_pages"] or stats["duplicate_barcodes"]:
+        print(
+            f"duplicates skipped: {stats['duplicate_pages']:,} repeated pages, "
+            f"{stats['duplicate_barcodes']:,} scanned labels with an already-read carton barcode "
+            f"({stats['ocr_reused']:,} OCR pages reused, not voting in the correction)"
+        )
+    fallback = ocr_fallback_ratio(stats)
+    if fallback is not None:
+        templates = sorted(k for k in stats if k.startswith("ocr_template_"))
+        parts = [f"{k[len('ocr_template_'):]}: {stats[k]:,}" for k in templates]
+        parts.append(f"full-page fallback: {stats['ocr_fallback']:,}")
+        print(f"label templates: {', '.join(parts)} (fallback ratio {fallback:.1%})")
+    hit_rate = rotation_hit_rate(stats)
+    if hit_rate is not None:
+        print(f"learned orientation hit rate: {hit_rate:.1%} ({stats['rotations_tried']:,} zbar passes)")
+    if not args.no_cache:
+        print(f"page cache: {stats['cache_hits']:,} hits, {stats['cache_misses']:,} misses")
+    if args.journal:
+        print(f"resumed from journal: {stats['journal_hits']:,} of {pages:,} pages")
+    if timings:
+        extra = {"build_excel": excel_seconds}
+        print("stage timings:")
+        print(timings_summary(timings, extra).to_string(
+            index=False, formatters={"Share": lambda v: "" if v != v else f"{v:.1%}"}, float_format="{:.3f}".format,
+        ))
+        if args.profile_json:
+            Path(args.profile_json).write_text(timings_json(
+                timings, extra, files=stats["files"], workers=args.workers, elapsed_s=elapsed,
+            ))
+            print(f"stage timings written to {args.profile_json}")
+    return 0 if carton_rows or cmus_rows else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Per-page cost and parity of the text-layer carton parser.
+
+    python benchmarks/bench_carton_text.py --pages 10000
+    python benchmarks/bench_carton_text.py --pdfs /path/to/pdfs
+
+Generates carton label texts covering every field fallback (style split
+over "-" lines, size tokens on their own line, "grid" counts a few lines
+away, GTIN head + 11-digit run, QTY / PO variants, reversed labels with
+blank and padded lines) plus non-carton pages, then checks
+detect_text_format and parse_carton_text against the previous
+implementation kept here, and times both. --pdfs adds every page of the
+PDFs in a directory to the parity check. Exits non-zero on any mismatch.
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import extractor  # noqa: E402
+from extractor import clean_text, extract_color, gtin_check_digit, reverse_lines  # noqa: E402
+
+
+# ── Previous implementation (reference) ─────────────────────────────────────
+def legacy_detect_text_format(text):
+    if not text:
+        return None, False
+    if "Material #" in text or "Ship From:" in text:
+        return "cmus", False
+    if "CARTON" in text and ("(01)" in text or "STYLE/COLOR" in text or "SHIP TO" in text or "PO#" in text or "PO " in text):
+        return "carton_text", False
+    rev = " ".join(reverse_lines(text))
+    if "CARTON" in rev and ("(01)" in rev or "STYLE/COLOR" in rev or "SHIP TO" in rev or "PO#" in rev or "PO " in rev):
+        return "carton_text", True
+    return None, False
+
+
+def legacy_extract_description(text):
+    for line in text.split("\n"):
+        words = re.findall(r"[A-Za-z]{2,}", line)
+        if len(words) < 2 or re.search(r'\d', line):
+            continue
+        upper_words = [w.upper() for w in words]
+        if any(any(ex in w for ex in extractor.DESC_EXCLUDE) for w in upper_words):
+            continue
+        if len(upper_words) == 2 and len(upper_words[1]) <= 2:
+            continue
+        return " ".join(words).upper()
+    return ""
+
+
+def legacy_parse_carton_text(text, page_no, is_reversed=False):
+    lines = reverse_lines(text) if is_reversed else [l.strip() for l in text.split('\n') if l.strip()]
+    joined = " ".join(lines)
+
+    ship_to = ""
+    m_dc = re.search(r'SHIP\s*TO:\s*([A-Za-z0-9\s.]+?)(?=\s*Date:|\s*QTY|\s*MCDONOUGH|\s*CARTON|\n|$)', joined, re.IGNORECASE)
+    ship_dc = clean_text(m_dc.group(1)) if m_dc else ""
+    m_city = re.search(r'\b([A-Z]{3,}(?:\s+[A-Z]{2,})?)\s+([A-Z]{2})\b', joined)
+    ship_city = f"{m_city.group(1)} {m_city.group(2)}" if m_city else ""
+    if ship_dc and ship_city:
+        ship_to = ship_dc if ship_city in ship_dc else f"{ship_dc}, {ship_city}"
+    else:
+        ship_to = ship_dc or ship_city
+
+    m_date = re.search(r'(\d{1,2}/\d{1,2}/\d{4})', joined)
+    date = m_date.group(1) if m_date else ""
+
+    m_qty = re.search(r'\bQTY\s*(\d{1,3})\b', joined, re.IGNORECASE)
+    if not m_qty:
+        m_qty = re.search(r'\b(\d{1,3})\s*QTY\b', joined, re.IGNORECASE)
+    qty = m_qty.group(1) if m_qty else ""
+
+    m_po = re.search(r'\b(4\d{9})\b', joined)
+    if not m_po:
+        m_po = re.search(r'PO#?\s*(4?\d{6,10})', joined, re.IGNORECASE)
+    po = m_po.group(1) if m_po else ""
+
+    style = ""
+    for i, l in enumerate(lines):
+        if l == "-":
+            left = lines[i - 1] if i >= 1 else ""
+            right = lines[i + 1] if i + 1 < len(lines) else ""
+            cands = [t for t in (left, right) if re.fullmatch(r'[A-Z0-9]{2,10}', t)]
+            if len(cands) == 2:
+                a, b = sorted(cands, key=len, reverse=True)
+                style = f"{a}-{b}"
+                break
+    if not style:
+        m_style = re.search(r'([A-Z]{2,6}\d{3,6}\s*-\s*[A-Z0-9]{1,4})', joined)
+        style = re.sub(r'\s*-\s*', '-', m_style.group(1)) if m_style else ""
+
+    gtin = ""
+    m_gtin = re.search(r'\(01\)\s*([\d\s]{12,18})', joined)
+    if m_gtin:
+        gtin_digits = re.sub(r'\D', '', m_gtin.group(1))
+        if len(gtin_digits) >= 13:
+            gtin = gtin_digits[:14]
+    if not gtin:
+        m_g_head = re.search(r'\(01\)(\d+)', joined)
+        if m_g_head:
+            head = m_g_head.group(1)
+            b = re.search(r'\b(\d{11})\b', joined)
+            if b:
+                d13 = head + b.group(1)
+                gtin = d13 + str(gtin_check_digit(d13))
+
+    color = extract_color(joined)
+
+    size = ""
+    m_size = re.search(r'\bSIZE\b\s*([A-Z]{1,4}\s*\d{0,2})', joined, re.IGNORECASE)
+    if m_size:
+        size = clean_text(m_size.group(1))
+    else:
+        size_tokens = {"XXS", "XS", "S", "M", "L", "XL", "XXL", "XXXL"}
+        for i, l in enumerate(lines):
+            if re.fullmatch(r'\d{2}', l):
+                for j in (i - 1, i + 1):
+                    if 0 <= j < len(lines) and lines[j] in size_tokens:
+                        size = f"{lines[j]} {l}"
+                        break
+                if size:
+                    break
+    if not size and "Prepack" in joined:
+        size = "Prepack"
+
+    grid_pcs = ""
+    m_grid = re.search(r'\(Complete Grid\)\s*(\d{1,4})', joined, re.IGNORECASE)
+    if m_grid:
+        grid_pcs = m_grid.group(1)
+    else:
+        for i, l in enumerate(lines):
+            if "grid" in l.lower():
+                for j in range(max(0, i - 3), min(len(lines), i + 4)):
+                    if re.fullmatch(r'\d{2,4}', lines[j]):
+                        grid_pcs = lines[j]
+                        break
+                if grid_pcs:
+                    break
+
+    status = "NON-CONFORMING" if re.search(r'NON-CONFORMING', joined, re.IGNORECASE) else ""
+    desc = legacy_extract_description("\n".join(lines))
+
+    return {
+        "Label No.": page_no, "Ship To": ship_to, "Date": date, "PO #": po,
+        "Style / Color": style, "Description": desc, "Color": color, "Size": size,
+        "Qty": qty, "GTIN (01)": gtin, "Grid / Ref No.": grid_pcs, "Status": status,
+    }
+
+
+# ── Synthetic pages ─────────────────────────────────────────────────────────
+def carton_lines(rng):
+    gtin13 = f"1001234{rng.randint(0, 99999):05d}{rng.randint(0, 9)}"
+    style, suffix = f"ABC{rng.randint(100, 99999)}", rng.choice(["BLK", "NV", "W1", "GRY"])
+    size, number = rng.choice(["XS", "S", "M", "L", "XL", "XXL", "Q"]), f"{rng.randint(10, 99)}"
+    lines = ["SHIP TO: " + rng.choice(["ATLANTA DC", "DALLAS", "Reno NV 2"]), "MCDONOUGH GA"]
+    lines.append(f"Date: {rng.randint(1, 12)}/{rng.randint(1, 28)}/2025")
+    lines.append(rng.choice([f"QTY {rng.randint(1, 48)}", f"{rng.randint(1, 48)} QTY", "QTY"]))
+    lines.append(rng.choice([f"PO# {rng.randint(4000000000, 4999999999)}", f"PO {rng.randint(100000, 9999999)}",
+                             str(rng.randint(4000000000, 4999999999))]))
+    lines.append("STYLE/COLOR")
+    lines += rng.choice([[style, "-", suffix], [suffix, "-", style], [f"{style} - {suffix}"], [style, "-", "x"]])
+    lines.append(rng.choice(["Navy Blue", "Black", "Light Grey", "Orange"]))
+    lines.append(f"CARTON {rng.randint(1, 999)} OF 999")
+    lines += rng.choice([[f"SIZE {size} {number}"], [size, number], [number, size], ["Prepack"], []])
+    gtin = gtin13 + str(gtin_check_digit(gtin13))
+    lines += rng.choice([[f"(01) {gtin[0]} {gtin[1:8]} {gtin[8:13]} {gtin[13]}"],
+                         [f"(01){gtin[:2]}", gtin[2:13]], [f"(01){gtin[:2]}"]])
+    lines += rng.choice([["(Complete Grid) 12"], ["Grid", "Ref"], ["PCS", "24", "x", "grid"], ["12", "a", "b", "c", "Grid"], []])
+    lines += rng.sample(["Cotton Shirt", "Mens Knit Polo", "NON-CONFORMING", "RFID", "DIM 12 x 10", "Unichela Private"], 3)
+    rng.shuffle(lines[-6:])
+    return lines
+
+
+def synthetic_pages(n, seed=0):
+    """[(text, page_no)] mixing upright, reversed and non-carton pages."""
+    rng = random.Random(seed)
+    pages = []
+    for k in range(n):
+        kind = rng.random()
+        if kind < 0.1:
+            text = rng.choice(["Ship From: VEND01\nMaterial # Size Quantity", "INVOICE\nTOTAL 12",
+                               "NOTRAC\nfoo", "NOTRAC\nOT\nPIHS", "", "CARTON\nnothing else"])
+        else:
+            lines = carton_lines(rng)
+            if kind < 0.45:
+                lines = [rng.choice(["", " ", "  "]) + l[::-1] + rng.choice(["", " "]) for l in lines]
+                lines.insert(rng.randrange(len(lines)), "")
+            text = "\n".join(lines)
+        pages.append((text, k + 1))
+    return pages
+
+
+def pdf_pages(directory):
+    pages = []
+    for path in sorted(Path(directory).glob("*.pdf")):
+        with extractor.open_page_source(str(path)) as src:
+            pages += [(src.text(i), i + 1) for i in range(len(src))]
+    return pages
+
+
+def parse(detect, parse_fn, pages):
+    out = []
+    for text, page_no in pages:
+        fmt, is_reversed = detect(text)
+        out.append((fmt, is_reversed, parse_fn(text, page_no, is_reversed=is_reversed) if fmt == "carton_text" else None))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=10000, help="synthetic pages")
+    parser.add_argument("--pdfs", help="directory of PDFs whose pages are added to the parity check")
+    parser.add_argument("--repeat", type=int, default=3, help="best-of runs")
+    args = parser.parse_args(argv)
+
+    pages = synthetic_pages(args.pages)
+    if args.pdfs:
+        pages += pdf_pages(args.pdfs)
+
+    implementations = {
+        "previous": (legacy_detect_text_format, legacy_parse_carton_text),
+        "current": (extractor.detect_text_format, extractor.parse_carton_text),
+    }
+    outputs, best = {}, {}
+    for name, (detect, parse_fn) in implementations.items():
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            outputs[name] = parse(detect, parse_fn, pages)
+            elapsed = time.perf_counter() - started
+            best[name] = min(best.get(name, elapsed), elapsed)
+
+    mismatches = [(page, a, b) for page, a, b in zip(pages, outputs["previous"], outputs["current"]) if a != b]
+    carton = sum(1 for fmt, _, _ in outputs["current"] if fmt == "carton_text")
+    print(f"{len(pages):,} pages ({carton:,} carton text)")
+    for name, seconds in best.items():
+        print(f"  {name:<9} {seconds:7.3f}s  {seconds / len(pages) * 1e6:8.1f} µs/page")
+    print(f"  speed-up: {best['previous'] / best['current']:.2f}x")
+    for (text, page_no), a, b in mismatches[:5]:
+        print(f"MISMATCH page {page_no}:\n{text}\n  previous: {a}\n  current:  {b}")
+    print(f"mismatches: {len(mismatches)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Rows/sec of the master-report Excel writer on synthetic carton rows.
+
+    python benchmarks/bench_excel.py --rows 1000,10000,50000
+
+Times build_excel() to bytes and straight to a file, next to the previous
+two-pass writer (df.to_excel, then every cell rewritten with its format)
+kept here as the baseline. --memory adds peak Python memory (tracemalloc).
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd  # noqa: E402
+
+import extractor  # noqa: E402
+
+
+def synthetic_rows(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        row = {col: "" for col in extractor.CARTON_COLUMN_ORDER}
+        row.update({
+            "File": f"batch_{i // 500}.pdf",
+            "Label No.": str(i % 500 + 1),
+            "Format": rng.choice(["Text", "OCR"]),
+            "Ship To": "ATLANTA DC, MCDONOUGH GA",
+            "Date": "1/2/2025",
+            "PO #": str(4500000000 + i // 200),
+            "Style / Color": f"ABC{i % 97:03d}-BLK",
+            "Description": "Cotton Shirt",
+            "Color": "Black",
+            "Size": rng.choice(["S", "M", "L", "S/M", "M/L"]),
+            "Qty": str(rng.randint(1, 48)),
+            "GTIN (01)": f"1001234567{i % 10000:04d}",
+            "Carton Barcode": f"0000012345{i:010d}",
+            "Needs Review": "Yes" if rng.random() < 0.05 else "",
+        })
+        rows.append(row)
+    return rows
+
+
+def legacy_build_excel(df, col_widths, summary_df=None, highlight_mixed=True, dup_df=None):
+    """The writer build_excel() replaced: pandas writes every cell, then a per-cell format pass."""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name='Shipping_Data')
+        workbook = writer.book
+        worksheet = writer.sheets['Shipping_Data']
+        header_fmt = workbook.add_format(extractor.HEADER_FORMAT)
+        data_fmt = workbook.add_format(extractor.DATA_FORMAT)
+        mixed_fmt = workbook.add_format(extractor.MIXED_FORMAT)
+        review_fmt = workbook.add_format(extractor.REVIEW_FORMAT)
+        for col_num, col_name in enumerate(df.columns):
+            worksheet.write(0, col_num, col_name, header_fmt)
+            worksheet.set_column(col_num, col_num, col_widths.get(col_name, 18))
+        for row_idx, row in df.iterrows():
+            needs_review = highlight_mixed and str(row.get("Needs Review", "")).lower() == "yes"
+            is_mixed = highlight_mixed and "/" in str(row.get("Size", ""))
+            fmt = review_fmt if needs_review else (mixed_fmt if is_mixed else data_fmt)
+            for col_idx, col_name in enumerate(df.columns):
+                worksheet.write(row_idx + 1, col_idx, row[col_name], fmt)
+        worksheet.set_row(0, 20)
+        worksheet.freeze_panes(1, 0)
+        for name, extra in (('Summary', summary_df), ('Duplicates_Removed', dup_df)):
+            if extra is not None and not extra.empty:
+                extra.to_excel(writer, index=False, sheet_name=name)
+    return output.getvalue()
+
+
+def measure(fn, memory=False):
+    """Wall time of fn(); peak traced Python memory from a second, traced run when `memory` is set."""
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    if not memory:
+        return elapsed, None
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,50000", help="comma-separated row counts")
+    parser.add_argument("--memory", action="store_true", help="also report peak Python memory (slow, traced rerun)")
+    parser.add_argument("--skip-legacy", action="store_true", help="do not time the old two-pass writer")
+    args = parser.parse_args(argv)
+
+    widths = extractor.CARTON_COL_WIDTHS
+    out_path = os.path.join(tempfile.gettempdir(), "bench_excel.xlsx")
+    for n in (int(x) for x in args.rows.split(",")):
+        df, dup_df, summary = extractor.build_carton_report(synthetic_rows(n))
+        writers = {
+            "streamed → bytes": lambda: extractor.build_excel(df, widths, summary_df=summary, dup_df=dup_df),
+            "streamed → file": lambda: extractor.build_excel(
+                df, widths, summary_df=summary, dup_df=dup_df, path=out_path),
+        }
+        if not args.skip_legacy:
+            writers["two-pass (old)"] = lambda: legacy_build_excel(df, widths, summary_df=summary, dup_df=dup_df)
+        print(f"{len(df):,} rows")
+        for name, fn in writers.items():
+            elapsed, peak = measure(fn, args.memory)
+            line = f"  {name:<17} {elapsed:7.2f}s  {len(df) / elapsed:10,.0f} rows/s"
+            print(line + (f"  peak {peak / 2**20:7.1f} MiB" if peak is not None else ""))
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
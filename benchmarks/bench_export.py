@@ -0,0 +1,84 @@
+"""
+Write time and size of the master report in each output format.
+
+    python benchmarks/bench_export.py --rows 200000
+
+Builds a carton report of synthetic rows (build_carton_report), writes it
+with build_excel and with exporters.write_table as Parquet, CSV and Arrow
+IPC, and reads every columnar file back to check its row count, row
+groups, typed columns and that codes kept their leading zeros. Exits
+non-zero if a read-back check fails.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pyarrow as pa  # noqa: E402
+import pyarrow.csv as pa_csv  # noqa: E402
+import pyarrow.ipc as pa_ipc  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+from exporters import CARTON_SCHEMA, EXPORT_FORMATS, ROW_GROUP_ROWS, write_table  # noqa: E402
+from extractor import CARTON_COL_WIDTHS, build_carton_report, build_excel  # noqa: E402
+
+
+def synthetic_rows(n, seed=0):
+    """Carton rows as the parsers return them, with some OCR misreads in the typed fields."""
+    rng = random.Random(seed)
+    rows = []
+    for k in range(n):
+        rows.append({
+            "File": f"labels_{k // 5000:03d}.pdf", "Label No.": k % 5000 + 1, "Format": rng.choice(["Text", "OCR"]),
+            "Ship To": "ATLANTA DC, MCDONOUGH GA", "Date": rng.choice(["1/2/2025", "12/31/2025", "1/2/202", ""]),
+            "PO #": f"45{rng.randint(0, 99999999):08d}", "Style / Color": "ABC123-BLK", "Description": "COTTON SHIRT",
+            "Color": "BLACK", "Size": rng.choice(["S", "M 32", "S/M"]), "Qty": rng.choice(["24", "12", "2O", ""]),
+            "GTIN (01)": f"0001234{rng.randint(0, 9999999):07d}", "Grid / Ref No.": "12",
+            "Carton Barcode": f"00{k:018d}",
+        })
+    return rows
+
+
+def read_back(data, fmt):
+    if fmt == "parquet":
+        pf = pq.ParquetFile(pa.BufferReader(data))
+        return pf.read(), pf.num_row_groups
+    if fmt == "arrow":
+        reader = pa_ipc.open_file(data)
+        return reader.read_all(), reader.num_record_batches
+    convert = pa_csv.ConvertOptions(column_types=CARTON_SCHEMA)
+    return pa_csv.read_csv(pa.BufferReader(data), convert_options=convert), None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000, help="carton rows")
+    args = parser.parse_args(argv)
+
+    df, _, _ = build_carton_report(synthetic_rows(args.rows))
+    print(f"{len(df):,} carton rows, {ROW_GROUP_ROWS:,} rows per row group")
+    started = time.perf_counter()
+    size = len(build_excel(df, CARTON_COL_WIDTHS, highlight_mixed=True))
+    excel_s = time.perf_counter() - started
+    print(f"  {'xlsx':<8} {excel_s:7.2f}s  {size / 1e6:8.1f} MB")
+
+    failures = 0
+    for fmt in EXPORT_FORMATS:
+        started = time.perf_counter()
+        data = write_table(df, CARTON_SCHEMA, fmt)
+        seconds = time.perf_counter() - started
+        table, groups = read_back(data, fmt)
+        ok = (table.num_rows == len(df) and table.schema.equals(CARTON_SCHEMA)
+              and table.column("Carton Barcode")[0].as_py() == df["Carton Barcode"][0]
+              and table.column("GTIN (01)").to_pylist() == df["GTIN (01)"].tolist())
+        failures += not ok
+        print(f"  {fmt:<8} {seconds:7.2f}s  {len(data) / 1e6:8.1f} MB  {excel_s / seconds:6.1f}x faster"
+              f"{f'  {groups} row groups' if groups else ''}  {'ok' if ok else 'READ-BACK MISMATCH'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Compare the two scanned-label OCR modes on real PDFs: one OCR call per
+FIELD_BOXES crop ("fields") versus one layout pass with targeted re-reads
+("layout").
+
+    python benchmarks/bench_ocr_modes.py /path/to/scanned_pdfs --limit 50
+
+Reports seconds and OCR engine calls per page for each mode, and how often
+each output field agrees between them. Only pages that take the precise
+(EXPECTED_CANVAS) path are measured.
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+
+import extractor  # noqa: E402
+from ocr_engine import ENGINE_NAMES, get_engine, use_engine  # noqa: E402
+
+COMPARED_FIELDS = ["Ship To", "Date", "PO #", "Style / Color", "Description", "Color", "Size", "Qty"]
+
+
+class CountingEngine:
+    """Wraps the active engine and counts recognition calls."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.name = engine.name
+        self.calls = 0
+
+    def recognize(self, *args, **kwargs):
+        self.calls += 1
+        return self.engine.recognize(*args, **kwargs)
+
+    def recognize_conf(self, *args, **kwargs):
+        self.calls += 1
+        return self.engine.recognize_conf(*args, **kwargs)
+
+    def words(self, *args, **kwargs):
+        self.calls += 1
+        return self.engine.words(*args, **kwargs)
+
+
+def precise_label_images(paths, limit):
+    """Upright zoom-6 label renders of scanned pages that take the precise path."""
+    ew, eh = extractor.EXPECTED_CANVAS
+    found = 0
+    for path in paths:
+        with fitz.open(path) as fdoc:
+            orientation = {}
+            for page in fdoc:
+                if page.get_text().strip():
+                    continue
+                decoded = extractor.decode_page_barcodes(page, orientation=orientation)
+                if not extractor.pick_carton_and_gtin(decoded["values"])[0]:
+                    continue
+                img = extractor.label_image(page, decoded)
+                w, h = img.size
+                if abs(w - ew) / ew < 0.03 and abs(h - eh) / eh < 0.03:
+                    yield f"{Path(path).name} p{page.number + 1}", img
+                    found += 1
+                    if found >= limit:
+                        return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input_dir")
+    parser.add_argument("--limit", type=int, default=20, help="maximum label pages to measure")
+    parser.add_argument("--ocr-engine", choices=ENGINE_NAMES, default="auto")
+    parser.add_argument("--show-diffs", action="store_true", help="print every field that differs")
+    args = parser.parse_args(argv)
+
+    use_engine(args.ocr_engine)
+    counting = CountingEngine(get_engine())
+    extractor.get_engine = lambda: counting
+
+    paths = sorted(str(p) for p in Path(args.input_dir).glob("*.pdf"))
+    seconds = Counter()
+    calls = Counter()
+    agree = Counter()
+    pages = 0
+    for label, img in precise_label_images(paths, args.limit):
+        rows = {}
+        for mode in extractor.OCR_MODES:
+            counting.calls = 0
+            started = time.perf_counter()
+            rows[mode] = extractor.parse_carton_ocr(img, 1, mode=mode)
+            seconds[mode] += time.perf_counter() - started
+            calls[mode] += counting.calls
+        for field in COMPARED_FIELDS:
+            if rows["fields"][field] == rows["layout"][field]:
+                agree[field] += 1
+            elif args.show_diffs:
+                print(f"{label} {field}: fields={rows['fields'][field]!r} layout={rows['layout'][field]!r}")
+        pages += 1
+
+    if not pages:
+        print("No scanned label pages on the precise OCR path were found.", file=sys.stderr)
+        return 1
+
+    print(f"{pages} label pages, engine: {counting.name}")
+    for mode in extractor.OCR_MODES:
+        print(f"  {mode:<7} {seconds[mode] / pages:7.3f} s/page  {calls[mode] / pages:5.1f} OCR calls/page")
+    print(f"  speed-up: {seconds['fields'] / seconds['layout']:.2f}x")
+    print("field agreement:")
+    for field in COMPARED_FIELDS:
+        print(f"  {field:<14} {agree[field] / pages:6.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Per-page cost and parity of the image preprocessing in front of label OCR.
+
+    python benchmarks/bench_ocr_prep.py --pages 10
+    python benchmarks/bench_ocr_prep.py --pdfs /path/to/scanned_pdfs
+
+Renders upright scanned labels (the synthetic corpus, or the image-only
+pages of --pdfs), then prepares every image the OCR engine would receive
+for a page, once per mode: "fields" (each FIELD_BOXES crop plus the
+corner number) and "layout" (the whole label plus the FIELD_VALIDATORS
+re-reads and the corner number). The previous per-call crop -> resize ->
+convert -> ImageOps.autocontrast is kept here as the reference. Needs no
+OCR engine. Exits non-zero if any prepared image differs.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+from PIL import ImageOps  # noqa: E402
+
+import extractor  # noqa: E402
+from corpus import build_corpus  # noqa: E402
+
+
+# ── Previous implementation (reference) ─────────────────────────────────────
+def legacy_field(rotated_img, box, scale=2):
+    w, h = rotated_img.size
+    x0, y0, x1, y1 = box
+    crop = rotated_img.crop((max(0, x0), max(0, y0), min(w, x1), min(h, y1)))
+    crop = crop.resize((crop.width * scale, crop.height * scale))
+    return ImageOps.autocontrast(crop.convert("L"))
+
+
+def legacy_page(rotated_img):
+    return ImageOps.autocontrast(rotated_img.convert("L"))
+
+
+# ── Per-page work of each mode ──────────────────────────────────────────────
+def corner_box(size):
+    w, _ = size
+    return (w - 194, 46, w - 59, 110)
+
+
+def previous_images(img, mode):
+    if mode == "fields":
+        images = [legacy_field(img, box) for box in extractor.FIELD_BOXES.values()]
+    else:
+        images = [legacy_page(img)] + [legacy_field(img, extractor.FIELD_BOXES[f]) for f in extractor.FIELD_VALIDATORS]
+    return images + [legacy_field(img, corner_box(img.size), scale=4)]
+
+
+def current_images(img, mode):
+    label = extractor.OcrLabel(img)
+    if mode == "fields":
+        images = [label.crop(box) for box in extractor.FIELD_BOXES.values()]
+    else:
+        images = [label.page()] + [label.crop(extractor.FIELD_BOXES[f]) for f in extractor.FIELD_VALIDATORS]
+    return images + [label.crop(corner_box(label.size), scale=4)]
+
+
+def label_images(paths, limit):
+    """OCR-zoom label renders of image-only pages, turned upright as the decoded barcodes say."""
+    images = []
+    for path in paths:
+        with fitz.open(str(path)) as fdoc:
+            orientation = {}
+            for page in fdoc:
+                if page.get_text().strip():
+                    continue
+                decoded = extractor.decode_page_barcodes(page, orientation=orientation)
+                images.append(extractor.label_image(page, decoded))
+                if len(images) >= limit:
+                    return images
+    return images
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=10, help="synthetic scanned labels")
+    parser.add_argument("--pdfs", help="directory of scanned label PDFs to use instead")
+    parser.add_argument("--repeat", type=int, default=3, help="best-of runs")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.pdfs:
+            paths = sorted(Path(args.pdfs).glob("*.pdf"))
+        else:
+            paths = build_corpus(tmp, args.pages, layouts=("carton_scanned",)).values()
+        images = label_images(paths, args.pages)
+    if not images:
+        print("no image-only pages found", file=sys.stderr)
+        return 1
+
+    mismatches = 0
+    print(f"{len(images)} labels of {images[0].size[0]}x{images[0].size[1]}")
+    for mode in ("fields", "layout"):
+        best = {}
+        for name, prepare in (("previous", previous_images), ("current", current_images)):
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                for img in images:
+                    prepare(img, mode)
+                elapsed = time.perf_counter() - started
+                best[name] = min(best.get(name, elapsed), elapsed)
+        for img in images:
+            previous, current = previous_images(img, mode), current_images(img, mode)
+            mismatches += sum(a.tobytes() != b.tobytes() or a.size != b.size for a, b in zip(previous, current))
+        print(f"  {mode:<7} previous {best['previous'] / len(images) * 1000:7.1f} ms/page   "
+              f"current {best['current'] / len(images) * 1000:7.1f} ms/page   "
+              f"speed-up {best['previous'] / best['current']:.2f}x")
+    print(f"mismatched images: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
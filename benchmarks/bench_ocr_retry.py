@@ -0,0 +1,131 @@
+"""
+Tesseract calls per page and field accuracy of the OCR retry policy, on
+scanned labels whose true field values are known.
+
+    python benchmarks/bench_ocr_retry.py --pages 30
+
+Builds the synthetic scanned corpus (benchmarks/corpus.py), reads every
+label in "fields" mode plus the corner number with the previous policy
+(PSM 7, then 8 / 13 / 6 until any text, whitelisted fields only; kept
+here as the reference), the current one (re-read only while the field's
+validator fails, fixed PSM order) and the current one with the PSM order
+learned over the file (--learn-psm-order), and compares each field with
+the values the label was drawn from. Needs a Tesseract engine.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+
+import extractor  # noqa: E402
+from corpus import LAYOUTS, build_corpus, label_data  # noqa: E402
+from ocr_engine import ENGINE_NAMES, get_engine, use_engine  # noqa: E402
+
+
+# ── Previous policy (reference) ─────────────────────────────────────────────
+def legacy_ocr_field(rotated_img, box, whitelist="", psm=7, scale=2, retry_psms=(8, 13, 6), field=None, validator=None):
+    gray = extractor.ocr_label(rotated_img).crop(box, scale)
+    engine = extractor.get_engine()
+    txt = engine.recognize(gray, psm, whitelist).strip()
+    if txt:
+        return txt
+    if whitelist:
+        for alt_psm in retry_psms:
+            txt = engine.recognize(gray, alt_psm, whitelist).strip()
+            if txt:
+                return txt
+    return ""
+
+
+class CountingEngine:
+    """Wraps the active engine and counts Tesseract runs."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.name = engine.name
+        self.calls = 0
+
+    def recognize(self, *args, **kwargs):
+        self.calls += 1
+        return self.engine.recognize(*args, **kwargs)
+
+    def recognize_conf(self, *args, **kwargs):
+        self.calls += 1
+        return self.engine.recognize_conf(*args, **kwargs)
+
+
+def truths(pages, seed=0):
+    """Expected row values of each scanned corpus label, replaying corpus.build_corpus's draws."""
+    rng = random.Random(seed)
+    expected = []
+    for n in range(1, pages + 1):
+        d = label_data(n, rng, series=LAYOUTS.index("carton_scanned"))
+        expected.append({
+            "Date": "1/2/2025", "Qty": d["qty"], "PO #": d["po"], "Style / Color": f"{d['style']}-BLK",
+            "Description": "COTTON SHIRT", "Color": d["color"], "Size": d["size"], "Grid / Ref No.": "12",
+        })
+    return expected
+
+
+POLICIES = ("previous", "current", "learned")
+
+
+def read_labels(images, policy):
+    """Rows of every label read with `policy` (one of POLICIES) over one file."""
+    extractor.ocr_field = legacy_ocr_field if policy == "previous" else CURRENT_OCR_FIELD
+    psm_wins, stats = ({} if policy == "learned" else None), Counter()
+    rows = []
+    for img in images:
+        label = extractor.OcrLabel(img, psm_wins, stats)
+        row = extractor.parse_carton_ocr(label, 1, "fields")
+        row["Grid / Ref No."] = extractor.ocr_corner_number(label)
+        rows.append(row)
+    extractor.ocr_field = CURRENT_OCR_FIELD
+    return rows
+
+
+CURRENT_OCR_FIELD = extractor.ocr_field
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=30, help="scanned labels")
+    parser.add_argument("--ocr-engine", choices=ENGINE_NAMES, default="auto")
+    args = parser.parse_args(argv)
+
+    use_engine(args.ocr_engine)
+    counting = CountingEngine(get_engine())
+    extractor.get_engine = lambda: counting
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = build_corpus(tmp, args.pages, layouts=("carton_scanned",))["carton_scanned"]
+        with fitz.open(str(path)) as fdoc:
+            no_barcode = {"values": [], "angle": None, "zoom": extractor.OCR_ZOOM, "image": None}
+            images = [extractor.label_image(page, no_barcode) for page in fdoc]
+    expected = truths(args.pages)
+
+    print(f"{len(images)} labels, engine: {counting.name}")
+    correct = {}
+    for policy in POLICIES:
+        counting.calls = 0
+        started = time.perf_counter()
+        rows = read_labels(images, policy)
+        seconds = time.perf_counter() - started
+        correct[policy] = Counter(field for row, truth in zip(rows, expected)
+                                  for field, value in truth.items() if row[field] == value)
+        print(f"  {policy:<8} {counting.calls / len(images):5.1f} Tesseract runs/page  {seconds / len(images):6.3f} s/page")
+    print("field accuracy:   " + "  ".join(f"{policy:>8}" for policy in POLICIES))
+    for field in expected[0]:
+        print(f"  {field:<14} " + "  ".join(f"{correct[policy][field] / len(images):8.1%}" for policy in POLICIES))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
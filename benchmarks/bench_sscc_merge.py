@@ -0,0 +1,118 @@
+"""
+Scaling benchmark and parity check for merge_sscc_groups() on synthetic
+CMUS rows.
+
+    python benchmarks/bench_sscc_merge.py --rows 1000,10000,100000
+
+Times the vectorized merge against the previous per-group implementation
+(groupby + iterrows, kept here as the reference) and checks that the
+CMUS workbook built from both is byte-identical (apart from its
+creation timestamp).
+"""
+import argparse
+import io
+import random
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd  # noqa: E402
+
+import extractor  # noqa: E402
+
+SIZES = ["XS", "S", "M", "L", "XL"]
+
+
+def synthetic_rows(n, seed=0):
+    """CMUS rows where roughly a third of the SSCCs carry several sizes."""
+    rng = random.Random(seed)
+    rows = []
+    carton = 0
+    while len(rows) < n:
+        carton += 1
+        sscc = f"00{carton:018d}"
+        for size in rng.sample(SIZES, rng.choice([1, 1, 2, 3])):
+            rows.append({
+                "Order No.": "CM123", "Seq No.": "7", "Destination": "BETHLEHEM",
+                "Ship From": "VEND01 – Factory Road, Colombo", "Ship To": "Club Monaco",
+                "Material #": f"MAT{carton % 50}", "Size": size,
+                "Quantity": rng.choice([str(rng.randint(1, 24)), ""]),
+                "Label Total": "12", "Carton Total": "12", "Carton No.": f"{carton} of 9999",
+                "SSCC (display)": f"(00) {sscc}", "SSCC (digits)": sscc,
+            })
+    rows = rows[:n]
+    # A few re-scanned labels so duplicates interleave with other SSCCs.
+    rows += [dict(r) for r in rng.sample(rows, max(1, n // 100))]
+    return rows
+
+
+def reference_merge(df):
+    """The previous per-group merge (all columns, including the SSCC key, kept)."""
+    merged = []
+    for _, group in df.groupby("SSCC (digits)", sort=False):
+        first = group.iloc[0].copy()
+        if len(group) > 1:
+            first["Size"] = "/".join(group["Size"].tolist())
+            first["Size Detail"] = "/".join(
+                f'{r["Size"]}{r["Quantity"]}' for _, r in group.iterrows()
+            )
+            first["Quantity"] = str(sum(
+                int(q) for q in group["Quantity"] if str(q).isdigit()
+            ))
+        else:
+            first["Size Detail"] = ""
+        merged.append(first)
+    return pd.DataFrame(merged).reset_index(drop=True)
+
+
+def workbook_parts(data):
+    """xlsx members except docProps/core.xml, which carries the creation time."""
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return {name: zf.read(name) for name in zf.namelist() if name != "docProps/core.xml"}
+
+
+def cmus_workbook(df, merge):
+    original = extractor.merge_sscc_groups
+    extractor.merge_sscc_groups = merge
+    try:
+        report, _removed = extractor.build_cmus_report(df.to_dict("records"))
+    finally:
+        extractor.merge_sscc_groups = original
+    return workbook_parts(extractor.build_excel(report, extractor.CMUS_COL_WIDTHS))
+
+
+def timed(fn, df):
+    started = time.perf_counter()
+    result = fn(df)
+    return result, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,100000", help="comma-separated row counts")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for n in (int(x) for x in args.rows.split(",")):
+        df = pd.DataFrame(synthetic_rows(n))
+        new, new_s = timed(extractor.merge_sscc_groups, df)
+        old, old_s = timed(reference_merge, df)
+
+        same = new.astype(str).equals(old.astype(str)) and list(new.columns) == list(old.columns)
+        same = same and cmus_workbook(df, extractor.merge_sscc_groups) == cmus_workbook(df, reference_merge)
+        failed |= not same
+
+        print(
+            f"{len(df):>8,} rows → {len(new):>7,} SSCCs  "
+            f"vectorized {new_s:7.3f}s ({len(df) / new_s:>10,.0f} rows/s)  "
+            f"per-group {old_s:7.3f}s ({len(df) / old_s:>9,.0f} rows/s)  "
+            f"{old_s / new_s:6.1f}x  {'identical' if same else 'DIFFERENT'}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
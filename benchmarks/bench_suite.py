@@ -0,0 +1,178 @@
+"""
+Per-stage and end-to-end throughput benchmark on the synthetic corpus, with
+baselines to catch regressions.
+
+    python benchmarks/bench_suite.py --pages 20 --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --pages 20 --baseline benchmarks/baseline.json
+
+Generates the corpus (benchmarks/corpus.py) in a temp directory unless
+--corpus points at an existing one, then times page text extraction,
+detect_text_format, decode_page_barcodes, parse_carton_ocr,
+merge_sscc_groups, build_excel and extract_files end to end. With
+--baseline, any stage whose time per item is more than --tolerance times
+the recorded one is reported and the exit status is 1. Stages whose
+dependency is missing (e.g. no tesseract binary) are reported as skipped.
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import extractor  # noqa: E402
+from corpus import LAYOUTS, build_corpus  # noqa: E402
+
+
+def timed(fn, repeat=1):
+    """Best wall time of `repeat` runs of fn() and its last result."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_suite(paths, workers=1, repeat=3, ocr_mode="fields"):
+    """{stage: {"seconds", "items", "unit"} | {"skipped": reason}} for the corpus at `paths`."""
+    results = {}
+    docs = {layout: fitz.open(str(path)) for layout, path in paths.items()}
+    try:
+        pages = [(layout, page) for layout, doc in docs.items() for page in doc]
+
+        seconds, texts = timed(lambda: [extractor.fitz_page_text(p) for _, p in pages], repeat)
+        results["page_text"] = {"seconds": seconds, "items": len(pages), "unit": "page"}
+
+        # Microseconds per page: time enough passes to rise above timer noise.
+        passes = 200
+        seconds, _ = timed(lambda: [extractor.detect_text_format(t) for _ in range(passes) for t in texts], repeat)
+        results["detect_text_format"] = {"seconds": seconds, "items": len(texts) * passes, "unit": "page"}
+
+        barcode_pages = [p for layout, p in pages if layout != "cmus"]
+        try:
+            seconds, decoded = timed(lambda: [extractor.decode_page_barcodes(p, orientation={}) for p in barcode_pages])
+            results["decode_page_barcodes"] = {"seconds": seconds, "items": len(barcode_pages), "unit": "page"}
+            found = sum(1 for d in decoded if extractor.pick_carton_and_gtin(d["values"])[0])
+            results["decode_page_barcodes"]["found"] = found
+        except Exception as e:  # noqa: BLE001 — report and keep timing the other stages
+            decoded = []
+            results["decode_page_barcodes"] = {"skipped": f"{type(e).__name__}: {e}"}
+
+        scanned = [(p, d) for p, d in zip(barcode_pages, decoded)
+                   if not p.get_text().strip() and d["values"]]
+        if not scanned:
+            results["parse_carton_ocr"] = {"skipped": "no decoded image-only labels"}
+        else:
+            images = [extractor.label_image(p, d) for p, d in scanned]
+            try:
+                seconds, _ = timed(lambda: [extractor.parse_carton_ocr(img, 1, ocr_mode) for img in images])
+                results["parse_carton_ocr"] = {"seconds": seconds, "items": len(images), "unit": "label"}
+            except Exception as e:  # noqa: BLE001
+                results["parse_carton_ocr"] = {"skipped": f"{type(e).__name__}: {e}"}
+
+        cmus_rows = [row for (layout, _), t in zip(pages, texts) if layout == "cmus"
+                     for row in extractor.extract_label_data(t)]
+        if cmus_rows:
+            cmus_df = pd.DataFrame(cmus_rows)
+            seconds, _ = timed(lambda: extractor.merge_sscc_groups(cmus_df), repeat)
+            results["merge_sscc_groups"] = {"seconds": seconds, "items": len(cmus_rows), "unit": "row"}
+    finally:
+        for doc in docs.values():
+            doc.close()
+
+    options = {"ocr_mode": ocr_mode}
+    try:
+        seconds, (carton_rows, _cmus) = timed(lambda: extractor.extract_files(
+            ((Path(p).name, str(p)) for p in paths.values()), workers=workers, options=options,
+        ))
+        results["extract_files"] = {"seconds": seconds, "items": len(pages), "unit": "page", "workers": workers}
+    except Exception as e:  # noqa: BLE001
+        carton_rows = []
+        results["extract_files"] = {"skipped": f"{type(e).__name__}: {e}"}
+
+    if carton_rows:
+        df, dup_df, summary = extractor.build_carton_report(carton_rows)
+        seconds, _ = timed(lambda: extractor.build_excel(
+            df, extractor.CARTON_COL_WIDTHS, summary_df=summary, dup_df=dup_df), repeat)
+        results["build_excel"] = {"seconds": seconds, "items": len(df), "unit": "row"}
+    return results
+
+
+def per_item_ms(result):
+    return result["seconds"] / max(result["items"], 1) * 1000
+
+
+def compare(results, baseline, tolerance):
+    """Stages slower than `tolerance` x their baseline time per item: [(stage, now_ms, then_ms)]."""
+    slower = []
+    for stage, result in results.items():
+        then = baseline.get("stages", {}).get(stage)
+        if "skipped" in result or not then or "skipped" in then:
+            continue
+        now_ms, then_ms = per_item_ms(result), per_item_ms(then)
+        if now_ms > then_ms * tolerance:
+            slower.append((stage, now_ms, then_ms))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="existing corpus directory (default: generate one)")
+    parser.add_argument("--pages", type=int, default=20, help="labels per layout when generating")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="workers for the end-to-end run")
+    parser.add_argument("--ocr-mode", choices=extractor.OCR_MODES, default="fields")
+    parser.add_argument("--repeat", type=int, default=3, help="best-of runs for the cheap stages")
+    parser.add_argument("--save-baseline", metavar="JSON", help="write the results as the new baseline")
+    parser.add_argument("--baseline", metavar="JSON", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slow-down before a stage is flagged")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            paths = {layout: Path(args.corpus) / f"{layout}.pdf" for layout in LAYOUTS
+                     if (Path(args.corpus) / f"{layout}.pdf").exists()}
+        else:
+            paths = build_corpus(tmp, args.pages)
+        results = run_suite(paths, args.workers, args.repeat, args.ocr_mode)
+
+    print(f"{'stage':<22} {'items':>7} {'seconds':>9} {'ms/item':>9} {'items/s':>10}")
+    for stage, result in results.items():
+        if "skipped" in result:
+            print(f"{stage:<22} skipped ({result['skipped']})")
+            continue
+        rate = result["items"] / result["seconds"] if result["seconds"] else float("inf")
+        print(f"{stage:<22} {result['items']:>7,} {result['seconds']:>9.3f} {per_item_ms(result):>9.2f} {rate:>10,.1f}")
+
+    if args.save_baseline:
+        record = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "parser_version": extractor.PARSER_VERSION,
+            "pages_per_layout": args.pages if not args.corpus else None,
+            "stages": results,
+        }
+        Path(args.save_baseline).write_text(json.dumps(record, indent=2))
+        print(f"baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        slower = compare(results, baseline, args.tolerance)
+        for stage, now_ms, then_ms in slower:
+            print(f"REGRESSION {stage}: {now_ms:.2f} ms/item vs baseline {then_ms:.2f} ({now_ms / then_ms:.2f}x)")
+        if slower:
+            return 1
+        print(f"no stage slower than {args.tolerance:g}x baseline ({baseline.get('created', '?')})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
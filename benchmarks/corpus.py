@@ -0,0 +1,198 @@
+"""
+Synthetic label PDFs in every layout the extractor supports, for throughput
+benchmarks.
+
+    python benchmarks/corpus.py /tmp/label_corpus --pages 50
+
+Writes one file per layout, each with `--pages` labels:
+
+    carton_text_upright.pdf   GS1 carton labels with a text layer
+    carton_text_reversed.pdf  the same printed upside down (reversed text lines)
+    carton_scanned.pdf        image-only labels turned a quarter, EXPECTED_CANVAS at OCR zoom
+    cmus.pdf                  CMUS labels with a Material # / Size / Quantity table
+
+Carton barcodes are drawn as vector ITF (interleaved 2 of 5) symbols of
+"00" + SSCC and of the GTIN-14, which zbar returns as plain digit strings
+like the GS1-128 symbols on real labels.
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+
+from extractor import EXPECTED_CANVAS, FIELD_BOXES, OCR_ZOOM, gtin_check_digit  # noqa: E402
+
+LAYOUTS = ("carton_text_upright", "carton_text_reversed", "carton_scanned", "cmus")
+
+# Interleaved 2 of 5: bar/space widths of each digit, 1 = wide.
+ITF_PATTERNS = {
+    "0": "00110", "1": "10001", "2": "01001", "3": "11000", "4": "00101",
+    "5": "10100", "6": "01100", "7": "00011", "8": "10010", "9": "01010",
+}
+ITF_WIDE = 3
+
+SIZES = ["S 30", "M 32", "L 34", "XL 36"]
+COLORS = ["Black", "Navy Blue", "Grey", "White"]
+
+
+def with_check_digit(digits):
+    return digits + str(gtin_check_digit(digits))
+
+
+def label_data(n, rng, series=0):
+    """Field values for the n-th carton of a shipment; `series` keeps SSCCs of different files apart."""
+    return {
+        "sscc": with_check_digit(f"{series:03d}12345{n:09d}"),
+        "gtin": with_check_digit(f"1001234{rng.randint(0, 99999):05d}0"),
+        "qty": str(rng.choice([6, 12, 24, 36])),
+        "po": f"45{rng.randint(0, 99999999):08d}",
+        "style": f"ABC{rng.randint(100, 999)}",
+        "color": rng.choice(COLORS),
+        "size": rng.choice(SIZES),
+        "carton": n,
+    }
+
+
+def draw_itf(page, rect, digits, rotate=0):
+    """Vector ITF symbol filling `rect` (quiet zones included); rotate=180 draws it upside down."""
+    if len(digits) % 2:
+        digits = "0" + digits
+    widths = [1, 1, 1, 1]  # start: narrow bar, space, bar, space
+    for a, b in zip(digits[::2], digits[1::2]):
+        for wb, ws in zip(ITF_PATTERNS[a], ITF_PATTERNS[b]):
+            widths += [ITF_WIDE if wb == "1" else 1, ITF_WIDE if ws == "1" else 1]
+    widths += [ITF_WIDE, 1, 1]  # stop: wide bar, space, narrow bar
+    quiet = 10
+    module = rect.width / (sum(widths) + 2 * quiet)
+    shape = page.new_shape()
+    x = rect.x0 + quiet * module
+    for i, w in enumerate(widths):
+        if i % 2 == 0:
+            bar = fitz.Rect(x, rect.y0, x + w * module, rect.y1)
+            if rotate == 180:
+                bar = fitz.Rect(rect.x0 + rect.x1 - bar.x1, rect.y0, rect.x0 + rect.x1 - bar.x0, rect.y1)
+            shape.draw_rect(bar)
+        x += w * module
+    shape.finish(fill=(0, 0, 0), color=None, width=0)
+    shape.commit()
+
+
+def spaced_sscc(sscc):
+    return f"(00) {sscc[0]} {sscc[1:8]} {sscc[8:17]} {sscc[17]}"
+
+
+def spaced_gtin(gtin):
+    return f"(01) {gtin[0]} {gtin[1:8]} {gtin[8:13]} {gtin[13]}"
+
+
+def carton_text_page(doc, d, reversed_=False):
+    """4x6" GS1 carton label with a text layer, optionally printed upside down."""
+    page = doc.new_page(width=288, height=432)
+    lines = [
+        "SHIP TO: ATLANTA DC", "MCDONOUGH GA", "Date: 1/2/2025", f"QTY {d['qty']}",
+        f"PO# {d['po']}", "STYLE/COLOR", d["style"], "-", "BLK",
+        f"CARTON {d['carton']} OF 999", f"SIZE {d['size']}",
+        spaced_gtin(d["gtin"]), spaced_sscc(d["sscc"]), "(Complete Grid) 12", "Cotton Shirt",
+    ]
+    gtin_bars = fitz.Rect(24, 250, 264, 290)
+    sscc_bars = fitz.Rect(24, 330, 264, 390)
+    for k, line in enumerate(lines):
+        y = 30 + k * 14 if k < 11 else {11: 302, 12: 402, 13: 418, 14: 428}[k]
+        if reversed_:
+            page.insert_text((264, 432 - y), line, fontsize=9, rotate=180)
+        else:
+            page.insert_text((24, y), line, fontsize=9)
+    for bars, digits in ((gtin_bars, d["gtin"]), (sscc_bars, "00" + d["sscc"])):
+        if reversed_:
+            bars = fitz.Rect(bars.x0, 432 - bars.y1, bars.x1, 432 - bars.y0)
+        draw_itf(page, bars, digits, rotate=180 if reversed_ else 0)
+
+
+def scanned_label_png(d, dpi_zoom=3):
+    """Upright landscape label laid out on FIELD_BOXES, rasterised like a scan."""
+    ew, eh = EXPECTED_CANVAS
+    tmp = fitz.open()
+    page = tmp.new_page(width=ew / OCR_ZOOM, height=eh / OCR_ZOOM)
+    fields = {
+        "ship_dc": "SHIP TO: ATLANTA DC", "ship_city": "MCDONOUGH GA", "date": "1/2/2025",
+        "qty": d["qty"], "po": f"PO# {d['po']}", "desc": "COTTON SHIRT",
+        "style": f"{d['style']} - BLK", "color": d["color"], "size": d["size"],
+    }
+    for name, text in fields.items():
+        x0, y0, x1, y1 = (v / OCR_ZOOM for v in FIELD_BOXES[name])
+        size = min(16, (y1 - y0) * 0.55)
+        page.insert_text((x0 + 2, (y0 + y1) / 2 + size / 3), text, fontsize=size)
+    page.insert_text(((ew - 190) / OCR_ZOOM, 100 / OCR_ZOOM), "12", fontsize=9)
+    draw_itf(page, fitz.Rect(2500, 400, 4500, 1100) / OCR_ZOOM, d["gtin"])
+    draw_itf(page, fitz.Rect(600, 2300, 4100, 3200) / OCR_ZOOM, "00" + d["sscc"])
+    png = page.get_pixmap(matrix=fitz.Matrix(dpi_zoom, dpi_zoom), colorspace=fitz.csGRAY).tobytes("png")
+    tmp.close()
+    return png
+
+
+def carton_scanned_page(doc, d):
+    """Image-only page holding the label a quarter turn off, as label printers often scan."""
+    ew, eh = EXPECTED_CANVAS
+    page = doc.new_page(width=eh / OCR_ZOOM, height=ew / OCR_ZOOM)
+    page.insert_image(page.rect, stream=scanned_label_png(d), rotate=90)
+
+
+def cmus_page(doc, d, rng):
+    page = doc.new_page(width=595, height=842)
+    sizes = rng.sample(["XS", "S", "M", "L", "XL"], rng.choice([1, 2, 3]))
+    qtys = [rng.randint(1, 12) for _ in sizes]
+    lines = [
+        "Ship From: VEND01", "Factory Road", "Colombo", f"Order No.:CM{d['po'][-5:]} 7",
+        "Factory I/O:", "BETHLEHEM", "Ship To:Club Monaco",
+        f"CARTON NUMBER {d['carton']} of 999", f"CARTON TOTAL {sum(qtys)}",
+        spaced_sscc(d["sscc"]), "Material # Size Quantity",
+    ]
+    lines += [f"MAT{d['carton'] % 50} {s} {q}" for s, q in zip(sizes, qtys)]
+    lines.append(f"LABEL TOTAL {sum(qtys)}")
+    for k, line in enumerate(lines):
+        page.insert_text((72, 72 + k * 16), line, fontsize=11)
+    draw_itf(page, fitz.Rect(72, 600, 500, 700), "00" + d["sscc"])
+
+
+def build_corpus(out_dir, pages=20, layouts=LAYOUTS, seed=0):
+    """Write one PDF per layout into `out_dir`; returns {layout: path}."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    paths = {}
+    for layout in layouts:
+        doc = fitz.open()
+        for n in range(1, pages + 1):
+            d = label_data(n, rng, series=LAYOUTS.index(layout))
+            if layout == "carton_text_upright":
+                carton_text_page(doc, d)
+            elif layout == "carton_text_reversed":
+                carton_text_page(doc, d, reversed_=True)
+            elif layout == "carton_scanned":
+                carton_scanned_page(doc, d)
+            else:
+                cmus_page(doc, d, rng)
+        paths[layout] = out / f"{layout}.pdf"
+        doc.save(paths[layout], garbage=3, deflate=True)
+        doc.close()
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--pages", type=int, default=20, help="labels per layout file")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help="comma-separated subset of: " + ", ".join(LAYOUTS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for layout, path in build_corpus(args.out_dir, args.pages, args.layouts.split(","), args.seed).items():
+        print(f"{layout:<22} {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
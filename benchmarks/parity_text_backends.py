@@ -0,0 +1,74 @@
+"""
+Check that the fitz text backend reads PDFs exactly like pdfplumber and
+measure how much faster it is.
+
+    python benchmarks/parity_text_backends.py /path/to/pdfs
+
+For every page, compares the page text, the detected format and the parsed
+carton/CMUS fields from each backend, and reports text-extraction seconds
+per page. Exits non-zero when any page differs.
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import extractor  # noqa: E402
+
+
+def parsed_fields(text, page_no):
+    """What the text path would produce for this page (no barcode rendering)."""
+    fmt, is_reversed = extractor.detect_text_format(text)
+    if fmt == "carton_text":
+        return fmt, extractor.parse_carton_text(text, page_no, is_reversed=is_reversed)
+    if fmt == "cmus":
+        return fmt, extractor.extract_label_data(text)
+    return fmt, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input_dir")
+    parser.add_argument("--show-diffs", action="store_true", help="print the text of every page that differs")
+    args = parser.parse_args(argv)
+
+    paths = sorted(Path(args.input_dir).glob("*.pdf"))
+    if not paths:
+        print(f"No PDF files found in {args.input_dir}", file=sys.stderr)
+        return 1
+
+    seconds = Counter()
+    diffs = Counter()
+    pages = 0
+    for path in paths:
+        texts = {}
+        for backend in extractor.TEXT_BACKENDS:
+            started = time.perf_counter()
+            with extractor.open_page_source(str(path), backend) as src:
+                texts[backend] = [src.text(i) for i in range(len(src))]
+            seconds[backend] += time.perf_counter() - started
+
+        for i, (fast, reference) in enumerate(zip(texts["fitz"], texts["pdfplumber"])):
+            pages += 1
+            if fast == reference:
+                continue
+            diffs["text"] += 1
+            if parsed_fields(fast, i + 1) != parsed_fields(reference, i + 1):
+                diffs["parsed"] += 1
+                print(f"{path.name} p{i + 1}: parsed fields differ")
+            if args.show_diffs:
+                print(f"--- {path.name} p{i + 1} pdfplumber\n{reference}\n--- fitz\n{fast}")
+
+    print(f"{len(paths)} files, {pages} pages")
+    for backend in extractor.TEXT_BACKENDS:
+        print(f"  {backend:<10} {seconds[backend] / pages * 1000:8.2f} ms/page")
+    print(f"  speed-up: {seconds['pdfplumber'] / seconds['fitz']:.1f}x")
+    print(f"pages with different text: {diffs['text']}, with different parsed fields: {diffs['parsed']}")
+    return 1 if diffs["parsed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Columnar exports of the master reports — Parquet, CSV and Arrow IPC — next
+to the Excel workbook, for the WMS import and analytics jobs.
+
+The schemas follow CARTON_COLUMN_ORDER and CMUS_COLUMN_ORDER with typed
+columns: counts are int32, label dates are date32, and everything else
+(GTIN, carton barcodes, SSCCs, PO numbers) stays a string so leading zeros
+survive. A typed cell that does not parse (empty, or an OCR misread) is
+written as null. Rows are converted and written ROW_GROUP_ROWS at a time,
+so the Arrow copy of a report never holds more than one row group.
+"""
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+
+from extractor import CARTON_COLUMN_ORDER, CMUS_COLUMN_ORDER
+
+EXPORT_FORMATS = ("parquet", "csv", "arrow")
+REPORT_FORMATS = ("xlsx",) + EXPORT_FORMATS
+REPORT_EXTENSIONS = {"xlsx": ".xlsx", "parquet": ".parquet", "csv": ".csv", "arrow": ".arrow"}
+REPORT_MIME = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+ROW_GROUP_ROWS = 64_000
+
+# Label dates are printed M/D/YYYY; counts are plain digit runs.
+LABEL_DATE_FORMAT = "%m/%d/%Y"
+
+
+def report_schema(columns, types):
+    """Arrow schema of a report: `columns` in order, strings unless `types` says otherwise."""
+    return pa.schema([pa.field(col, types.get(col, pa.string())) for col in columns])
+
+
+CARTON_SCHEMA = report_schema(CARTON_COLUMN_ORDER, {
+    "Label No.": pa.int32(), "Date": pa.date32(), "Qty": pa.int32(),
+})
+CMUS_SCHEMA = report_schema(CMUS_COLUMN_ORDER, {
+    "Quantity": pa.int32(), "Label Total": pa.int32(), "Carton Total": pa.int32(),
+})
+
+
+def report_file_name(name, fmt):
+    """`name` (e.g. CARTON_REPORT_NAME) with the extension of report format `fmt`."""
+    return Path(name).with_suffix(REPORT_EXTENSIONS[fmt]).name
+
+
+def parse_formats(text):
+    """Comma-separated report formats ("xlsx,parquet") -> tuple; ValueError on an unknown one."""
+    formats = tuple(dict.fromkeys(f.strip().lower() for f in text.split(",") if f.strip()))
+    unknown = [f for f in formats if f not in REPORT_FORMATS]
+    if unknown or not formats:
+        raise ValueError(f"unknown report format {', '.join(unknown) or text!r} (choose from {', '.join(REPORT_FORMATS)})")
+    return formats
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cell conversion
+# ─────────────────────────────────────────────────────────────────────────────
+COUNT_PATTERN = r"^\d{1,9}$"
+LABEL_DATE_PATTERN = r"^(?P<month>\d{1,2})/(?P<day>\d{1,2})/\d{4}$"
+
+
+def column_array(values, type_):
+    """One report column (strings) as an Arrow array of `type_`; typed cells that do not parse are null."""
+    strings = pa.array(values, pa.string(), from_pandas=True)
+    if pa.types.is_string(type_):
+        return strings
+    strings = pc.utf8_trim_whitespace(strings)
+    if pa.types.is_integer(type_):
+        return pc.if_else(pc.match_substring_regex(strings, COUNT_PATTERN), strings, None).cast(type_)
+    parts = pc.extract_regex(strings, LABEL_DATE_PATTERN)
+    dates = pc.if_else(pc.is_valid(parts), strings, None)
+    stamps = pc.strptime(dates, format=LABEL_DATE_FORMAT, unit="s", error_is_null=True)
+    # strptime rolls an impossible day over ("2/29/2025" -> March 1st): null it instead.
+    printed = pc.and_(
+        pc.equal(pc.month(stamps), pc.struct_field(parts, "month").cast(pa.int64())),
+        pc.equal(pc.day(stamps), pc.struct_field(parts, "day").cast(pa.int64())),
+    )
+    return pc.if_else(printed, stamps, None).cast(type_)
+
+
+def record_batches(df, schema, rows=ROW_GROUP_ROWS):
+    """`df` as record batches of `schema`, `rows` rows each; a column missing from `df` is null."""
+    for start in range(0, len(df), rows):
+        chunk = df.iloc[start:start + rows]
+        yield pa.record_batch([
+            column_array(chunk[field.name], field.type) if field.name in chunk
+            else pa.nulls(len(chunk), field.type)
+            for field in schema
+        ], schema=schema)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Writers
+# ─────────────────────────────────────────────────────────────────────────────
+def open_writer(sink, schema, fmt):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema)
+    if fmt == "csv":
+        return pa_csv.CSVWriter(sink, schema)
+    if fmt == "arrow":
+        return pa_ipc.new_file(sink, schema)
+    raise ValueError(f"unknown export format {fmt!r}")
+
+
+def write_table(df, schema, fmt, path=None):
+    """
+    Write a report DataFrame (build_carton_report / build_cmus_report) as
+    `fmt`, one row group per ROW_GROUP_ROWS rows. Returns the file bytes,
+    or writes straight to `path` and returns it, like build_excel.
+    """
+    sink = path if path is not None else pa.BufferOutputStream()
+    with open_writer(sink, schema, fmt) as writer:
+        for batch in record_batches(df, schema):
+            writer.write_batch(batch)
+    return path if path is not None else sink.getvalue().to_pybytes()
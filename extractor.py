@@ -0,0 +1,2145 @@
+"""
+Extraction engine for shipping / carton label PDFs.
+
+Importable without Streamlit: the web page (app.py) and the batch CLI
+(batch.py) are both thin clients of the functions below.
+"""
+import pdfplumber
+import fitz  # PyMuPDF
+import pandas as pd
+import xlsxwriter
+import functools
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from pyzbar.pyzbar import decode as zbar_decode
+
+import profiling
+from ocr_engine import engine_name, get_engine, use_engine
+from page_cache import DEFAULT_CACHE_MAX_MB, get_cache, get_journal
+
+# Bump whenever a parser change would alter the rows produced for a page,
+# so stale entries in the page cache are never served.
+PARSER_VERSION = "7"
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Generic helpers
+# ─────────────────────────────────────────────────────────────────────────────
+WHITESPACE = re.compile(r'\s+')
+
+
+def clean_text(text):
+    if text:
+        return WHITESPACE.sub(' ', text).strip()
+    return ""
+
+
+def reverse_lines(text):
+    """Reverses each line of sideways / mirrored rotated carton labels."""
+    if not text:
+        return []
+    return [line[::-1] for line in text.split('\n')]
+
+
+def gtin_check_digit(d13):
+    """Standard GS1 GTIN check digit (weights 3,1 from the right)."""
+    total = 0
+    for i, ch in enumerate(reversed(d13)):
+        total += int(ch) * (3 if i % 2 == 0 else 1)
+    return (10 - (total % 10)) % 10
+
+
+def is_cmus_text(text):
+    return "Material #" in text or "Ship From:" in text
+
+
+def is_carton_text(text):
+    return "CARTON" in text and ("(01)" in text or "STYLE/COLOR" in text or "SHIP TO" in text or "PO#" in text or "PO " in text)
+
+
+def is_reversed_carton_text(text):
+    # "CARTON" has no spaces, so it can only appear in the reversed lines
+    # if "NOTRAC" is in the original: skip the copy otherwise.
+    return "NOTRAC" in text and is_carton_text(" ".join(reverse_lines(text)))
+
+
+def detect_text_format(text):
+    """
+    Decide parser and orientation for pages with a text layer.
+    Returns tuple: (format_name, is_reversed)
+    """
+    if not text:
+        return None, False
+    if is_cmus_text(text):
+        return "cmus", False
+    if is_carton_text(text):
+        return "carton_text", False
+    if is_reversed_carton_text(text):
+        return "carton_text", True
+    return None, False
+
+
+# The one check each sniffed file kind needs (see page_format).
+FILE_KIND_CHECKS = {
+    "cmus": (is_cmus_text, ("cmus", False)),
+    "carton_text": (is_carton_text, ("carton_text", False)),
+    "carton_reversed": (is_reversed_carton_text, ("carton_text", True)),
+}
+
+
+def page_format(text, file_kind=None):
+    """
+    detect_text_format() for a page of a file sniffed as `file_kind`: only
+    that kind's check runs (a CMUS file never builds the reversed lines,
+    an image-only page with no text runs none), and a page failing it gets
+    the full detection chain.
+    """
+    if not text:
+        return None, False
+    check = FILE_KIND_CHECKS.get(file_kind)
+    if check is not None and check[0](text):
+        return check[1]
+    return detect_text_format(text)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Barcode decoding
+# ─────────────────────────────────────────────────────────────────────────────
+# Zoom levels tried by decode_page_barcodes, cheapest first. Clean vector
+# labels usually decode at the first tier; scans escalate to the last one.
+BARCODE_ZOOMS = (2, 4, 6)
+# FIELD_BOXES / EXPECTED_CANVAS are measured on renders at this zoom.
+OCR_ZOOM = 6
+ROTATIONS = (-90, 90, 0, 180)
+# Lossless quarter-turns (same pixels as Image.rotate(angle, expand=True)).
+TRANSPOSE = {
+    90: Image.Transpose.ROTATE_90,
+    -90: Image.Transpose.ROTATE_270,
+    180: Image.Transpose.ROTATE_180,
+}
+
+
+def render_page(fitz_page, zoom, gray=False):
+    """
+    Grayscale render; zbar and Tesseract both work on luminance only.
+    gray=True (low-memory mode) has MuPDF render one byte per pixel instead
+    of an RGB pixmap converted by PIL: a third of the pixmap and no RGB
+    copy. Black-and-white labels come out identical; colour content is
+    converted with MuPDF's weights rather than PIL's.
+    """
+    with profiling.stage("render"):
+        if gray:
+            pix = fitz_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+            img = Image.frombytes("L", (pix.width, pix.height), pix.samples_mv)
+        else:
+            pix = fitz_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples).convert("L")
+        del pix  # free the pixmap now, not when the caller is done with the image
+        return img
+
+
+def rotate_quarter(img, angle):
+    return img.transpose(TRANSPOSE[angle]) if angle else img
+
+
+def numeric_codes(img):
+    with profiling.stage("zbar"):
+        results = zbar_decode(img)
+    return sorted(
+        {r.data.decode(errors="ignore") for r in results
+         if r.data.decode(errors="ignore").isdigit()},
+        key=len, reverse=True,
+    )
+
+
+def rotation_order(orientation):
+    """ROTATIONS with the file's last successful rotation moved to the front."""
+    learned = orientation.get("angle") if orientation is not None else None
+    if learned is None:
+        return ROTATIONS
+    return (learned,) + tuple(a for a in ROTATIONS if a != learned)
+
+
+def decode_page_barcodes(fitz_page, zooms=BARCODE_ZOOMS, stats=None, orientation=None, gray=False,
+                         need_gtin=True):
+    """
+    Tiered barcode decode: render at the lowest zoom first and escalate only
+    while zbar finds no numeric code or the carton/GTIN pair is incomplete.
+    With need_gtin=False (the GTIN is already known, e.g. from the text
+    layer) the first tier that yields a carton code is kept.
+    Returns {"values": [...], "angle": rotation, "zoom": tier, "image": rotated render}.
+
+    `orientation` is a per-file dict remembering the rotation that worked on
+    earlier pages; it is tried first and the full sweep only runs when it
+    fails. Counters go to stats: barcode_zoom_<z>, rotations_tried,
+    rotation_learned_hits / rotation_learned_misses. `gray` is passed to
+    render_page.
+    """
+    stats = stats if stats is not None else Counter()
+    learned = orientation.get("angle") if orientation is not None else None
+    order = rotation_order(orientation)
+    best = None
+    for zoom in zooms:
+        img = render_page(fitz_page, zoom, gray)
+        for angle in order:
+            test_img = rotate_quarter(img, angle)
+            stats["rotations_tried"] += 1
+            values = numeric_codes(test_img)
+            if values:
+                break
+        if not values:
+            continue
+        decoded = {"values": values, "angle": angle, "zoom": zoom, "image": test_img}
+        if not need_gtin or pick_carton_and_gtin(values)[1]:
+            best = decoded
+            break
+        if best is None or len(values) >= len(best["values"]):
+            best = decoded
+
+    if best is None:
+        stats["barcode_none"] += 1
+        return {"values": [], "angle": None, "zoom": zooms[-1], "image": None}
+    stats[f"barcode_zoom_{best['zoom']:g}"] += 1
+    if learned is not None:
+        stats["rotation_learned_hits" if best["angle"] == learned else "rotation_learned_misses"] += 1
+    if orientation is not None:
+        orientation["angle"] = best["angle"]
+    return best
+
+
+def rotation_hit_rate(stats):
+    """Share of pages whose learned file orientation decoded first time (None before any page had one)."""
+    tried = stats["rotation_learned_hits"] + stats["rotation_learned_misses"]
+    return stats["rotation_learned_hits"] / tried if tried else None
+
+
+def ocr_angle(decode_angle):
+    """
+    Rotation that puts a label upright for OCR, given the rotation its
+    barcodes decoded at. zbar reads a 1D symbol upside down as well, so the
+    decode angle (which follows the file's learned order) only tells the
+    axis: the text goes the way the first ROTATIONS entry on that axis puts
+    it, -90 for a sideways label and 0 otherwise.
+    """
+    return 0 if decode_angle in (0, 180) else -90
+
+
+def label_image(fitz_page, decoded, zoom=OCR_ZOOM, gray=False):
+    """Upright render of the label at OCR zoom, reusing the decode render when it is at that zoom."""
+    angle = ocr_angle(decoded["angle"])
+    if decoded["image"] is not None and decoded["zoom"] == zoom:
+        return decoded["image"] if decoded["angle"] == angle else rotate_quarter(decoded["image"], 180)
+    return rotate_quarter(render_page(fitz_page, zoom, gray), angle)
+
+
+def pick_carton_and_gtin(values):
+    if not values:
+        return "", ""
+    carton = values[0]
+    gtin = ""
+    for v in values[1:]:
+        if v != carton and 13 <= len(v) <= 17:
+            gtin = v
+            break
+    return carton, gtin
+
+
+def split_carton_barcode(barcode):
+    if len(barcode) >= 20:
+        return barcode[10:16], barcode[16:20]
+    return "", barcode
+
+
+COLOR_PATTERN = re.compile(
+    r'\b(Dark|Light|Navy|Royal|Bright)?\s?(Blue|Black|Green|Red|Grey|Gray|White|Brown|Beige|Khaki)\b',
+    re.IGNORECASE,
+)
+
+DESC_EXCLUDE = (
+    "SHIP", "CARTON", "UNICHELA", "CASUALLINE", "LIMITED", "PRIVATE",
+    "STYLE", "COLOR", "SIZE", "PCS", "DIM", "GRID", "COMPLETE",
+    "CONFORMING", "RFID", "FROM", "QTY", "DATE", "TO", "MCDONOUGH",
+)
+
+
+def extract_color(text):
+    m = COLOR_PATTERN.search(text)
+    if not m:
+        return ""
+    parts = [p for p in (m.group(1), m.group(2)) if p]
+    return " ".join(p.title() for p in parts)
+
+
+DESC_WORD = re.compile(r"[A-Za-z]{2,}")
+DIGIT = re.compile(r'\d')
+# The excluded markers are letters only, so one inside a word is one inside the line.
+DESC_EXCLUDED = re.compile("|".join(DESC_EXCLUDE), re.IGNORECASE | re.ASCII)
+
+
+def line_description(line):
+    """The line as a product description, or "" if it does not look like one."""
+    if DIGIT.search(line) or DESC_EXCLUDED.search(line):
+        return ""
+    words = DESC_WORD.findall(line)
+    if len(words) < 2:
+        return ""
+    upper_words = [w.upper() for w in words]
+    if len(upper_words) == 2 and len(upper_words[1]) <= 2:
+        return ""
+    return " ".join(upper_words)
+
+
+def extract_description(text):
+    for line in text.split("\n"):
+        desc = line_description(line)
+        if desc:
+            return desc
+    return ""
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Parser 1 — GS1 carton label WITH text layer (Upright & Reversed)
+# ─────────────────────────────────────────────────────────────────────────────
+# Compiled once; parse_carton_text runs on every text-layer carton page.
+CT_SHIP_DC = re.compile(r'SHIP\s*TO:\s*([A-Za-z0-9\s.]+?)(?=\s*Date:|\s*QTY|\s*MCDONOUGH|\s*CARTON|\n|$)', re.IGNORECASE)
+CT_CITY = re.compile(r'\b([A-Z]{3,}(?:\s+[A-Z]{2,})?)\s+([A-Z]{2})\b')
+CT_DATE = re.compile(r'(\d{1,2}/\d{1,2}/\d{4})')
+CT_QTY = re.compile(r'\bQTY\s*(\d{1,3})\b', re.IGNORECASE)
+CT_QTY_AFTER = re.compile(r'\b(\d{1,3})\s*QTY\b', re.IGNORECASE)
+CT_PO = re.compile(r'\b(4\d{9})\b')
+CT_PO_LABELLED = re.compile(r'PO#?\s*(4?\d{6,10})', re.IGNORECASE)
+CT_STYLE_PART = re.compile(r'[A-Z0-9]{2,10}')
+CT_STYLE = re.compile(r'([A-Z]{2,6}\d{3,6}\s*-\s*[A-Z0-9]{1,4})')
+CT_DASH = re.compile(r'\s*-\s*')
+CT_GTIN = re.compile(r'\(01\)\s*([\d\s]{12,18})')
+CT_GTIN_HEAD = re.compile(r'\(01\)(\d+)')
+CT_DIGITS_11 = re.compile(r'\b(\d{11})\b')
+NON_DIGIT = re.compile(r'\D')
+CT_SIZE = re.compile(r'\bSIZE\b\s*([A-Z]{1,4}\s*\d{0,2})', re.IGNORECASE)
+CT_SIZE_NUMBER = re.compile(r'\d{2}')
+CT_GRID = re.compile(r'\(Complete Grid\)\s*(\d{1,4})', re.IGNORECASE)
+CT_GRID_PCS = re.compile(r'\d{2,4}')
+CT_NON_CONFORMING = re.compile(r'NON-CONFORMING', re.IGNORECASE)
+SIZE_TOKENS = frozenset({"XXS", "XS", "S", "M", "L", "XL", "XXL", "XXXL"})
+
+
+def scan_carton_lines(lines, want_size=True, want_grid=True):
+    """
+    One pass over the label lines for the fields that depend on line
+    neighbours: the "-" style pairing, a size token next to a 2-digit line,
+    the piece count within 3 lines of "grid", and the first description
+    line. Each field keeps the first match the separate scans would find.
+    """
+    style = size = grid_pcs = desc = ""
+    n = len(lines)
+    for i, l in enumerate(lines):
+        if not style and l == "-":
+            left = lines[i - 1] if i >= 1 else ""
+            right = lines[i + 1] if i + 1 < n else ""
+            cands = [t for t in (left, right) if CT_STYLE_PART.fullmatch(t)]
+            if len(cands) == 2:
+                a, b = sorted(cands, key=len, reverse=True)
+                style = f"{a}-{b}"
+        if want_size and not size and CT_SIZE_NUMBER.fullmatch(l):
+            for j in (i - 1, i + 1):
+                if 0 <= j < n and lines[j] in SIZE_TOKENS:
+                    size = f"{lines[j]} {l}"
+                    break
+        if want_grid and not grid_pcs and "grid" in l.lower():
+            for j in range(max(0, i - 3), min(n, i + 4)):
+                if CT_GRID_PCS.fullmatch(lines[j]):
+                    grid_pcs = lines[j]
+                    break
+        if not desc:
+            desc = line_description(l)
+    return style, size, grid_pcs, desc
+
+
+def parse_carton_text(text, page_no, is_reversed=False):
+    lines = reverse_lines(text) if is_reversed else [s for s in (l.strip() for l in text.split('\n')) if s]
+    joined = " ".join(lines)
+
+    # Ship To extraction
+    m_dc = CT_SHIP_DC.search(joined)
+    ship_dc = clean_text(m_dc.group(1)) if m_dc else ""
+    m_city = CT_CITY.search(joined)
+    ship_city = f"{m_city.group(1)} {m_city.group(2)}" if m_city else ""
+    if ship_dc and ship_city:
+        ship_to = ship_dc if ship_city in ship_dc else f"{ship_dc}, {ship_city}"
+    else:
+        ship_to = ship_dc or ship_city
+
+    m_date = CT_DATE.search(joined)
+    date = m_date.group(1) if m_date else ""
+
+    m_qty = CT_QTY.search(joined) or CT_QTY_AFTER.search(joined)
+    qty = m_qty.group(1) if m_qty else ""
+
+    m_po = CT_PO.search(joined) or CT_PO_LABELLED.search(joined)
+    po = m_po.group(1) if m_po else ""
+
+    # GTIN (01): spaced digits, else the "(01)" head plus an 11-digit run
+    gtin = ""
+    m_gtin = CT_GTIN.search(joined)
+    if m_gtin:
+        gtin_digits = NON_DIGIT.sub('', m_gtin.group(1))
+        if len(gtin_digits) >= 13:
+            gtin = gtin_digits[:14]
+    if not gtin:
+        m_g_head = CT_GTIN_HEAD.search(joined)
+        if m_g_head:
+            b = CT_DIGITS_11.search(joined)
+            if b:
+                d13 = m_g_head.group(1) + b.group(1)
+                gtin = d13 + str(gtin_check_digit(d13))
+
+    color = extract_color(joined)
+    m_size = CT_SIZE.search(joined)
+    m_grid = CT_GRID.search(joined)
+
+    # Line-neighbour fields, in a single pass (size / grid only as fallbacks)
+    style, size, grid_pcs, desc = scan_carton_lines(lines, want_size=not m_size, want_grid=not m_grid)
+    if not style:
+        m_style = CT_STYLE.search(joined)
+        style = CT_DASH.sub('-', m_style.group(1)) if m_style else ""
+    if m_size:
+        size = clean_text(m_size.group(1))
+    if not size and "Prepack" in joined:
+        size = "Prepack"
+    if m_grid:
+        grid_pcs = m_grid.group(1)
+
+    status = "NON-CONFORMING" if CT_NON_CONFORMING.search(joined) else ""
+
+    return {
+        "Label No.": page_no,
+        "Ship To": ship_to,
+        "Date": date,
+        "PO #": po,
+        "Style / Color": style,
+        "Description": desc,
+        "Color": color,
+        "Size": size,
+        "Qty": qty,
+        "GTIN (01)": gtin,
+        "Grid / Ref No.": grid_pcs,
+        "Status": status,
+    }
+
+
+SSCC_TEXT = re.compile(r'\(00\)\s*((?:\d\s*){18})')
+
+
+def text_carton_barcode(text, is_reversed=False):
+    """
+    The carton barcode as zbar decodes it ("00" + 18-digit SSCC), read from
+    the human-readable line printed under the barcode. Returns "" when the
+    line is missing or its check digit does not validate.
+    """
+    lines = reverse_lines(text) if is_reversed else text.split('\n')
+    m = SSCC_TEXT.search(" ".join(lines))
+    if not m:
+        return ""
+    sscc = re.sub(r'\D', '', m.group(1))
+    if gtin_check_digit(sscc[:17]) != int(sscc[17]):
+        return ""
+    return "00" + sscc
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Parser 2 — Rotated GS1 carton label WITHOUT text layer (OCR Fallback)
+# ─────────────────────────────────────────────────────────────────────────────
+FIELD_BOXES = {
+    "ship_dc": (500, 30, 1650, 160),
+    "ship_city": (480, 180, 1650, 360),
+    "date": (1630, 255, 1970, 350),
+    "qty": (2020, 210, 2180, 350),
+    "po": (630, 1360, 1650, 1550),
+    "desc": (480, 1240, 1350, 1340),
+    "style": (480, 1550, 1500, 1710),
+    "color": (1850, 1490, 2220, 1580),
+    "size": (1870, 1565, 2200, 1690),
+}
+EXPECTED_CANVAS = (4752, 3672)
+# The small grid / reference number in the top-right corner, same canvas.
+CORNER_BOX = (EXPECTED_CANVAS[0] - 194, 46, EXPECTED_CANVAS[0] - 59, 110)
+
+
+def normalized_box(box, canvas):
+    """A pixel box measured on a `canvas` (w, h) render as fractions of it."""
+    w, h = canvas
+    x0, y0, x1, y1 = box
+    return (x0 / w, y0 / h, x1 / w, y1 / h)
+
+
+def pixel_box(box, size):
+    """A normalized box in pixels of a render of `size` (w, h)."""
+    w, h = size
+    x0, y0, x1, y1 = box
+    return (round(x0 * w), round(y0 * h), round(x1 * w), round(y1 * h))
+
+
+# Label layouts read by the cropped-field OCR path. Boxes are fractions of
+# the upright label, so a template serves any render size of its layout;
+# "canvas" is the render the boxes were measured on: its aspect ratio is
+# what a label is matched on, and crops are scaled to its pixel size for
+# OCR. Labels matching no template get full-page OCR.
+LABEL_TEMPLATES = {
+    "gs1_carton": {
+        "canvas": EXPECTED_CANVAS,
+        "boxes": {field: normalized_box(box, EXPECTED_CANVAS) for field, box in FIELD_BOXES.items()},
+        "corner": normalized_box(CORNER_BOX, EXPECTED_CANVAS),
+    },
+}
+DEFAULT_TEMPLATE = "gs1_carton"
+# Largest relative difference in aspect ratio (width / height) that still matches.
+TEMPLATE_ASPECT_TOLERANCE = 0.05
+
+
+def match_template(size):
+    """The LABEL_TEMPLATES layout closest in aspect ratio to an upright label of `size`, or None."""
+    w, h = size
+    best, best_diff = None, TEMPLATE_ASPECT_TOLERANCE
+    for name, template in LABEL_TEMPLATES.items():
+        cw, ch = template["canvas"]
+        diff = abs((w / h) / (cw / ch) - 1)
+        if diff <= best_diff:
+            best, best_diff = name, diff
+    return best
+
+
+def template_zoom(template, size):
+    """How much smaller a render of `size` is than the template's canvas (crops are upsampled by it)."""
+    return LABEL_TEMPLATES[template]["canvas"][0] / size[0]
+
+
+def ocr_fallback_ratio(stats):
+    """Share of OCR labels that matched no template and took full-page OCR (None before any)."""
+    matched = sum(v for k, v in stats.items() if k.startswith("ocr_template_"))
+    total = matched + stats["ocr_fallback"]
+    return stats["ocr_fallback"] / total if total else None
+
+
+@functools.lru_cache(maxsize=None)
+def contrast_lut(lo, hi):
+    """ImageOps.autocontrast's lookup table for pixels spanning lo..hi."""
+    if hi <= lo:
+        return list(range(256))
+    scale = 255.0 / (hi - lo)
+    offset = -lo * scale
+    return [min(255, max(0, int(ix * scale + offset))) for ix in range(256)]
+
+
+def stretch_contrast(img):
+    """ImageOps.autocontrast() of an "L" image, from its extrema instead of a histogram."""
+    return img.point(contrast_lut(*img.getextrema()))
+
+
+class OcrLabel:
+    """
+    The rotated label prepared once for all OCR reads of a page: converted
+    to grayscale once, the contrast-stretched full page for full-page and
+    layout passes, and each box cropped, upsampled and stretched once (the
+    corner number and layout-mode re-reads reuse them). Pixels are the same
+    as crop -> resize -> ImageOps.autocontrast per call.
+    `psm_wins`, when given, is the file's {field: Counter(psm -> accepted
+    reads)} that ocr_field orders its attempts by (options
+    "learn_psm_order"); OCR calls and retries are counted in `stats`.
+    """
+
+    def __init__(self, img, psm_wins=None, stats=None):
+        self.image = img if img.mode == "L" else img.convert("L")
+        self.size = self.image.size
+        self.psm_wins = psm_wins
+        self.stats = stats if stats is not None else Counter()
+        self._page = None
+        self._crops = {}
+
+    def page(self):
+        if self._page is None:
+            with profiling.stage("prep"):
+                self._page = stretch_contrast(self.image)
+        return self._page
+
+    def crop(self, box, scale=2):
+        key = (box, scale)
+        if key not in self._crops:
+            w, h = self.size
+            x0, y0, x1, y1 = box
+            with profiling.stage("prep"):
+                crop = self.image.crop((max(0, x0), max(0, y0), min(w, x1), min(h, y1)))
+                self._crops[key] = stretch_contrast(crop.resize((round(crop.width * scale), round(crop.height * scale))))
+        return self._crops[key]
+
+
+def ocr_label(rotated_img):
+    """`rotated_img` as an OcrLabel (PIL images are wrapped, OcrLabels passed through)."""
+    return rotated_img if isinstance(rotated_img, OcrLabel) else OcrLabel(rotated_img)
+
+
+def psm_order(psm_wins, field, psms):
+    """
+    `psms` with the ones that read `field` on earlier pages first (most wins
+    first; ties keep order). Every PSM stays in the order, so a field is
+    never given up on.
+    """
+    wins = psm_wins.get(field)
+    if not wins:
+        return psms
+    return tuple(sorted(psms, key=lambda p: -wins[p]))
+
+
+def ocr_field(rotated_img, box, whitelist="", psm=7, scale=2, retry_psms=(8, 13, 6), field=None, validator=None):
+    """
+    OCR one box of the label. Fields with a whitelist or a `validator` are
+    re-read with the other PSMs only while the read is empty or fails the
+    validator, so a field that reads cleanly costs one Tesseract run; when
+    no PSM passes, the most confident read is returned. The PSMs are tried
+    in the given order, so the read depends on the crop alone; when the label carries
+    `psm_wins`, the order is learned per `field` over the file instead (see
+    psm_order), which saves runs but lets earlier pages change the read.
+    Free-text fields get one read.
+    """
+    label = ocr_label(rotated_img)
+    gray = label.crop(box, scale)
+    engine = get_engine()
+    psms = (psm,) + tuple(p for p in retry_psms if p != psm) if whitelist or validator else (psm,)
+    learn = field is not None and label.psm_wins is not None
+    if learn:
+        psms = psm_order(label.psm_wins, field, psms)
+    best, best_conf = "", None
+    for attempt, attempt_psm in enumerate(psms):
+        if attempt:
+            profiling.count("psm_retries")
+            label.stats["ocr_retries"] += 1
+        with profiling.stage("ocr"):
+            txt, conf = engine.recognize_conf(gray, attempt_psm, whitelist)
+        label.stats["ocr_calls"] += 1
+        txt = txt.strip()
+        if not txt:
+            continue
+        if validator is None or validator(txt):
+            if learn:
+                label.psm_wins.setdefault(field, Counter())[attempt_psm] += 1
+            return txt
+        if best_conf is None or conf > best_conf:
+            best, best_conf = txt, conf
+    return best
+
+
+def ocr_label_text(rotated_img):
+    gray = ocr_label(rotated_img).page()
+    with profiling.stage("ocr"):
+        return get_engine().recognize(gray, 6)
+
+
+def ocr_corner_number(rotated_img, template=DEFAULT_TEMPLATE):
+    size = rotated_img.size
+    box = pixel_box(LABEL_TEMPLATES[template]["corner"], size)
+    return ocr_field(rotated_img, box, whitelist="0123456789", psm=7, scale=4 * template_zoom(template, size),
+                     field="corner", validator=str.isdigit)
+
+
+# Per-field ocr_field() arguments; fields not listed use the defaults.
+FIELD_OCR_ARGS = {
+    "date": {"whitelist": "0123456789/"},
+    "qty": {"whitelist": "0123456789"},
+}
+
+# Raw-text checks mirroring the clean-up in finish_carton_ocr_fields(); a
+# field failing its check is re-read with other PSMs (see ocr_field), and
+# on its own in layout mode.
+FIELD_VALIDATORS = {
+    "date": lambda raw: re.fullmatch(r'\d{1,2}/\d{1,2}/20\d{2}', raw) is not None,
+    "qty": lambda raw: re.fullmatch(r'\d{1,3}', raw) is not None,
+    "po": lambda raw: re.search(r'\d{6,}', raw) is not None,
+}
+
+
+def read_carton_fields(rotated_img, template=DEFAULT_TEMPLATE):
+    """Raw OCR text of every field box of `template`, one crop/OCR call per field."""
+    rotated_img = ocr_label(rotated_img)
+    size = rotated_img.size
+    scale = 2 * template_zoom(template, size)
+    return {
+        field: ocr_field(rotated_img, pixel_box(box, size), scale=scale, field=field,
+                         validator=FIELD_VALIDATORS.get(field), **FIELD_OCR_ARGS.get(field, {}))
+        for field, box in LABEL_TEMPLATES[template]["boxes"].items()
+    }
+
+
+def finish_carton_ocr_fields(raw, page_no):
+    """Turn raw per-field OCR text into a carton row."""
+    ship_dc_raw = raw["ship_dc"]
+    ship_city_raw = raw["ship_city"]
+    m = re.search(r'([A-Z]{2,}(?:\s[A-Z]{2,})?)\s+([A-Z]{2})\b', ship_city_raw)
+    ship_city = f"{m.group(1)} {m.group(2)}" if m else clean_text(ship_city_raw)
+    city_word = ship_city.split()[0] if ship_city else ""
+    ship_dc = f"{city_word} DC" if city_word and re.search(r'\bDC\b', ship_dc_raw, re.IGNORECASE) else clean_text(re.sub(r'(?i)ship\s*to:?\s*', '', ship_dc_raw))
+    ship_to = ", ".join(filter(None, [ship_dc, ship_city]))
+
+    date = raw["date"]
+    if not re.fullmatch(r'\d{1,2}/\d{1,2}/20\d{2}', date):
+        date = ""
+
+    qty_raw = raw["qty"]
+    qty = qty_raw if re.fullmatch(r'\d{1,3}', qty_raw) else ""
+
+    m = re.search(r'(\d{6,})', raw["po"])
+    po = m.group(1) if m else ""
+
+    style = re.sub(r'\s*-\s*', '-', clean_text(raw["style"]))
+
+    desc = clean_text(raw["desc"]).upper()
+    color = clean_text(raw["color"])
+
+    size_raw = raw["size"]
+    m = re.search(r'([A-Z]{1,4})\D{0,3}(\d{2})', size_raw)
+    size = f"{m.group(1)} {m.group(2)}" if m else clean_text(size_raw)
+
+    return {
+        "Label No.": page_no,
+        "Ship To": ship_to,
+        "Date": date,
+        "PO #": po,
+        "Style / Color": style,
+        "Description": desc,
+        "Color": color,
+        "Size": size,
+        "Qty": qty,
+        "GTIN (01)": "",
+        "Status": "",
+    }
+
+
+def parse_carton_ocr_precise(rotated_img, page_no, template=DEFAULT_TEMPLATE):
+    return finish_carton_ocr_fields(read_carton_fields(rotated_img, template), page_no)
+
+
+def words_in_box(words, box):
+    """Text of the OCR words whose centre lies inside `box`, in reading order."""
+    x0, y0, x1, y1 = box
+    inside = []
+    for w in words:
+        wx0, wy0, wx1, wy1 = w["box"]
+        cx, cy = (wx0 + wx1) / 2, (wy0 + wy1) / 2
+        if x0 <= cx < x1 and y0 <= cy < y1:
+            inside.append(w)
+    inside.sort(key=lambda w: ((w["box"][1] + w["box"][3]) / 2, w["box"][0]))
+
+    lines = []
+    for w in inside:
+        cy = (w["box"][1] + w["box"][3]) / 2
+        half_height = (w["box"][3] - w["box"][1]) / 2
+        if lines and abs(cy - lines[-1]["cy"]) <= half_height:
+            lines[-1]["words"].append(w)
+        else:
+            lines.append({"cy": cy, "words": [w]})
+    return "\n".join(
+        " ".join(w["text"] for w in sorted(line["words"], key=lambda w: w["box"][0]))
+        for line in lines
+    )
+
+
+def read_carton_fields_layout(rotated_img, stats=None, template=DEFAULT_TEMPLATE):
+    """
+    Raw field text from one layout-aware OCR pass over the whole label:
+    words are assigned to the field boxes of `template` by geometry, and
+    only fields failing FIELD_VALIDATORS are re-read with ocr_field().
+    """
+    rotated_img = ocr_label(rotated_img)
+    size = rotated_img.size
+    boxes = {field: pixel_box(box, size) for field, box in LABEL_TEMPLATES[template]["boxes"].items()}
+    with profiling.stage("ocr"):
+        words = get_engine().words(rotated_img.page(), psm=11)
+    raw = {field: words_in_box(words, box) for field, box in boxes.items()}
+    for field, is_valid in FIELD_VALIDATORS.items():
+        if not is_valid(raw[field]):
+            raw[field] = ocr_field(rotated_img, boxes[field], scale=2 * template_zoom(template, size),
+                                   field=field, validator=is_valid, **FIELD_OCR_ARGS.get(field, {}))
+            if stats is not None:
+                stats["layout_field_retries"] += 1
+    return raw
+
+
+def parse_carton_ocr_layout(rotated_img, page_no, stats=None, template=DEFAULT_TEMPLATE):
+    return finish_carton_ocr_fields(read_carton_fields_layout(rotated_img, stats, template), page_no)
+
+
+def parse_carton_ocr_fallback(text, page_no):
+    m = re.search(r'SHIP\s*TO:?\s*([A-Za-z][A-Za-z .]{2,40})', text, re.IGNORECASE)
+    ship_dc = clean_text(m.group(1).split("\n")[0]) if m else ""
+    m = re.search(r'\n\s*([A-Z]{3,}(?:\s[A-Z]{2,})?)\s+([A-Z]{2})\b', text)
+    ship_city = f"{m.group(1)} {m.group(2)}" if m else ""
+    ship_to = ", ".join(filter(None, [ship_dc, ship_city]))
+
+    m = re.search(r'(\d{1,2}/\d{1,2}/20\d{2})', text)
+    date = m.group(1) if m else ""
+
+    m = re.search(r'\b(4\d{9})\b', text)
+    po = m.group(1) if m else ""
+
+    m = re.search(r'([A-Z]{2,6}\d{3,6}\s?-\s?[A-Z0-9]{2,4})', text)
+    style = re.sub(r'\s*-\s*', '-', clean_text(m.group(1))) if m else ""
+
+    desc = extract_description(text[m.end():] if m else text)
+    color = extract_color(text)
+
+    m = re.search(r'\bSIZE\b\D{0,10}([A-Z0-9]{1,4})\s+(\d{2})\b', text, re.IGNORECASE)
+    size = f"{m.group(1)} {m.group(2)}" if m else ""
+
+    m = re.search(r'QTY\D{0,6}(\d{1,3})\b', text, re.IGNORECASE)
+    qty = m.group(1) if m else ""
+
+    status = "NON-CONFORMING" if re.search(r'NON-CONFORMING', text, re.IGNORECASE) else ""
+
+    return {
+        "Label No.": page_no,
+        "Ship To": ship_to,
+        "Date": date,
+        "PO #": po,
+        "Style / Color": style,
+        "Description": desc,
+        "Color": color,
+        "Size": size,
+        "Qty": qty,
+        "GTIN (01)": "",
+        "Status": status,
+    }
+
+
+OCR_MODES = ("fields", "layout")
+
+
+def parse_carton_ocr(rotated_img, page_no, mode="fields", stats=None):
+    """
+    Labels matching a LABEL_TEMPLATES layout are read from its field boxes:
+    mode "fields" OCRs each crop separately; "layout" does one word-box pass
+    over the label and re-reads only invalid fields. Other labels get
+    full-page OCR. Counted in stats as ocr_template_<name> / ocr_fallback.
+    `rotated_img` is the label image or an OcrLabel of it.
+    """
+    rotated_img = ocr_label(rotated_img)
+    template = match_template(rotated_img.size)
+    if stats is not None:
+        stats[f"ocr_template_{template}" if template else "ocr_fallback"] += 1
+    if template:
+        if mode == "layout":
+            return parse_carton_ocr_layout(rotated_img, page_no, stats, template)
+        return parse_carton_ocr_precise(rotated_img, page_no, template)
+    return parse_carton_ocr_fallback(ocr_label_text(rotated_img), page_no)
+
+
+BATCH_MODE_FIELDS = ["Ship To", "PO #", "Style / Color", "Description", "Color"]
+
+
+class BatchModeCorrector:
+    """
+    Running batch-mode correction for the OCR rows of one file. Each field's
+    most common OCR value (the first seen wins ties, as in
+    Counter.most_common) fills rows where OCR missed it, and rows that
+    needed a fill or disagree with it are flagged "Needs Review". Rows are
+    corrected in place as they are added; when a field's mode changes, the
+    rows added so far are corrected again. A row added with vote=False (a
+    copy of an earlier read, see SeenLabels) is corrected but not counted.
+    """
+
+    def __init__(self, fields=BATCH_MODE_FIELDS):
+        self.fields = fields
+        self.rows = []
+        self.raw = []  # each row's field values as OCR read them
+        self.counts = {f: Counter() for f in fields}
+        self.first_seen = {f: {} for f in fields}
+        self.modes = {}
+
+    def add(self, row, vote=True):
+        raw = {f: row.get(f) for f in self.fields}
+        self.rows.append(row)
+        self.raw.append(raw)
+        changed = False
+        for f in self.fields if vote else ():
+            value = raw[f]
+            if not value:
+                continue
+            counts, first_seen = self.counts[f], self.first_seen[f]
+            first_seen.setdefault(value, len(first_seen))
+            counts[value] += 1
+            mode = self.modes.get(f)
+            if mode != value and (
+                mode is None or counts[value] > counts[mode]
+                or (counts[value] == counts[mode] and first_seen[value] < first_seen[mode])
+            ):
+                self.modes[f] = value
+                changed = True
+        if changed:
+            for r, r_raw in zip(self.rows, self.raw):
+                self._correct(r, r_raw)
+        else:
+            self._correct(row, raw)
+
+    def _correct(self, row, raw):
+        flagged = False
+        for f in self.fields:
+            mode_val = self.modes.get(f, "")
+            if not raw[f]:
+                if mode_val:
+                    row[f] = mode_val
+                    flagged = True
+            elif mode_val and raw[f] != mode_val:
+                flagged = True
+        row["Needs Review"] = "Yes" if flagged else ""
+
+
+def apply_batch_mode_correction(rows):
+    corrector = BatchModeCorrector()
+    for r in rows:
+        corrector.add(r)
+    return rows
+
+
+CARTON_COLUMN_ORDER = [
+    "File", "Label No.", "Format", "Ship To", "Date", "PO #",
+    "Style / Color", "Description", "Color", "Size",
+    "Qty", "GTIN (01)", "Grid / Ref No.", "Status",
+    "Carton No.", "Carton Seq", "Carton Barcode", "Needs Review",
+]
+
+CARTON_COL_WIDTHS = {
+    "File": 22, "Label No.": 9, "Format": 12,
+    "Ship To": 28, "Date": 12, "PO #": 14,
+    "Style / Color": 16, "Description": 32, "Color": 10, "Size": 10,
+    "Qty": 8, "GTIN (01)": 18, "Grid / Ref No.": 14, "Status": 16,
+    "Carton No.": 12, "Carton Seq": 12,
+    "Carton Barcode": 24, "Needs Review": 12,
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Parser 3 — CMUS / Club Monaco label
+# ─────────────────────────────────────────────────────────────────────────────
+def extract_label_data(text):
+    rows = []
+    order_match = re.search(r'Order No\.:(\S+)\s+(\d+)', text)
+    order_no = order_match.group(1) if order_match else ""
+    seq_no = order_match.group(2) if order_match else ""
+
+    dest_match = re.search(r'Factory I/O:\s*\n(\S+)', text)
+    destination = dest_match.group(1) if dest_match else ""
+
+    ship_from_id_match = re.search(r'Ship From:\s*(\S+)', text)
+    ship_from_id = ship_from_id_match.group(1) if ship_from_id_match else ""
+    address_block_match = re.search(r'Ship From:.*?\n(.*?)Order No\.', text, re.DOTALL)
+    if address_block_match:
+        addr_lines = address_block_match.group(1).strip().splitlines()
+        ship_from_addr = ", ".join(l.strip() for l in addr_lines if l.strip())
+    else:
+        ship_from_addr = ""
+    ship_from = f"{ship_from_id} – {ship_from_addr}" if ship_from_id else ship_from_addr
+
+    ship_to_header = re.search(r'Ship To:(.+)', text)
+    to_name = clean_text(ship_to_header.group(1)) if ship_to_header else ""
+    to_addr_match = re.search(r'Export Processing Zone\s+([\w\d].*?)\n.*?Bethlehem', text, re.DOTALL)
+    to_street = clean_text(to_addr_match.group(1)) if to_addr_match else ""
+    to_city_match = re.search(r'(Bethlehem PA \d+)', text)
+    to_city = clean_text(to_city_match.group(1)) if to_city_match else ""
+    ship_to = ", ".join(filter(None, [to_name, to_street, to_city]))
+
+    carton_match = re.search(r'CARTON NUMBER\s+(\d+)\s+of\s+(\d+)', text, re.IGNORECASE)
+    carton_no = carton_match.group(1) if carton_match else ""
+    total_cartons = carton_match.group(2) if carton_match else ""
+    carton_label = f"{carton_no} of {total_cartons}" if carton_no else ""
+
+    carton_total_match = re.search(r'CARTON TOTAL\s+(\d+)', text, re.IGNORECASE)
+    carton_total = carton_total_match.group(1) if carton_total_match else ""
+
+    label_total_match = re.search(r'LABEL TOTAL\s+(\d+)', text, re.IGNORECASE)
+    label_total = label_total_match.group(1) if label_total_match else ""
+
+    sscc_raw_match = re.search(r'\(00\)([\d\s]+)', text)
+    if sscc_raw_match:
+        raw = sscc_raw_match.group(0).split('\n')[0].strip()
+        sscc_display = raw
+        sscc_digits = re.sub(r'[^\d]', '', raw)[:20]
+    else:
+        sscc_display = sscc_digits = ""
+
+    table_match = re.search(
+        r'Material\s*#\s+Size\s+Quantity\s*\n(.*?)LABEL TOTAL',
+        text, re.DOTALL | re.IGNORECASE
+    )
+    if table_match:
+        for line in table_match.group(1).strip().splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split()
+            if len(parts) >= 3:
+                material, size, qty = parts[0], parts[1], parts[2]
+            elif len(parts) == 2:
+                material, size, qty = parts[0], parts[1], ""
+            else:
+                continue
+            rows.append({
+                "Order No.": order_no, "Seq No.": seq_no, "Destination": destination,
+                "Ship From": ship_from, "Ship To": ship_to,
+                "Material #": material, "Size": size, "Quantity": qty,
+                "Label Total": label_total, "Carton Total": carton_total,
+                "Carton No.": carton_label,
+                "SSCC (display)": sscc_display, "SSCC (digits)": sscc_digits,
+            })
+
+    if not rows:
+        rows.append({
+            "Order No.": order_no, "Seq No.": seq_no, "Destination": destination,
+            "Ship From": ship_from, "Ship To": ship_to,
+            "Material #": "", "Size": "", "Quantity": "",
+            "Label Total": label_total, "Carton Total": carton_total,
+            "Carton No.": carton_label,
+            "SSCC (display)": sscc_display, "SSCC (digits)": sscc_digits,
+        })
+
+    return rows
+
+
+def merge_sscc_groups(df):
+    """
+    One row per SSCC, in first-seen order. An SSCC listed with several sizes
+    keeps its first row, with Size joined ("S/M"), Size Detail listing size +
+    quantity ("S4/M8") and Quantity the sum of its numeric quantities.
+    Single-size SSCCs get an empty Size Detail.
+    """
+    key = "SSCC (digits)"
+    df = df[df[key].notna()]
+    groups = df[key]
+    first = df.drop_duplicates(key).reset_index(drop=True)
+
+    group_sizes = groups.value_counts()
+    multi = first[key].map(group_sizes) > 1
+    sizes = df["Size"].groupby(groups, sort=False).agg("/".join)
+    details = (df["Size"].astype(str) + df["Quantity"].astype(str)).groupby(groups, sort=False).agg("/".join)
+    # Only multi-size groups are summed (and so converted), as before.
+    qty = df["Quantity"].astype(str)
+    in_multi = groups.map(group_sizes) > 1
+    totals = qty.where(qty.str.isdigit() & in_multi, "0").astype(int).groupby(groups, sort=False).sum().astype(str)
+
+    first.loc[multi, "Size"] = first.loc[multi, key].map(sizes)
+    first.loc[multi, "Quantity"] = first.loc[multi, key].map(totals)
+    first["Size Detail"] = first[key].map(details).where(multi, "")
+    return first
+
+
+CMUS_COLUMN_ORDER = [
+    "Order No.", "Seq No.", "Destination",
+    "Ship From", "Ship To",
+    "Material #", "Size", "Size Detail", "Quantity",
+    "Label Total", "Carton Total", "Carton No.",
+    "SSCC (display)", "SSCC (digits)",
+]
+
+CMUS_COL_WIDTHS = {
+    "Order No.": 16, "Seq No.": 8, "Destination": 13,
+    "Ship From": 40, "Ship To": 35, "Material #": 18,
+    "Size": 10, "Size Detail": 22, "Quantity": 10,
+    "Label Total": 12, "Carton Total": 12, "Carton No.": 13,
+    "SSCC (display)": 30, "SSCC (digits)": 25,
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Excel builder
+# ─────────────────────────────────────────────────────────────────────────────
+HEADER_FORMAT = {
+    'bold': True, 'bg_color': '#1E1E1E', 'font_color': 'white',
+    'border': 1, 'align': 'center', 'valign': 'vcenter',
+}
+DATA_FORMAT = {'border': 1, 'valign': 'vcenter'}
+MIXED_FORMAT = {'border': 1, 'valign': 'vcenter', 'bg_color': '#FFF9C4'}
+REVIEW_FORMAT = {'border': 1, 'valign': 'vcenter', 'bg_color': '#FFCDD2'}
+
+
+def _write_sheet(workbook, name, df, header_fmt, widths, row_formats=None):
+    """
+    Write `df` to a new sheet, one write_row() per row and in row order (as
+    constant_memory requires). `row_formats` is an optional sequence giving
+    each data row's cell format.
+    """
+    ws = workbook.add_worksheet(name)
+    for col_num, col_name in enumerate(df.columns):
+        ws.set_column(col_num, col_num, widths(col_name))
+    ws.set_row(0, 20)
+    ws.write_row(0, 0, list(df.columns), header_fmt)
+    if row_formats is None:
+        for r, values in enumerate(df.itertuples(index=False, name=None), start=1):
+            ws.write_row(r, 0, values)
+    else:
+        for r, (values, fmt) in enumerate(zip(df.itertuples(index=False, name=None), row_formats), start=1):
+            ws.write_row(r, 0, values, fmt)
+    return ws
+
+
+def build_excel(df, col_widths, summary_df=None, highlight_mixed=True, dup_df=None, path=None,
+                timings_tables=None):
+    """
+    Master workbook: Shipping_Data (+ Summary, Duplicates_Removed). Rows are
+    streamed in xlsxwriter's constant_memory mode, each written once with its
+    row format (red for Needs Review, yellow for mixed sizes). Returns the
+    workbook bytes, or writes straight to `path` and returns it.
+    `timings_tables` (e.g. the profiling stage summary and per-page table)
+    are written one under another on a Timings sheet.
+    """
+    output = path if path is not None else io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    header_fmt = workbook.add_format(HEADER_FORMAT)
+    data_fmt = workbook.add_format(DATA_FORMAT)
+    mixed_fmt = workbook.add_format(MIXED_FORMAT)
+    review_fmt = workbook.add_format(REVIEW_FORMAT)
+
+    # Pick each row's format with column operations, not per cell.
+    formats = [data_fmt] * len(df)
+    if highlight_mixed:
+        blank = pd.Series("", index=df.index)
+        review = df.get("Needs Review", blank).astype(str).str.lower().eq("yes")
+        mixed = df.get("Size", blank).astype(str).str.contains("/", regex=False)
+        codes = mixed.astype(int).mask(review, 2)
+        formats = [(data_fmt, mixed_fmt, review_fmt)[c] for c in codes]
+    ws = _write_sheet(
+        workbook, 'Shipping_Data', df, header_fmt,
+        lambda col: col_widths.get(col, 18), formats,
+    )
+    ws.freeze_panes(1, 0)
+
+    if summary_df is not None and not summary_df.empty:
+        _write_sheet(workbook, 'Summary', summary_df, header_fmt, lambda col: max(14, len(str(col)) + 4))
+
+    if dup_df is not None and not dup_df.empty:
+        _write_sheet(workbook, 'Duplicates_Removed', dup_df, header_fmt, lambda col: col_widths.get(col, 18))
+
+    if timings_tables:
+        ws4 = workbook.add_worksheet('Timings')
+        ws4.set_column(0, max(len(table.columns) for table in timings_tables) - 1, 14)
+        r = 0
+        for table in timings_tables:
+            ws4.write_row(r, 0, list(table.columns), header_fmt)
+            for values in table.round(4).astype(object).fillna("").itertuples(index=False, name=None):
+                r += 1
+                ws4.write_row(r, 0, values)
+            r += 2
+
+    workbook.close()
+    return path if path is not None else output.getvalue()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Page sources — where page text and renders come from
+# ─────────────────────────────────────────────────────────────────────────────
+TEXT_BACKENDS = ("fitz", "pdfplumber")
+
+# pdfplumber's extract_text() defaults, reproduced by fitz_page_text().
+TEXT_X_TOLERANCE = 3
+TEXT_Y_TOLERANCE = 3
+LIGATURES = {"ﬀ": "ff", "ﬃ": "ffi", "ﬄ": "ffl", "ﬁ": "fi", "ﬂ": "fl", "ﬆ": "st", "ﬅ": "st"}
+FITZ_TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_INHIBIT_SPACES
+
+
+def _cluster_ids(values, tolerance):
+    """pdfplumber's cluster_list: sorted distinct values chained while within tolerance."""
+    ids = {}
+    last = None
+    cluster = -1
+    for v in sorted(set(values)):
+        if last is None or v > last + tolerance:
+            cluster += 1
+        ids[v] = cluster
+        last = v
+    return ids
+
+
+# pdfminer's fallback descents (per 1000 em) for standard fonts without a FontDescriptor.
+BASE14_DESCENTS = {"Courier": -194, "Helvetica": -207, "Arial": -207, "Times": -217}
+_REF = re.compile(r'(\d+) 0 R')
+
+
+def font_descents(fitz_page, memo=None):
+    """
+    {font name: descent per em} as pdfminer reads it (FontDescriptor /Descent,
+    else the base-14 metrics). MuPDF's own descender comes from the font
+    program and can differ, which would shift line tops between backends.
+    """
+    memo = {} if memo is None else memo
+    fdoc = fitz_page.parent
+    descents = {}
+    for xref, _ext, _kind, basefont, *_ in fitz_page.get_fonts(full=True):
+        name = basefont.split("+", 1)[-1]
+        if xref not in memo:
+            font = xref
+            kind, value = fdoc.xref_get_key(xref, "DescendantFonts")
+            ref = _REF.search(value) if kind in ("array", "xref") else None
+            if ref:
+                font = int(ref.group(1))
+            kind, value = fdoc.xref_get_key(font, "FontDescriptor")
+            if kind == "xref":
+                kind, value = fdoc.xref_get_key(int(_REF.search(value).group(1)), "Descent")
+                memo[xref] = -abs(float(value)) / 1000 if kind in ("int", "float") else 0.0
+            else:
+                family = re.split(r"[-,]", name, 1)[0].replace("New", "")
+                memo[xref] = BASE14_DESCENTS[family] / 1000 if family in BASE14_DESCENTS else None
+        if memo[xref] is not None:
+            descents[name] = memo[xref]
+    return descents
+
+
+def _fitz_chars(fitz_page, font_memo=None):
+    """Page characters in content order with pdfminer-style geometry (x0, x1, top, upright)."""
+    descents = font_descents(fitz_page, font_memo)
+    chars = []
+    # pdfplumber keeps characters that fall outside the page box, so no clip here
+    raw = fitz_page.get_text("rawdict", flags=FITZ_TEXT_FLAGS, clip=fitz.INFINITE_RECT())
+    for block in raw["blocks"]:
+        for line in block.get("lines", []):
+            dx, dy = line["dir"]
+            upright = abs(dx) >= abs(dy)
+            for span in line["spans"]:
+                size = span["size"]
+                descent = descents.get(span["font"], span["descender"]) * size
+                for ch in span["chars"]:
+                    x0, y0, x1, y1 = ch["bbox"]
+                    oy = ch["origin"][1]
+                    if not upright:
+                        top = y0
+                    elif dx > 0:
+                        top = oy - size - descent
+                    else:  # upside down: the glyph box hangs below the baseline
+                        top = oy + descent
+                    chars.append({"text": ch["c"], "x0": x0, "x1": x1, "top": top, "bottom": y1, "upright": upright})
+    return chars
+
+
+def _chars_to_words(chars):
+    """Group one upright/rotated run of chars into words, line by line."""
+    upright = chars[0]["upright"]
+    line_key = "top" if upright else "x0"
+    tolerance = TEXT_Y_TOLERANCE if upright else TEXT_X_TOLERANCE
+    ids = _cluster_ids([c[line_key] for c in chars], tolerance)
+    lines = {}
+    for c in chars:
+        lines.setdefault(ids[c[line_key]], []).append(c)
+
+    words = []
+    for cluster in sorted(lines):
+        line = sorted(lines[cluster], key=(lambda c: c["x0"]) if upright else (lambda c: (c["top"], c["bottom"])))
+        current = []
+        for c in line:
+            if c["text"].isspace():
+                if current:
+                    words.append(current)
+                current = []
+                continue
+            if current:
+                prev = current[-1]
+                if upright:
+                    new_word = (c["x0"] < prev["x0"] or c["x0"] > prev["x1"] + TEXT_X_TOLERANCE
+                                or abs(c["top"] - prev["top"]) > TEXT_Y_TOLERANCE)
+                else:
+                    new_word = (c["top"] < prev["top"] or c["top"] > prev["bottom"] + TEXT_Y_TOLERANCE
+                                or abs(c["x0"] - prev["x0"]) > TEXT_X_TOLERANCE)
+                if new_word:
+                    words.append(current)
+                    current = []
+            current.append(c)
+        if current:
+            words.append(current)
+    return words
+
+
+def fitz_page_text(fitz_page, font_memo=None):
+    """
+    Page text from MuPDF with the same line grouping and word order as
+    pdfplumber's extract_text(), so detect_text_format, parse_carton_text
+    and extract_label_data see identical input (including the reversed
+    lines of upside-down labels).
+    """
+    chars = _fitz_chars(fitz_page, font_memo)
+    if not chars:
+        return ""
+    words = []
+    run = [chars[0]]
+    for c in chars[1:]:
+        if c["upright"] != run[-1]["upright"]:
+            words.extend(_chars_to_words(run))
+            run = []
+        run.append(c)
+    words.extend(_chars_to_words(run))
+
+    tops = [min(c["top"] for c in w) for w in words]
+    ids = _cluster_ids(tops, TEXT_Y_TOLERANCE)
+    lines = []
+    last_id = None
+    for word, top in zip(words, tops):
+        text = "".join(LIGATURES.get(c["text"], c["text"]) for c in word)
+        if lines and ids[top] == last_id:
+            lines[-1].append(text)
+        else:
+            lines.append([text])
+        last_id = ids[top]
+    return "\n".join(" ".join(line) for line in lines)
+
+
+def open_fitz(source):
+    """Open `source` (bytes, path or binary file object) with PyMuPDF."""
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    if hasattr(source, "read"):
+        return fitz.open(stream=source.read(), filetype="pdf")
+    return fitz.open(source)
+
+
+class FitzPageSource:
+    """Text and renders both come from a single MuPDF document."""
+
+    def __init__(self, source):
+        self.fdoc = open_fitz(source)
+        self.font_memo = {}
+
+    def __len__(self):
+        return len(self.fdoc)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def text(self, i):
+        return fitz_page_text(self.fdoc[i], self.font_memo)
+
+    def page(self, i):
+        """fitz page for rendering and content hashing."""
+        return self.fdoc[i]
+
+    def close(self):
+        self.fdoc.close()
+
+
+class PdfplumberPageSource(FitzPageSource):
+    """pdfplumber text extraction, fitz rendering (the original two-parser setup)."""
+
+    def __init__(self, source):
+        if hasattr(source, "read"):
+            source = source.read()
+        if isinstance(source, (bytes, bytearray)):
+            self.pdf = pdfplumber.open(io.BytesIO(source))
+        else:
+            self.pdf = pdfplumber.open(source)
+        super().__init__(source)
+
+    def text(self, i):
+        page = self.pdf.pages[i]
+        text = page.extract_text()
+        page.close()
+        return text
+
+    def close(self):
+        self.pdf.close()
+        super().close()
+
+
+def open_page_source(source, backend="fitz"):
+    if backend == "pdfplumber":
+        return PdfplumberPageSource(source)
+    if backend == "fitz":
+        return FitzPageSource(source)
+    raise ValueError(f"unknown text backend {backend!r} (choose from {', '.join(TEXT_BACKENDS)})")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# File routing
+# ─────────────────────────────────────────────────────────────────────────────
+# Label PDFs are homogeneous per file, so the first pages say which pipeline
+# the rest of the file needs.
+SNIFF_PAGES = 2
+FILE_KINDS = ("carton_text", "carton_reversed", "cmus", "image_only")
+TEXT_FILE_KINDS = ("carton_text", "carton_reversed", "cmus")
+
+
+def page_kind(text):
+    """The FILE_KINDS entry one page's text points to, or None."""
+    if not text or not text.strip():
+        return "image_only"
+    fmt, is_reversed = detect_text_format(text)
+    if fmt == "carton_text":
+        return "carton_reversed" if is_reversed else "carton_text"
+    return fmt
+
+
+def sniff_pdf(src, pages=SNIFF_PAGES, texts=None):
+    """
+    Classify a file from its first `pages` pages: a FILE_KINDS entry when
+    they all agree, None for mixed or unrecognised files. Page texts read
+    on the way are stored in `texts` (page index -> text) for reuse.
+    """
+    kinds = set()
+    for i in range(min(pages, len(src))):
+        if not src.page(i).get_fonts():
+            kinds.add("image_only")
+        else:
+            text = src.text(i)
+            if texts is not None:
+                texts[i] = text
+            kinds.add(page_kind(text))
+        if len(kinds) > 1:
+            return None
+    return kinds.pop() if kinds else None
+
+
+def page_text(src, i, file_state):
+    """
+    Page text, reusing what sniff_pdf already read. Pages of an image-only
+    file that carry no fonts have no text layer to extract.
+    """
+    texts = file_state.get("texts")
+    if texts and i in texts:
+        return texts.pop(i)
+    if file_state.get("kind") == "image_only" and not src.page(i).get_fonts():
+        return ""
+    return src.text(i)
+
+
+def new_file_state(src=None, options=None, file_kind=None, file_id=None):
+    """
+    Fresh per-file state. With options["route_files"] (default True) the
+    file is sniffed from `src`, or takes `file_kind` when the caller
+    already sniffed it. `file_id` (file_digest) keys the file's pages in
+    the run journal.
+    """
+    file_state = {"file_id": file_id} if file_id else {}
+    if (options or {}).get("route_files", True):
+        if file_kind is None and src is not None:
+            file_kind = sniff_pdf(src, texts=file_state.setdefault("texts", {}))
+        file_state["kind"] = file_kind
+    return file_state
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Extraction engine
+# ─────────────────────────────────────────────────────────────────────────────
+def process_page(text, fitz_page, page_no, options=None, file_state=None):
+    """
+    Run one page (its text layer and fitz page) through format detection
+    and the matching parser.
+    Returns a page record:
+    {"kind": "cmus" | "text" | "ocr" | None, "rows": [...], "barcodes": [...], "stats": Counter}
+    `file_state` is a dict shared by consecutive pages of the same file
+    (e.g. the learned barcode orientation and the sniffed file kind). In a
+    text-layer file, a page whose text no parser recognises still goes
+    through barcode decoding / OCR like any other page, unless
+    options["skip_unmatched_pages"] says such pages are cover or summary
+    sheets to drop. A scanned label
+    whose carton barcode is in file_state["seen"] (SeenLabels) is not OCR'd.
+    """
+    options = options or {}
+    file_state = file_state if file_state is not None else {}
+    orientation = file_state.setdefault("orientation", {})
+    use_engine(options.get("ocr_engine", "auto"))
+    zooms = options.get("barcode_zooms", BARCODE_ZOOMS)
+    gray = options.get("low_memory", False)
+    stats = Counter()
+    file_kind = file_state.get("kind")
+    with profiling.stage("parse"):
+        fmt, is_reversed = page_format(text, file_kind)
+    if "kind" in file_state:
+        stats[f"route_{file_kind or 'mixed'}"] += 1
+
+    if fmt is None and file_kind in TEXT_FILE_KINDS and text and text.strip():
+        if options.get("skip_unmatched_pages"):
+            stats["route_skipped"] += 1
+            return {"kind": None, "rows": [], "barcodes": [], "stats": stats}
+        stats["route_unmatched"] += 1
+
+    if fmt == "cmus":
+        with profiling.stage("parse"):
+            rows = extract_label_data(text)
+        return {"kind": "cmus", "rows": rows, "stats": stats}
+
+    if fmt == "carton_text":
+        with profiling.stage("parse"):
+            row = parse_carton_text(text, page_no, is_reversed=is_reversed)
+            # The render is only needed for what the text layer cannot supply:
+            # a carton barcode that validates, or a GTIN missing from the text.
+            text_barcode = ""
+            if options.get("text_barcodes", True) and row["GTIN (01)"]:
+                text_barcode = text_carton_barcode(text, is_reversed)
+        if text_barcode:
+            stats["barcode_text"] += 1
+            values = [text_barcode]
+        else:
+            values = decode_page_barcodes(fitz_page, zooms, stats, orientation, gray,
+                                          need_gtin=not row["GTIN (01)"])["values"]
+        barcode, gtin = pick_carton_and_gtin(values)
+        carton_no, carton_seq = split_carton_barcode(barcode)
+        row["Carton Barcode"] = barcode
+        row["Carton No."] = carton_no
+        row["Carton Seq"] = carton_seq
+        if gtin and not row.get("GTIN (01)"):
+            row["GTIN (01)"] = gtin
+        row["Format"] = "Text"
+        row["Needs Review"] = ""
+        return {"kind": "text", "rows": [row], "barcodes": values, "stats": stats}
+
+    decoded = decode_page_barcodes(fitz_page, zooms, stats, orientation, gray)
+    values = decoded["values"]
+    barcode, gtin = pick_carton_and_gtin(values)
+    if not barcode:
+        return {"kind": None, "rows": [], "barcodes": values, "stats": stats}
+    seen = file_state.get("seen")
+    if seen is not None and barcode in seen.ocr_rows:
+        # Already OCR'd earlier in the batch: this label only goes to Duplicates_Removed.
+        stats["duplicate_barcodes"] += 1
+        row = {**seen.ocr_rows[barcode], "Label No.": page_no}
+        return {"kind": "ocr", "rows": [row], "barcodes": values, "stats": stats, "duplicate": "barcode"}
+    psm_wins = file_state.setdefault("psm_wins", {}) if options.get("learn_psm_order") else None
+    label = OcrLabel(label_image(fitz_page, decoded, gray=gray), psm_wins, stats)
+    row = parse_carton_ocr(label, page_no, options.get("ocr_mode", "fields"), stats)
+    template = match_template(label.size)
+    if template and "corner" in LABEL_TEMPLATES[template]:
+        row["Grid / Ref No."] = ocr_corner_number(label, template)
+    else:
+        row["Grid / Ref No."] = ""
+    carton_no, carton_seq = split_carton_barcode(barcode)
+    row["Carton Barcode"] = barcode
+    row["Carton No."] = carton_no
+    row["Carton Seq"] = carton_seq
+    if gtin:
+        row["GTIN (01)"] = gtin
+    row["Format"] = "OCR"
+    return {"kind": "ocr", "rows": [row], "barcodes": values, "stats": stats}
+
+
+_OBJ_REF = re.compile(r'\b(\d+) 0 R\b')
+_PARENT_REF = re.compile(r'/Parent\s+\d+ 0 R')
+
+
+def _xref_digest(fdoc, xref, memo):
+    """
+    Merkle-style digest of a PDF object and everything it references, with
+    object numbers replaced by the referenced objects' digests so identical
+    pages hash the same in any file.
+    """
+    if xref in memo:
+        return memo[xref]
+    memo[xref] = "cycle"
+    source = _PARENT_REF.sub("", fdoc.xref_object(xref, compressed=True))
+    source = _OBJ_REF.sub(lambda m: _xref_digest(fdoc, int(m.group(1)), memo), source)
+    h = hashlib.sha256(source.encode())
+    if fdoc.xref_is_stream(xref):
+        h.update(fdoc.xref_stream_raw(xref) or b"")
+    memo[xref] = h.hexdigest()
+    return memo[xref]
+
+
+def page_cache_key(fdoc, fitz_page, memo=None, variant=""):
+    """
+    Content address of a page: its object graph, geometry and the parser
+    version, plus `variant` for options that change the parsed rows.
+    """
+    memo = memo if memo is not None else {}
+    h = hashlib.sha256(f"{PARSER_VERSION}|{variant}".encode())
+    h.update(_xref_digest(fdoc, fitz_page.xref, memo).encode())
+    h.update(f"{tuple(fitz_page.mediabox)}|{fitz_page.rotation}".encode())
+    return h.hexdigest()
+
+
+def cache_variant(options, file_kind=None):
+    """The options (and file routing) that change a page's record, as part of its cache key."""
+    parts = [
+        options.get("ocr_mode", "fields"),
+        options.get("text_backend", "fitz"),
+        "text" if options.get("text_barcodes", True) else "render",
+        engine_name(options.get("ocr_engine", "auto")),
+    ]
+    if file_kind in TEXT_FILE_KINDS and options.get("skip_unmatched_pages"):
+        parts.append("text-file")
+    if options.get("low_memory"):
+        parts.append("gray")
+    if options.get("learn_psm_order"):
+        parts.append("learned-psm")
+    zooms = tuple(options.get("barcode_zooms", BARCODE_ZOOMS))
+    if zooms != BARCODE_ZOOMS:
+        parts.append("zooms-" + ",".join(f"{z:g}" for z in zooms))
+    return "|".join(parts)
+
+
+def keep_record(record):
+    """
+    Whether a page record may go to the page cache or the journal. A page
+    whose barcodes did not decode is worth another try (other zoom tiers,
+    a better decoder), so it is processed again next time.
+    """
+    return not record.get("stats", {}).get("barcode_none")
+
+
+def page_content_key(src, i, options, file_state):
+    """page_cache_key() of page `i`, computed once per page of the file."""
+    keys = file_state.setdefault("page_keys", {})
+    if i not in keys:
+        keys[i] = page_cache_key(
+            src.fdoc, src.page(i), file_state.setdefault("xref_digests", {}),
+            variant=cache_variant(options, file_state.get("kind")),
+        )
+    return keys[i]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Duplicate short-circuit
+# ─────────────────────────────────────────────────────────────────────────────
+class SeenLabels:
+    """
+    What this process has extracted so far in one batch: page records by
+    page content, and the OCR row first read for each carton barcode.
+    A repeated page reuses its record, and a scanned label whose carton
+    barcode was already OCR'd copies that row instead of being read again.
+    Both rows are duplicates the master report drops (see RunningReport).
+    Copies are corrected with the file's OCR rows but do not vote in the
+    batch-mode correction and count as "ocr_reused", not "ocr_pages": a
+    file can end with different modes than a --no-skip-duplicates run,
+    where the re-scan is OCR'd again and votes.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.ocr_rows = {}
+
+    def add(self, key, record):
+        rows = [dict(row) for row in record["rows"]]  # before extract_pdf corrects them in place
+        self.pages[key] = {"kind": record["kind"], "rows": rows, "barcodes": record.get("barcodes", [])}
+        if record["kind"] == "ocr" and not record.get("duplicate"):
+            for row in rows:
+                if row.get("Carton Barcode"):
+                    self.ocr_rows.setdefault(row["Carton Barcode"], row)
+
+    def page(self, key, page_no):
+        """Copy of the record of a page with this content, renumbered, or None."""
+        seen = self.pages.get(key)
+        if seen is None:
+            return None
+        rows = [{**row, "Label No.": page_no} if "Label No." in row else dict(row) for row in seen["rows"]]
+        return {**seen, "rows": rows, "stats": Counter(duplicate_pages=1), "duplicate": "page"}
+
+
+# Batches keep their index only while they run. The parent drops its own
+# copy when a batch ends; pool workers get the ids of recently finished
+# batches with every chunk and drop theirs before the chunk runs, so no
+# extra tasks are queued (they would count towards the low-memory
+# recycling). MAX_SEEN_BATCHES caps what an idle worker can still hold.
+MAX_SEEN_BATCHES = 4
+FINISHED_BATCHES_KEPT = 64
+_seen_batches = {}
+_finished_batches = deque(maxlen=FINISHED_BATCHES_KEPT)
+_finished_lock = threading.Lock()
+
+
+def seen_labels(batch_id):
+    seen = _seen_batches.get(batch_id)
+    if seen is None:
+        if len(_seen_batches) >= MAX_SEEN_BATCHES:
+            _seen_batches.pop(next(iter(_seen_batches)))
+        seen = _seen_batches[batch_id] = SeenLabels()
+    return seen
+
+
+def forget_seen(*batch_ids):
+    for batch_id in batch_ids:
+        _seen_batches.pop(batch_id, None)
+
+
+def finish_seen(batch_id):
+    """End a batch: drop this process's index and tell pool workers to drop theirs."""
+    forget_seen(batch_id)
+    if batch_id:
+        with _finished_lock:
+            _finished_batches.append(batch_id)
+
+
+def finished_batches():
+    with _finished_lock:
+        return tuple(_finished_batches)
+
+
+def run_page(src, i, options=None, file_state=None):
+    """
+    process_page() for page index `i`, served from the page cache when
+    options["cache_path"] is set. With options["low_memory"] MuPDF's caches
+    are emptied once the page is done. The record gains "cache": "hit" | "miss",
+    and with options["profile"] a "profile" dict of per-stage seconds and
+    calls plus the page's counters (rotations, PSM retries, ...).
+    """
+    options = options or {}
+    try:
+        if not options.get("profile"):
+            return _run_page(src, i, options, file_state)
+        profiling.start_page()
+        try:
+            record = _run_page(src, i, options, file_state)
+        finally:
+            profile = profiling.finish_page()
+        profile.update(record.get("stats", {}))
+        record["profile"] = profile
+        return record
+    finally:
+        if options.get("low_memory"):
+            # Empty MuPDF's resource store (decoded images, fonts) after
+            # every page so a worker's memory does not grow with the file.
+            fitz.TOOLS.store_shrink(100)
+
+
+def _run_page(src, i, options, file_state):
+    file_state = file_state if file_state is not None else {}
+    batch_id = options.get("dedup_batch")
+    if not batch_id:
+        return _run_page_journaled(src, i, options, file_state)
+
+    seen = file_state["seen"] = seen_labels(batch_id)
+    with profiling.stage("cache"):
+        key = page_content_key(src, i, options, file_state)
+    record = seen.page(key, i + 1)
+    if record is None:
+        record = _run_page_journaled(src, i, options, file_state)
+        seen.add(key, record)
+    return record
+
+
+def _run_page_journaled(src, i, options, file_state):
+    journal_path = options.get("journal_path")
+    if not journal_path:
+        return _run_page_unjournaled(src, i, options, file_state)
+
+    journal = get_journal(journal_path)
+    key = f"{file_state.get('file_id', '')}|{cache_variant(options, file_state.get('kind'))}"
+    with profiling.stage("cache"):
+        record = journal.get(key, i)
+    if record is not None:
+        record["journal"] = "hit"
+        return record
+    record = _run_page_unjournaled(src, i, options, file_state)
+    # Stored before batch-mode correction touches the rows, with the page
+    # stats, so replaying the journal gives the uninterrupted run's result.
+    if keep_record(record):
+        with profiling.stage("cache"):
+            journal.put(key, i, {k: v for k, v in record.items() if k != "cache"})
+    return record
+
+
+def _run_page_unjournaled(src, i, options, file_state):
+    cache_path = options.get("cache_path")
+    if not cache_path:
+        with profiling.stage("text"):
+            text = page_text(src, i, file_state)
+        return process_page(text, src.page(i), i + 1, options, file_state)
+
+    with profiling.stage("cache"):
+        cache = get_cache(cache_path, options.get("cache_max_mb", DEFAULT_CACHE_MAX_MB))
+        key = page_content_key(src, i, options, file_state)
+        record = cache.get(key)
+    if record is not None:
+        for row in record["rows"]:
+            if "Label No." in row:
+                row["Label No."] = i + 1
+        record["cache"] = "hit"
+        return record
+
+    with profiling.stage("text"):
+        text = page_text(src, i, file_state)
+    record = process_page(text, src.page(i), i + 1, options, file_state)
+    if not record.get("duplicate") and keep_record(record):  # a copied row belongs to this batch, not to the page
+        with profiling.stage("cache"):
+            cache.put(key, {k: v for k, v in record.items() if k != "stats"})
+    record["cache"] = "miss"
+    return record
+
+
+PAGES_PER_TASK = 8
+
+
+def process_page_range(source, start, stop, options=None, file_kind=None, file_id=None, finished=(), texts=None):
+    """
+    Pool worker entry point: open the PDF independently and process pages
+    [start, stop) as a file of kind `file_kind` (sniffed by submit_pdf),
+    after dropping the duplicate indexes of the `finished` batches. `texts`
+    holds page texts the sniff already read. Returns the page records in
+    page order.
+    """
+    forget_seen(*finished)
+    file_state = new_file_state(options=options, file_kind=file_kind, file_id=file_id)
+    if texts:
+        file_state["texts"] = dict(texts)
+    with open_page_source(source, (options or {}).get("text_backend", "fitz")) as src:
+        return [run_page(src, i, options, file_state) for i in range(start, stop)]
+
+
+def file_digest(source):
+    """SHA-256 of a PDF given as a path, bytes or a seekable file object."""
+    h = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        h.update(source)
+    elif hasattr(source, "read"):
+        position = source.tell()
+        for block in iter(lambda: source.read(1 << 20), b""):
+            h.update(block)
+        source.seek(position)
+    else:
+        with open(source, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def spool_to_disk(source):
+    """
+    Write an in-memory PDF to a temp file so pool workers can open it by
+    path instead of receiving a pickled copy of the bytes per task.
+    Returns (path, is_temporary).
+    """
+    if not isinstance(source, (bytes, bytearray)) and not hasattr(source, "read"):
+        return str(source), False
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as fh:
+        if isinstance(source, (bytes, bytearray)):
+            fh.write(source)
+        else:
+            shutil.copyfileobj(source, fh)  # in blocks, not one more full copy
+    return fh.name, True
+
+
+def submit_pdf(executor, source, options=None, queue_all=True):
+    """
+    Split one PDF into PAGES_PER_TASK chunks for `executor` and queue them
+    all, or none yet with queue_all=False (see submit_next).
+    Returns a pending-file dict consumed by iter_page_records().
+    """
+    path, is_temp = spool_to_disk(source)
+    options = options or {}
+    with open_page_source(path, options.get("text_backend", "fitz")) as src:
+        total_pages = len(src)
+        texts = {}
+        file_kind = sniff_pdf(src, texts=texts) if options.get("route_files", True) else None
+    pending = {
+        "path": path, "is_temp": is_temp, "total_pages": total_pages,
+        "executor": executor, "options": options, "file_kind": file_kind, "texts": texts,
+        "file_id": file_digest(path) if options.get("journal_path") else None,
+        "ranges": [(start, min(start + PAGES_PER_TASK, total_pages)) for start in range(0, total_pages, PAGES_PER_TASK)],
+        "futures": [],
+    }
+    while queue_all and submit_next(pending):
+        pass
+    return pending
+
+
+def submit_next(pending):
+    """Queue the pending file's next chunk; False once every chunk is queued."""
+    k = len(pending["futures"])
+    if k == len(pending["ranges"]):
+        return False
+    start, stop = pending["ranges"][k]
+    pending["futures"].append(pending["executor"].submit(
+        process_page_range, pending["path"], start, stop, pending["options"], pending["file_kind"],
+        pending["file_id"], finished_batches(),
+        {i: text for i, text in pending["texts"].items() if start <= i < stop},
+    ))
+    return True
+
+
+def iter_page_records(source=None, pending=None, options=None):
+    """
+    Yield (page_index, total_pages, record) in page order, either by
+    processing `source` in this process or by collecting the results of a
+    file already queued with submit_pdf().
+    """
+    if pending is None:
+        options = options or {}
+        # Low-memory mode opens uploads from a spool file, so MuPDF reads
+        # pages from disk instead of holding a copy of the whole PDF.
+        path, is_temp = spool_to_disk(source) if options.get("low_memory") else (source, False)
+        try:
+            file_id = file_digest(path) if options.get("journal_path") else None
+            with open_page_source(path, options.get("text_backend", "fitz")) as src:
+                file_state = new_file_state(src, options, file_id=file_id)
+                total_pages = len(src)
+                for i in range(total_pages):
+                    yield i, total_pages, run_page(src, i, options, file_state)
+        finally:
+            if is_temp:
+                os.remove(path)
+        return
+
+    try:
+        i = 0
+        for k in range(len(pending["ranges"])):
+            if pending.get("refill"):
+                pending["refill"]()
+            if k == len(pending["futures"]):
+                submit_next(pending)
+            for record in pending["futures"][k].result():
+                yield i, pending["total_pages"], record
+                i += 1
+    finally:
+        release_pending(pending)
+
+
+def release_pending(pending):
+    """Cancel any unfinished chunks of a queued file and delete its spool file."""
+    for future in pending["futures"]:
+        future.cancel()
+    if pending["is_temp"] and os.path.exists(pending["path"]):
+        try:
+            os.remove(pending["path"])
+        except OSError:
+            pass
+
+
+def extract_pdf(source, name="", progress=None, stats=None, pending=None, options=None, timings=None):
+    """
+    Extract every label in one PDF.
+
+    Yields ("carton" | "ocr" | "cmus", row) tuples as each page finishes,
+    before `progress(name, done, total)` is called for it. "ocr" rows are
+    carton rows read by OCR: they are batch-corrected in place as later OCR
+    rows of the file arrive, and in the master report they follow the
+    file's text rows (see RunningReport). Pass
+    `pending` (from submit_pdf) to take the pages from a process pool.
+    `options` may carry "cache_path" / "cache_max_mb" for the page cache,
+    "barcode_zooms" for the decode tiers, "ocr_engine" for the OCR backend,
+    "ocr_mode" ("fields" | "layout") for label OCR, "text_backend"
+    ("fitz" | "pdfplumber") for the text layer and "text_barcodes" (default
+    True) to take validated carton barcodes from the text layer instead of
+    rendering the page and "route_files" (default True) to sniff each file's
+    kind from its first pages and skip what that kind does not need;
+    "skip_unmatched_pages" also drops text-file pages no parser recognises.
+    "journal_path" records every finished page there, and pages already in
+    it are not processed again (resuming an interrupted run).
+    "low_memory" renders straight to grayscale, opens in-memory PDFs from a
+    spool file and releases MuPDF's caches after every page. With
+    options["profile"], each page's stage timings are appended to the
+    `timings` list as {"File", "Page", ...}.
+    """
+    stats = stats if stats is not None else Counter()
+    corrector = BatchModeCorrector()
+    for i, total_pages, record in iter_page_records(source, pending, options):
+        stats["pages"] += 1
+        stats.update(record.get("stats", {}))
+        if record.get("cache") == "hit":
+            stats["cache_hits"] += 1
+        elif record.get("cache") == "miss":
+            stats["cache_misses"] += 1
+        if record.get("journal") == "hit":
+            stats["journal_hits"] += 1
+        if timings is not None and "profile" in record:
+            timings.append({"File": name, "Page": i + 1, **record["profile"]})
+        if record["kind"] == "cmus":
+            for row in record["rows"]:
+                yield "cmus", row
+        elif record["kind"] == "text":
+            for row in record["rows"]:
+                row["File"] = name
+                yield "carton", row
+        elif record["kind"] == "ocr":
+            # A copied record was never OCR'd here: it neither counts as an
+            # OCR page nor votes in the file's correction.
+            copied = bool(record.get("duplicate"))
+            stats["ocr_reused" if copied else "ocr_pages"] += 1
+            for row in record["rows"]:
+                row["File"] = name
+                corrector.add(row, vote=not copied)
+                yield "ocr", row
+        if progress:
+            progress(name, i + 1, total_pages)
+
+
+# Low-memory mode replaces each pool worker after this many page chunks, so
+# allocator fragmentation and per-process caches cannot build up.
+LOW_MEMORY_TASKS_PER_CHILD = 16
+
+
+def make_executor(workers, max_tasks_per_child=None):
+    """Process pool for page-level parallelism (spawned, so it is safe to create from Streamlit's threads)."""
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=max_tasks_per_child,
+    )
+
+
+def extract_files(files, progress=None, stats=None, workers=1, executor=None, options=None, timings=None,
+                  report=None, window=None):
+    """
+    Run a batch of (name, source) pairs through extract_pdf.
+    With workers > 1 (or an existing `executor`) every page of every file is
+    queued on a process pool up front and merged back in file/page order,
+    so the output is identical to the serial path. With `window`, at most
+    that many chunks of this batch wait on the pool at a time, so batches
+    sharing one executor take turns instead of queueing behind each
+    other. Rows are added to
+    `report` (a RunningReport) as their pages finish, so `progress` can
+    show the batch so far. Unless options["skip_duplicates"] is False,
+    repeated pages and already-OCR'd carton barcodes are not processed
+    again (see SeenLabels).
+    Returns (carton_rows, cmus_rows).
+    """
+    stats = stats if stats is not None else Counter()
+    report = report if report is not None else RunningReport()
+    options = options or {}
+    if options.get("skip_duplicates", True):
+        options = {**options, "dedup_batch": uuid.uuid4().hex}
+    try:
+        return _extract_files(files, progress, stats, workers, executor, options, timings, report, window)
+    finally:
+        finish_seen(options.get("dedup_batch"))
+
+
+def _extract_files(files, progress, stats, workers, executor, options, timings, report, window):
+    def collect(name, source=None, pending=None):
+        report.start_file(name)
+        for kind, row in extract_pdf(source, name, progress=progress, stats=stats,
+                                     pending=pending, options=options, timings=timings):
+            report.add(kind, row)
+        stats["files"] += 1
+
+    if executor is None and workers <= 1:
+        for name, source in files:
+            collect(name, source=source)
+        return report.carton_rows(), report.cmus_rows
+
+    own_executor = executor is None
+    if own_executor:
+        low_memory = (options or {}).get("low_memory")
+        executor = make_executor(workers, LOW_MEMORY_TASKS_PER_CHILD if low_memory else None)
+    queued = []
+
+    def refill():
+        busy = sum(not f.done() for _, p in queued for f in p["futures"])
+        for _, p in queued:
+            while busy < window and submit_next(p):
+                busy += 1
+            if busy >= window:
+                break
+
+    try:
+        for name, source in files:
+            pending = submit_pdf(executor, source, options, queue_all=window is None)
+            if window is not None:
+                pending["refill"] = refill
+            queued.append((name, pending))
+        for name, pending in queued:
+            collect(name, pending=pending)
+    finally:
+        for _, pending in queued:
+            release_pending(pending)
+        if own_executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+    return report.carton_rows(), report.cmus_rows
+
+
+def qty_value(qty):
+    """A Qty cell as counted in the total Qty: whole numbers only, anything else is 0."""
+    qty = str(qty if qty is not None else "")
+    return int(qty) if qty.isdigit() else 0
+
+
+class RunningReport:
+    """
+    Master-report rows of a batch while it runs. Rows are added as their
+    pages finish and kept in report order: each file's text rows, then its
+    OCR rows. `counts` holds live totals ("cartons", "qty", "duplicates",
+    "ocr_rows", "cmus_rows") with duplicate carton barcodes resolved as
+    they arrive, the same way build_carton_report keeps the first one.
+    """
+
+    def __init__(self):
+        self.sections = []  # per file: (text rows, OCR rows)
+        self.cmus_rows = []
+        self.counts = Counter()
+        self._kept = {}  # carton barcode -> (report position, qty) of the row kept
+
+    def start_file(self, name):
+        self.sections.append(([], []))
+
+    def add(self, kind, row):
+        if kind == "cmus":
+            self.cmus_rows.append(row)
+            self.counts["cmus_rows"] += 1
+            return
+        if not self.sections:
+            self.start_file(row.get("File", ""))
+        text_rows, ocr_rows = self.sections[-1]
+        rows = ocr_rows if kind == "ocr" else text_rows
+        position = (len(self.sections), kind == "ocr", len(rows))
+        rows.append(row)
+        if kind == "ocr":
+            self.counts["ocr_rows"] += 1
+        qty = qty_value(row.get("Qty"))
+        barcode = row.get("Carton Barcode") or ""
+        kept = self._kept.get(barcode) if barcode else None
+        if kept is None:
+            if barcode:
+                self._kept[barcode] = (position, qty)
+            self.counts["cartons"] += 1
+            self.counts["qty"] += qty
+            return
+        self.counts["duplicates"] += 1
+        if position < kept[0]:
+            # A text row of the file that owns the kept OCR row: it comes
+            # first in the report, so it is the one kept.
+            self._kept[barcode] = (position, qty)
+            self.counts["qty"] += qty - kept[1]
+
+    def carton_rows(self):
+        return [row for text_rows, ocr_rows in self.sections for row in text_rows + ocr_rows]
+
+
+def build_carton_report(carton_rows):
+    """
+    Order columns, drop duplicate carton barcodes and summarise.
+    Returns (df, dup_df, summary).
+    """
+    df = pd.DataFrame(carton_rows)
+    for col in CARTON_COLUMN_ORDER:
+        if col not in df.columns:
+            df[col] = ""
+    df = df[CARTON_COLUMN_ORDER].astype(str).replace("nan", "")
+
+    has_barcode = df["Carton Barcode"] != ""
+    dup_mask = has_barcode & df.duplicated(subset=["Carton Barcode"], keep="first")
+    dup_df = df[dup_mask].copy()
+    df = df[~dup_mask].reset_index(drop=True)
+
+    summary = (
+        df.assign(_q=pd.to_numeric(df["Qty"], errors="coerce").fillna(0).astype(int))
+          .groupby(["File", "Ship To", "PO #", "Style / Color", "Color", "Size"], as_index=False)
+          .agg(**{"Cartons": ("_q", "size"), "Total Qty": ("_q", "sum")})
+    )
+    summary["Total Qty"] = summary["Total Qty"].astype(str)
+    summary["Cartons"] = summary["Cartons"].astype(str)
+    return df, dup_df, summary
+
+
+def build_cmus_report(cmus_rows):
+    """
+    Merge multi-size SSCC groups, order columns and drop duplicate SSCCs.
+    Returns (df, removed_count).
+    """
+    df = merge_sscc_groups(pd.DataFrame(cmus_rows))
+    for col in CMUS_COLUMN_ORDER:
+        if col not in df.columns:
+            df[col] = ""
+    df = df[CMUS_COLUMN_ORDER].astype(str).replace("nan", "")
+
+    before = len(df)
+    has_sscc = df["SSCC (digits)"] != ""
+    dup_mask = has_sscc & df.duplicated(subset=["SSCC (digits)"], keep="first")
+    df = df[~dup_mask].reset_index(drop=True)
+    return df, before - len(df)
@@ -0,0 +1,407 @@
+"""
+Local background job queue: extraction runs in a worker daemon instead of
+the Streamlit request, so a long OCR batch survives a closed browser tab.
+
+    python jobs.py worker -j 8 --max-jobs 3     # the shared worker pool
+    python jobs.py submit /path/to/labels        # queue a directory of PDFs
+    python jobs.py submit /path/to/labels --formats xlsx,parquet
+    python jobs.py status [JOB_ID]
+    python jobs.py cancel JOB_ID
+
+Jobs, their uploaded PDFs and finished reports live under --jobs-dir
+(jobs.sqlite plus one folder per job). The daemon runs up to --max-jobs
+jobs at once on one page-level process pool. Each job keeps only a small
+window of page chunks queued on it, so jobs from several users share the
+pool instead of running one after another. Queued jobs are claimed for the
+owner with the fewest running jobs first, then oldest first.
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from batch import find_pdfs, write_reports
+from exporters import REPORT_FORMATS, parse_formats
+from extractor import LOW_MEMORY_TASKS_PER_CHILD, extract_files, make_executor, open_fitz
+from page_cache import DEFAULT_CACHE_PATH, discard_journal
+from profiling import timings_frame, timings_summary
+
+DEFAULT_JOBS_DIR = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "jobs")
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+# Progress is written at most this often; the daemon heartbeats its jobs as often.
+HEARTBEAT_S = 5
+# A running job whose daemon has not heartbeated for this long is queued again.
+STALE_AFTER_S = 120
+# Page chunks each running job may keep waiting per pool process.
+CHUNKS_PER_WORKER = 2
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueue:
+    """SQLite job table plus one folder per job. One instance per thread."""
+
+    def __init__(self, root=DEFAULT_JOBS_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.root / "jobs.sqlite", timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, owner TEXT NOT NULL, status TEXT NOT NULL,"
+            " files TEXT NOT NULL, options TEXT NOT NULL, created REAL NOT NULL,"
+            " started REAL, finished REAL, heartbeat REAL, worker TEXT,"
+            " pages_done INTEGER NOT NULL DEFAULT 0, pages_total INTEGER NOT NULL DEFAULT 0,"
+            " outputs TEXT NOT NULL DEFAULT '[]', stats TEXT NOT NULL DEFAULT '{}',"
+            " message TEXT NOT NULL DEFAULT '')"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS workers (name TEXT PRIMARY KEY, heartbeat REAL NOT NULL)")
+        self.conn.commit()
+
+    def job_dir(self, job_id):
+        return self.root / job_id
+
+    def submit(self, files, options=None, owner=""):
+        """Queue (name, bytes | path) pairs as one job; returns the job id."""
+        job_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        inputs = self.job_dir(job_id) / "input"
+        inputs.mkdir(parents=True)
+        names = []
+        for k, (name, source) in enumerate(files):
+            target = inputs / f"{k:04d}.pdf"
+            if isinstance(source, (bytes, bytearray)):
+                target.write_bytes(source)
+            else:
+                shutil.copyfile(source, target)
+            names.append(name)
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (id, owner, status, files, options, created) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, owner, json.dumps(names, ensure_ascii=False), json.dumps(options or {}), time.time()),
+            )
+        return job_id
+
+    def claim(self, worker):
+        """Mark the next queued job running for `worker` and return it, or None."""
+        now = time.time()
+        with self.conn:
+            row = self.conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started = ?, heartbeat = ?"
+                " WHERE status = 'queued' AND id = ("
+                "  SELECT id FROM jobs AS q WHERE status = 'queued' ORDER BY"
+                "  (SELECT COUNT(*) FROM jobs AS r WHERE r.owner = q.owner AND r.status = 'running'),"
+                "  created LIMIT 1)"
+                " RETURNING *",
+                (worker, now, now),
+            ).fetchone()
+        return _job(row) if row else None
+
+    def progress(self, job_id, pages_done, pages_total):
+        """Record progress; returns the job's status (a cancelled job should stop)."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET pages_done = ?, pages_total = ? WHERE id = ?",
+                (pages_done, pages_total, job_id),
+            )
+        return self.conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+    def finish(self, job_id, outputs, stats):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'done', finished = ?, pages_done = pages_total,"
+                " outputs = ?, stats = ? WHERE id = ? AND status = 'running'",
+                (time.time(), json.dumps(outputs), json.dumps(stats), job_id),
+            )
+
+    def fail(self, job_id, message):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, message = ? WHERE id = ? AND status = 'running'",
+                (time.time(), message, job_id),
+            )
+
+    def cancel(self, job_id, owner=None):
+        """Cancel a queued job, or ask its daemon to stop a running one; with `owner`, only that owner's."""
+        owned = "" if owner is None else " AND owner = ?"
+        with self.conn:
+            return self.conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ?"
+                f" WHERE id = ? AND status IN ('queued', 'running'){owned}",
+                (time.time(), job_id) + (() if owner is None else (owner,)),
+            ).rowcount > 0
+
+    def heartbeat(self, worker):
+        """Daemon liveness: refresh the daemon row and every job it is running."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO workers (name, heartbeat) VALUES (?, ?)", (worker, now))
+            self.conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE status = 'running' AND worker LIKE ?",
+                (now, f"{worker}/%"),
+            )
+
+    def requeue_stale(self, max_age=STALE_AFTER_S):
+        """Queue again the running jobs of daemons that stopped heartbeating; returns how many."""
+        with self.conn:
+            return self.conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, started = NULL, pages_done = 0"
+                " WHERE status = 'running' AND heartbeat < ?",
+                (time.time() - max_age,),
+            ).rowcount
+
+    def requeue_worker(self, worker):
+        """Queue again the jobs a stopping daemon was running; returns how many."""
+        with self.conn:
+            return self.conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, started = NULL, pages_done = 0"
+                " WHERE status = 'running' AND worker LIKE ?",
+                (f"{worker}/%",),
+            ).rowcount
+
+    def workers_online(self, max_age=STALE_AFTER_S):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM workers WHERE heartbeat >= ?", (time.time() - max_age,),
+        ).fetchone()[0]
+
+    def get(self, job_id):
+        row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def jobs(self, owner=None, limit=20):
+        """Most recent jobs first, optionally only `owner`'s."""
+        if owner is None:
+            rows = self.conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,))
+        else:
+            rows = self.conn.execute(
+                "SELECT * FROM jobs WHERE owner = ? ORDER BY created DESC LIMIT ?", (owner, limit),
+            )
+        return [_job(row) for row in rows]
+
+    def input_files(self, job):
+        """(name, path) of the job's PDFs, in upload order."""
+        inputs = self.job_dir(job["id"]) / "input"
+        return [(name, str(inputs / f"{k:04d}.pdf")) for k, name in enumerate(job["files"])]
+
+    def output_paths(self, job):
+        return [self.job_dir(job["id"]) / name for name in job["outputs"]]
+
+    def purge(self, max_age_s):
+        """Delete finished jobs (and their folders) older than `max_age_s`; returns how many."""
+        cutoff = time.time() - max_age_s
+        ids = [row[0] for row in self.conn.execute(
+            "SELECT id FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished < ?", (cutoff,),
+        )]
+        for job_id in ids:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        with self.conn:
+            self.conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in ids])
+        return len(ids)
+
+    def close(self):
+        self.conn.close()
+
+
+def _job(row):
+    job = dict(row)
+    for key in ("files", "options", "outputs", "stats"):
+        job[key] = json.loads(job[key])
+    return job
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Worker daemon
+# ─────────────────────────────────────────────────────────────────────────────
+def page_count(path):
+    with open_fitz(path) as fdoc:
+        return len(fdoc)
+
+
+def run_job(queue, job, executor=None, window=None):
+    """
+    Extract one claimed job and write its reports into the job folder, in
+    options["report_formats"] (default: the workbooks only).
+    Finished pages go to the job's journal, so a job requeued after a
+    worker stopped resumes where it was instead of starting over.
+    """
+    stats = Counter()
+    journal_path = str(queue.job_dir(job["id"]) / "journal.sqlite")
+    options = {**job["options"], "journal_path": journal_path}
+    timings = [] if options.get("profile") else None
+    inputs = queue.input_files(job)
+    total = sum(page_count(path) for _, path in inputs)
+    queue.progress(job["id"], 0, total)
+    last = {"written": time.monotonic()}
+
+    def progress(name, done, file_total):
+        now = time.monotonic()
+        if now - last["written"] < HEARTBEAT_S:
+            return
+        last["written"] = now
+        if queue.progress(job["id"], stats["pages"], total) == "cancelled":
+            raise JobCancelled(job["id"])
+
+    carton_rows, cmus_rows = extract_files(
+        inputs, progress=progress, stats=stats, executor=executor,
+        options=options, timings=timings, window=window,
+    )
+    timings_tables = [timings_summary(timings), timings_frame(timings)] if timings else None
+    written = write_reports(
+        queue.job_dir(job["id"]), carton_rows, cmus_rows, timings_tables, options.get("report_formats", ("xlsx",)),
+    )
+    queue.finish(job["id"], [path.name for path, _ in written], dict(stats))
+    discard_journal(journal_path)
+    return written
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(root=DEFAULT_JOBS_DIR, workers=os.cpu_count() or 1, max_jobs=2, poll=1.0, low_memory=False):
+    """
+    Run jobs until interrupted: `max_jobs` at a time on one pool of
+    `workers` processes. With `low_memory` pool processes are replaced
+    every LOW_MEMORY_TASKS_PER_CHILD page chunks.
+    """
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    signal.signal(signal.SIGTERM, _interrupt)  # stop like Ctrl-C: unfinished jobs are requeued
+    queue = JobQueue(root)
+    requeued = queue.requeue_stale()
+    if requeued:
+        print(f"requeued {requeued} job(s) left running by a stopped worker")
+    queue.heartbeat(name)
+    executor = make_executor(workers, LOW_MEMORY_TASKS_PER_CHILD if low_memory else None)
+    window = workers * CHUNKS_PER_WORKER
+    stop = threading.Event()
+
+    def runner(slot):
+        jobs = JobQueue(root)
+        while not stop.is_set():
+            job = jobs.claim(f"{name}/{slot}")
+            if job is None:
+                stop.wait(poll)
+                continue
+            print(f"[{job['id']}] started: {len(job['files'])} file(s), owner {job['owner'] or '-'}")
+            try:
+                for path, note in run_job(jobs, job, executor, window):
+                    print(f"[{job['id']}] {path.name}: {note}")
+            except JobCancelled:
+                print(f"[{job['id']}] cancelled")
+            except Exception as e:  # noqa: BLE001 — the job fails, the daemon keeps serving
+                if stop.is_set():
+                    break  # pool shut down under it: requeued below
+                jobs.fail(job["id"], f"{type(e).__name__}: {e}")
+                print(f"[{job['id']}] failed: {type(e).__name__}: {e}", file=sys.stderr)
+        jobs.close()
+
+    threads = [threading.Thread(target=runner, args=(slot,), daemon=True) for slot in range(max_jobs)]
+    for thread in threads:
+        thread.start()
+    print(f"worker {name}: {max_jobs} job slot(s), {workers} process(es), jobs in {root}")
+    try:
+        while True:
+            time.sleep(HEARTBEAT_S)
+            queue.heartbeat(name)
+            queue.requeue_stale()
+    except KeyboardInterrupt:
+        print("stopping…")
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        for thread in threads:
+            thread.join(timeout=30)
+        requeued = queue.requeue_worker(name)
+        if requeued:
+            print(f"requeued {requeued} unfinished job(s)")
+        queue.close()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CLI
+# ─────────────────────────────────────────────────────────────────────────────
+def format_job(job):
+    pages = f"{job['pages_done']:,}/{job['pages_total']:,} pages" if job["pages_total"] else ""
+    line = f"{job['id']}  {job['status']:<9} {pages:<18} {len(job['files'])} file(s)  {job['owner'] or '-'}"
+    return line + (f"  {job['message']}" if job["message"] else "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs-dir", default=DEFAULT_JOBS_DIR, help=f"job database and files (default: {DEFAULT_JOBS_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="run the worker daemon")
+    worker.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="page worker processes shared by all jobs")
+    worker.add_argument("--max-jobs", type=int, default=2, help="jobs processed at the same time")
+    worker.add_argument("--poll", type=float, default=1.0, help="seconds between queue checks when idle")
+    worker.add_argument("--low-memory", action="store_true", help="recycle page worker processes to bound their memory")
+
+    submit = commands.add_parser("submit", help="queue every PDF in a directory as one job")
+    submit.add_argument("input_dir")
+    submit.add_argument("--owner", default=os.environ.get("USER", ""), help="whose job this is (for fair sharing)")
+    submit.add_argument("--no-cache", action="store_true", help="do not use the page result cache")
+    submit.add_argument("--formats", default="xlsx", help=f"comma-separated report formats: {', '.join(REPORT_FORMATS)}")
+
+    status = commands.add_parser("status", help="list recent jobs, or show one")
+    status.add_argument("job_id", nargs="?")
+
+    cancel = commands.add_parser("cancel", help="cancel a queued or running job")
+    cancel.add_argument("job_id")
+
+    purge = commands.add_parser("purge", help="delete finished jobs older than --days")
+    purge.add_argument("--days", type=float, default=7)
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        serve(args.jobs_dir, args.workers, args.max_jobs, args.poll, args.low_memory)
+        return 0
+
+    queue = JobQueue(args.jobs_dir)
+    if args.command == "submit":
+        pdfs = find_pdfs(args.input_dir)
+        if not pdfs:
+            print(f"No PDF files found in {args.input_dir}", file=sys.stderr)
+            return 1
+        options = {} if args.no_cache else {"cache_path": DEFAULT_CACHE_PATH}
+        try:
+            options["report_formats"] = parse_formats(args.formats)
+        except ValueError as e:
+            parser.error(str(e))
+        print(queue.submit(((p.name, str(p)) for p in pdfs), options, owner=args.owner))
+    elif args.command == "status":
+        if args.job_id is None:
+            for job in queue.jobs():
+                print(format_job(job))
+            print(f"{queue.workers_online()} worker daemon(s) online")
+        else:
+            job = queue.get(args.job_id)
+            if job is None:
+                print(f"No job {args.job_id}", file=sys.stderr)
+                return 1
+            print(format_job(job))
+            for path in queue.output_paths(job):
+                print(f"  {path}")
+    elif args.command == "cancel":
+        if not queue.cancel(args.job_id):
+            print(f"Job {args.job_id} is not queued or running", file=sys.stderr)
+            return 1
+    elif args.command == "purge":
+        print(f"deleted {queue.purge(args.days * 86400)} job(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+OCR backends used by the field OCR in extractor.py.
+
+"tesserocr" keeps one Tesseract instance (language data loaded once) alive
+per worker thread and talks to it through the C API, so recognising a field
+costs no process spawn or temp files. "pytesseract" shells out to the tesseract binary
+per call and stays as the fallback when tesserocr is not installed.
+tesserocr is in requirements.txt and builds against libtesseract-dev /
+libleptonica-dev from packages.txt; the app and batch.py say which
+engine "auto" picked, so a deployment without it shows up.
+"""
+import threading
+
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # optional dependency
+    tesserocr = None
+
+ENGINE_NAMES = ("auto", "tesserocr", "pytesseract")
+
+
+class PytesseractEngine:
+    name = "pytesseract"
+
+    def recognize(self, image, psm=7, whitelist=""):
+        wl = f"-c tessedit_char_whitelist={whitelist}" if whitelist else ""
+        return pytesseract.image_to_string(image, config=f"--psm {psm} {wl}")
+
+    def recognize_conf(self, image, psm=7, whitelist=""):
+        """recognize() and the mean word confidence (0-100), from one TSV run."""
+        wl = f"-c tessedit_char_whitelist={whitelist}" if whitelist else ""
+        data = pytesseract.image_to_data(image, config=f"--psm {psm} {wl}", output_type=pytesseract.Output.DICT)
+        lines, confs = {}, []
+        for i, text in enumerate(data["text"]):
+            text = text.strip()
+            if not text:
+                continue
+            lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(text)
+            confs.append(float(data["conf"][i]))
+        text = "\n".join(" ".join(words) for words in lines.values())
+        return text, sum(confs) / len(confs) if confs else 0.0
+
+    def words(self, image, psm=11):
+        """Word boxes of one layout pass: [{"text", "box": (x0, y0, x1, y1), "conf"}]."""
+        data = pytesseract.image_to_data(image, config=f"--psm {psm}", output_type=pytesseract.Output.DICT)
+        found = []
+        for i, text in enumerate(data["text"]):
+            text = text.strip()
+            if not text:
+                continue
+            x0, y0 = data["left"][i], data["top"][i]
+            found.append({
+                "text": text,
+                "box": (x0, y0, x0 + data["width"][i], y0 + data["height"][i]),
+                "conf": float(data["conf"][i]),
+            })
+        return found
+
+
+class TesserocrEngine:
+    name = "tesserocr"
+
+    def __init__(self, lang="eng"):
+        self.api = tesserocr.PyTessBaseAPI(lang=lang)
+
+    def _configure(self, psm, whitelist):
+        self.api.SetPageSegMode(psm)
+        self.api.SetVariable("tessedit_char_whitelist", whitelist)
+
+    def recognize(self, image, psm=7, whitelist=""):
+        self._configure(psm, whitelist)
+        self.api.SetImage(image)
+        return self.api.GetUTF8Text()
+
+    def recognize_conf(self, image, psm=7, whitelist=""):
+        """recognize() and Tesseract's mean word confidence (0-100)."""
+        text = self.recognize(image, psm, whitelist)
+        return text, float(self.api.MeanTextConf())
+
+    def words(self, image, psm=11):
+        """Word boxes of one layout pass: [{"text", "box": (x0, y0, x1, y1), "conf"}]."""
+        self._configure(psm, "")
+        self.api.SetImage(image)
+        self.api.Recognize()
+        level = tesserocr.RIL.WORD
+        found = []
+        for word in tesserocr.iterate_level(self.api.GetIterator(), level):
+            text = (word.GetUTF8Text(level) or "").strip()
+            if not text:
+                continue
+            found.append({"text": text, "box": word.BoundingBox(level), "conf": word.Confidence(level)})
+        return found
+
+    def close(self):
+        self.api.End()
+
+
+_local = threading.local()
+
+
+def use_engine(name="auto"):
+    """Select the backend for OCR calls made from the current thread."""
+    if name not in ENGINE_NAMES:
+        raise ValueError(f"unknown OCR engine {name!r} (choose from {', '.join(ENGINE_NAMES)})")
+    _local.wanted = name
+
+
+def engine_name(name="auto"):
+    """The backend `name` resolves to in this process ("auto" -> tesserocr when it is installed)."""
+    if name != "auto":
+        return name
+    engine = getattr(_local, "engine", None)
+    if engine is not None:
+        return engine.name
+    return "tesserocr" if tesserocr is not None else "pytesseract"
+
+
+def get_engine():
+    """The current thread's persistent engine, created on first use."""
+    wanted = getattr(_local, "wanted", "auto")
+    engine = getattr(_local, "engine", None)
+    if engine is not None and wanted in ("auto", engine.name):
+        return engine
+
+    engine = None
+    if wanted in ("auto", "tesserocr") and tesserocr is not None:
+        try:
+            engine = TesserocrEngine()
+        except RuntimeError:
+            if wanted == "tesserocr":
+                raise
+    if engine is None:
+        if wanted == "tesserocr":
+            raise RuntimeError("tesserocr is not installed; use the pytesseract engine instead")
+        engine = PytesseractEngine()
+    _local.engine = engine
+    return engine
@@ -0,0 +1,255 @@
+"""
+Disk-backed, content-addressed cache of parsed page results.
+
+Each entry is keyed by a hash of the page's PDF objects plus the parser
+version, and stores the page record (parsed rows + decoded barcodes) as
+JSON. The database is bounded by size and evicts least-recently-used pages.
+SQLite connections only work on the thread that opened them, so every
+thread (Streamlit runs each script run on a new one) gets its own.
+
+PageJournal is the per-run counterpart: every finished page of one batch,
+so a crashed or interrupted run can resume where it stopped. A finished
+run deletes its journal; one left by a run that never finished is purged
+by purge_journals() once untouched for JOURNAL_MAX_AGE_DAYS.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pdf-to-excel-pro", "page_cache.sqlite")
+DEFAULT_CACHE_MAX_MB = 512
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "journals")
+# Pool workers outlive many runs; keep only the latest journals open (per thread).
+MAX_OPEN_JOURNALS = 8
+# Journals hold customer label rows: an abandoned one is kept this long for
+# a resume, then purged.
+JOURNAL_MAX_AGE_DAYS = 7
+
+
+# Running byte total of the cache, kept by triggers so eviction never sums the table.
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY, record TEXT NOT NULL,
+    size INTEGER NOT NULL, last_used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (name, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM pages;
+CREATE TRIGGER IF NOT EXISTS pages_bytes_insert AFTER INSERT ON pages BEGIN
+    UPDATE meta SET value = value + new.size WHERE name = 'bytes'; END;
+CREATE TRIGGER IF NOT EXISTS pages_bytes_delete AFTER DELETE ON pages BEGIN
+    UPDATE meta SET value = value - old.size WHERE name = 'bytes'; END;
+CREATE TRIGGER IF NOT EXISTS pages_bytes_update AFTER UPDATE OF size ON pages BEGIN
+    UPDATE meta SET value = value + new.size - old.size WHERE name = 'bytes'; END;
+"""
+
+
+class PageCache:
+    """SQLite page-result store with size-bounded LRU eviction. One instance per thread."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_mb=DEFAULT_CACHE_MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # One transaction, so the byte total starts from the pages of an older cache.
+        self.conn.executescript(f"BEGIN IMMEDIATE; {CACHE_SCHEMA} COMMIT;")
+
+    def get(self, key):
+        row = self.conn.execute("SELECT record FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.conn:
+            self.conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, record):
+        payload = json.dumps(record, ensure_ascii=False)
+        with self.conn:
+            # An upsert, not INSERT OR REPLACE: REPLACE deletes without firing the delete trigger.
+            self.conn.execute(
+                "INSERT INTO pages (key, record, size, last_used) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET record = excluded.record, size = excluded.size,"
+                " last_used = excluded.last_used",
+                (key, payload, len(payload), time.time()),
+            )
+        self.evict()
+
+    def total_bytes(self):
+        return self.conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+
+    def evict(self):
+        """Drop least-recently-used pages until the store fits in max_bytes."""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+        dropped = []
+        for key, size in self.conn.execute("SELECT key, size FROM pages ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            dropped.append((key,))
+            total -= size
+        with self.conn:
+            self.conn.executemany("DELETE FROM pages WHERE key = ?", dropped)
+        return len(dropped)
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM pages")
+
+    def close(self):
+        self.conn.close()
+
+
+_local = threading.local()
+
+
+def _thread_stores(name):
+    """This thread's {path: store} dict `name`; it goes away with the thread."""
+    stores = getattr(_local, name, None)
+    if stores is None:
+        stores = {}
+        setattr(_local, name, stores)
+    return stores
+
+
+def get_cache(path, max_mb=DEFAULT_CACHE_MAX_MB):
+    """This thread's PageCache for `path` (pool workers each keep their own connection)."""
+    caches = _thread_stores("caches")
+    cache = caches.get(path)
+    if cache is None:
+        cache = caches[path] = PageCache(path, max_mb)
+    return cache
+
+
+class PageJournal:
+    """
+    SQLite record of the finished pages of one run, keyed by file and page
+    index. Unlike the cache it is never evicted and keeps the page stats,
+    so a resumed run adds up exactly like an uninterrupted one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " file TEXT NOT NULL, page INTEGER NOT NULL, record TEXT NOT NULL,"
+            " PRIMARY KEY (file, page))"
+        )
+        self.conn.commit()
+        self.inode = os.stat(path).st_ino
+
+    def is_current(self):
+        """False once the file was discarded (or replaced) under this connection."""
+        try:
+            return os.stat(self.path).st_ino == self.inode
+        except FileNotFoundError:
+            return False
+
+    def get(self, file, page):
+        row = self.conn.execute("SELECT record FROM pages WHERE file = ? AND page = ?", (file, page)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, file, page, record):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (file, page, record) VALUES (?, ?, ?)",
+                (file, page, json.dumps(record, ensure_ascii=False)),
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+_journal_users = Counter()
+_journal_users_lock = threading.Lock()
+
+
+def get_journal(path):
+    """
+    This thread's PageJournal for `path`, reopened when the file was
+    discarded since (e.g. in a pool worker that served an earlier run).
+    """
+    journals = _thread_stores("journals")
+    journal = journals.get(path)
+    if journal is not None and not journal.is_current():
+        journals.pop(path).close()
+        journal = None
+    if journal is None:
+        if len(journals) >= MAX_OPEN_JOURNALS:
+            journals.pop(next(iter(journals))).close()
+        journal = journals[path] = PageJournal(path)
+    return journal
+
+
+@contextmanager
+def journal_user(path):
+    """Mark a run on `path` in progress, so discard_journal() leaves it to the last run sharing it."""
+    with _journal_users_lock:
+        _journal_users[path] += 1
+    try:
+        yield
+    finally:
+        with _journal_users_lock:
+            _journal_users[path] -= 1
+            if not _journal_users[path]:
+                del _journal_users[path]
+
+
+def _remove_journal_files(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def purge_journals(directory=DEFAULT_JOURNAL_DIR, max_age_days=JOURNAL_MAX_AGE_DAYS):
+    """
+    Delete the journals in `directory` that no run has written for
+    `max_age_days` (interrupted or abandoned runs), skipping any a run in
+    this process is using. Returns how many were deleted.
+    """
+    cutoff = time.time() - max_age_days * 86400
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    purged = 0
+    for name in names:
+        if not name.endswith(".sqlite"):
+            continue
+        path = os.path.join(directory, name)
+        stamps = [os.path.getmtime(path + suffix) for suffix in ("", "-wal", "-shm") if os.path.exists(path + suffix)]
+        if not stamps or max(stamps) >= cutoff:
+            continue
+        with _journal_users_lock:
+            if _journal_users[path]:
+                continue
+            try:
+                _remove_journal_files(path)
+            except OSError:
+                continue
+        purged += 1
+    return purged
+
+
+def discard_journal(path):
+    """
+    Close this thread's connection and delete a finished run's journal,
+    unless another run in this process (see journal_user) still writes to it.
+    """
+    journal = _thread_stores("journals").pop(path, None)
+    if journal is not None:
+        journal.close()
+    with _journal_users_lock:
+        if _journal_users[path]:
+            return False
+        _remove_journal_files(path)
+    return True
@@ -0,0 +1,115 @@
+"""
+Lightweight per-page, per-stage profiling for the extraction engine.
+
+While a page is being processed with profiling on, `stage(name)` blocks add
+their wall time to "<name>_s" and a call to "<name>_calls", and `count(name)`
+bumps plain counters (e.g. Tesseract PSM retries), all in a thread-local
+Counter. With no page profile active, `count` is a single attribute lookup
+and `stage` hands back one shared no-op context manager.
+"""
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+# Stages in pipeline order, for tables and the Timings sheet.
+STAGES = ("text", "cache", "parse", "render", "zbar", "prep", "ocr")
+
+class _PageLocal(threading.local):
+    current = None  # so a thread that never profiled reads None without an AttributeError
+
+
+_local = _PageLocal()
+
+
+def start_page():
+    """Begin collecting into a fresh profile for the current thread's page."""
+    _local.current = Counter()
+    _local.started = time.perf_counter()
+
+
+def finish_page():
+    """Stop collecting; returns the page profile as a plain dict (with "page_s")."""
+    profile = _local.current
+    profile["page_s"] = time.perf_counter() - _local.started
+    _local.current = None
+    return dict(profile)
+
+
+_NO_STAGE = nullcontext()
+
+
+def stage(name):
+    profile = _local.current
+    if profile is None:
+        return _NO_STAGE
+    return _timed_stage(profile, name)
+
+
+@contextmanager
+def _timed_stage(profile, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile[f"{name}_s"] += time.perf_counter() - started
+        profile[f"{name}_calls"] += 1
+
+
+def count(name, n=1):
+    profile = _local.current
+    if profile is not None:
+        profile[name] += n
+
+
+def timings_frame(timings):
+    """One row per profiled page: File, Page, seconds and calls per stage, counters."""
+    df = pd.DataFrame(timings).fillna(0)
+    lead = [c for c in ("File", "Page", "page_s") if c in df.columns]
+    stage_cols = [f"{s}_{k}" for s in STAGES for k in ("s", "calls") if f"{s}_{k}" in df.columns]
+    rest = sorted(c for c in df.columns if c not in lead and c not in stage_cols)
+    return df[lead + stage_cols + rest]
+
+
+def timings_summary(timings, extra=None):
+    """
+    Per-stage breakdown over all profiled pages: total seconds, share of page
+    time, calls and ms per page. `extra` adds whole-batch stages measured
+    outside the page loop, e.g. {"build_excel": seconds}.
+    """
+    pages = len(timings)
+    total = sum(t.get("page_s", 0.0) for t in timings)
+    rows = []
+    for name in STAGES:
+        seconds = sum(t.get(f"{name}_s", 0.0) for t in timings)
+        calls = sum(t.get(f"{name}_calls", 0) for t in timings)
+        if calls:
+            rows.append({"Stage": name, "Seconds": seconds, "Share": seconds / total if total else 0.0,
+                         "Calls": calls, "ms / page": seconds / pages * 1000})
+    other = max(total - sum(r["Seconds"] for r in rows), 0.0)
+    rows.append({"Stage": "other", "Seconds": other, "Share": other / total if total else 0.0,
+                 "Calls": pages, "ms / page": other / pages * 1000 if pages else 0.0})
+    for name, seconds in (extra or {}).items():
+        rows.append({"Stage": name, "Seconds": seconds, "Share": float("nan"), "Calls": 1,
+                     "ms / page": seconds / pages * 1000 if pages else 0.0})
+    return pd.DataFrame(rows)
+
+
+def timings_json(timings, extra=None, **meta):
+    """JSON document for monitoring: summary per stage, counters and every page."""
+    summary = timings_summary(timings, extra)
+    counters = Counter()
+    for t in timings:
+        counters.update({k: v for k, v in t.items()
+                         if isinstance(v, (int, float)) and not k.endswith(("_s", "_calls")) and k != "Page"})
+    return json.dumps({
+        **meta,
+        "pages": len(timings),
+        "page_seconds": sum(t.get("page_s", 0.0) for t in timings),
+        "stages": summary.fillna(0).to_dict("records"),
+        "counters": dict(counters),
+        "per_page": timings,
+    }, indent=2, default=str)